@@ -0,0 +1,3 @@
+"""
+Benchmark suite for ogr2vrt_simple. See run_benchmarks.py
+"""
@@ -0,0 +1,175 @@
+"""
+Synthetic dataset generators for the benchmarks. All generators are deterministic, so that results can be compared
+between runs and machines.
+Datasets are generated once per scale and kept in benchmarks/.data/<scale>/
+"""
+import csv
+import io
+import os
+import random
+import tarfile
+import zipfile
+
+# Parameters per scale. "full" is the one the requests were about (multi-GB CSVs), expect it to take a while
+scales = {
+    "tiny": {
+        "wide_csv_columns": 500,
+        "large_csv_bytes": 5 * 1024 ** 2,
+        "gpkg_layers": 50,
+        "archive_members": 500,
+        "xlsx_sheets": 10,
+    },
+    "small": {
+        "wide_csv_columns": 5000,
+        "large_csv_bytes": 200 * 1024 ** 2,
+        "gpkg_layers": 500,
+        "archive_members": 10000,
+        "xlsx_sheets": 50,
+    },
+    "full": {
+        "wide_csv_columns": 5000,
+        "large_csv_bytes": 2 * 1024 ** 3,
+        "gpkg_layers": 500,
+        "archive_members": 10000,
+        "xlsx_sheets": 200,
+    },
+}
+
+data_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".data")
+# Accented values, so that the Windows-1252 flavour actually differs from the UTF-8 one
+city_names = ["Lille", "Besançon", "Orléans", "Nîmes", "Saint-Étienne", "Hénin-Beaumont", "Nice", "Créteil"]
+
+
+def wide_csv(path: str, columns: int, rows: int = 100):
+    rnd = random.Random(1)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow([f"column_{i}" for i in range(columns)])
+        for _ in range(rows):
+            writer.writerow([rnd.randint(0, 1000) for _ in range(columns)])
+
+
+def large_csv(path: str, size_bytes: int, encoding: str = "utf-8"):
+    """
+    Point dataset (lon/lat columns), written in chunks until size_bytes is reached
+    """
+    rnd = random.Random(2)
+    with open(path, "w", newline="", encoding=encoding) as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "city", "lon", "lat", "value", "comment"])
+        written, row_id = 0, 0
+        while written < size_bytes:
+            buf = io.StringIO()
+            chunk_writer = csv.writer(buf)
+            for _ in range(10000):
+                row_id += 1
+                chunk_writer.writerow([
+                    row_id,
+                    rnd.choice(city_names),
+                    round(rnd.uniform(-5, 9), 6),
+                    round(rnd.uniform(41, 51), 6),
+                    round(rnd.random() * 1000, 2),
+                    "Donnée générée",
+                ])
+            chunk = buf.getvalue()
+            f.write(chunk)
+            written += len(chunk.encode(encoding))
+
+
+def _small_csv_content(idx: int) -> bytes:
+    return f"id,name,value\n{idx},member {idx},{idx * 1.5}\n".encode("utf-8")
+
+
+def zip_many_members(path: str, members: int):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        for i in range(members):
+            z.writestr(f"data/part_{i:05d}.csv", _small_csv_content(i))
+
+
+def tar_gz_many_members(path: str, members: int):
+    with tarfile.open(path, "w:gz") as tar:
+        for i in range(members):
+            content = _small_csv_content(i)
+            info = tarfile.TarInfo(f"data/part_{i:05d}.csv")
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+
+
+def gpkg_many_layers(path: str, layers: int, features: int = 10):
+    from osgeo import ogr, osr
+
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(4326)
+    ds = ogr.GetDriverByName("GPKG").CreateDataSource(path)
+    ds.StartTransaction()
+    for i in range(layers):
+        layer = ds.CreateLayer(f"layer_{i:04d}", srs, ogr.wkbPoint)
+        layer.CreateField(ogr.FieldDefn("name", ogr.OFTString))
+        layer.CreateField(ogr.FieldDefn("value", ogr.OFTReal))
+        for j in range(features):
+            feature = ogr.Feature(layer.GetLayerDefn())
+            feature.SetField("name", f"feature {j}")
+            feature.SetField("value", j * 0.5)
+            feature.SetGeometry(ogr.CreateGeometryFromWkt(f"POINT ({j % 10} {j % 50})"))
+            layer.CreateFeature(feature)
+    ds.CommitTransaction()
+    ds = None
+
+
+def xlsx_many_sheets(path: str, sheets: int, rows: int = 20):
+    from osgeo import ogr
+
+    ds = ogr.GetDriverByName("XLSX").CreateDataSource(path)
+    for i in range(sheets):
+        layer = ds.CreateLayer(f"sheet_{i:03d}", None, ogr.wkbNone)
+        layer.CreateField(ogr.FieldDefn("name", ogr.OFTString))
+        layer.CreateField(ogr.FieldDefn("value", ogr.OFTInteger))
+        for j in range(rows):
+            feature = ogr.Feature(layer.GetLayerDefn())
+            feature.SetField("name", city_names[j % len(city_names)])
+            feature.SetField("value", j)
+            layer.CreateFeature(feature)
+    ds = None
+
+
+dataset_names = [
+    "wide.csv",
+    "large-utf8.csv",
+    "large-cp1252.csv",
+    "many-layers.gpkg",
+    "many-members.zip",
+    "many-members.tar.gz",
+    "many-sheets.xlsx",
+]
+
+
+def build_datasets(scale: str, names: list = None) -> dict:
+    """
+    Generate the datasets for a scale, if not already there
+    :param scale: one of the scales keys
+    :param names: only generate those datasets. Default: all of dataset_names
+    :return: dict {dataset name: file path}
+    """
+    params = scales[scale]
+    out_dir = os.path.join(data_root, scale)
+    os.makedirs(out_dir, exist_ok=True)
+    generators = {
+        "wide.csv": lambda p: wide_csv(p, params["wide_csv_columns"]),
+        "large-utf8.csv": lambda p: large_csv(p, params["large_csv_bytes"], "utf-8"),
+        "large-cp1252.csv": lambda p: large_csv(p, params["large_csv_bytes"], "cp1252"),
+        "many-layers.gpkg": lambda p: gpkg_many_layers(p, params["gpkg_layers"]),
+        "many-members.zip": lambda p: zip_many_members(p, params["archive_members"]),
+        "many-members.tar.gz": lambda p: tar_gz_many_members(p, params["archive_members"]),
+        "many-sheets.xlsx": lambda p: xlsx_many_sheets(p, params["xlsx_sheets"]),
+    }
+    paths = {}
+    for name in names or dataset_names:
+        generate = generators[name]
+        path = os.path.join(out_dir, name)
+        if not os.path.exists(path):
+            print(f"Generating {path}")
+            tmp_path = os.path.join(out_dir, "tmp-" + name)
+            generate(tmp_path)
+            os.replace(tmp_path, path)
+        paths[name] = path
+    return paths
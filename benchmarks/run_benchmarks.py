@@ -0,0 +1,146 @@
+"""
+Benchmark suite: times collect_information, get_source_paths, collect_layers and build_vrt on synthetic datasets
+(see datasets.py), records peak memory, and compares with stored baseline results.
+
+Each case runs in a fresh process, so that caches (python-side and GDAL-side) don't leak from one case to the other
+and memory measurements are per case.
+
+Usage, from the repository root:
+    python -m benchmarks.run_benchmarks --scale tiny --save-baseline   # store the reference results
+    python -m benchmarks.run_benchmarks --scale tiny                   # compare, exit code 1 on regression
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+
+from benchmarks import datasets
+
+phases = ["collect_information", "get_source_paths", "collect_layers", "build_vrt"]
+default_threshold = 0.2  # 20% slower (or bigger) than the baseline is a regression
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def baseline_path(scale: str) -> str:
+    return os.path.join(benchmarks_dir, f"baseline-{scale}.json")
+
+
+def _run_phase(path: str, phase: str, queue):
+    """
+    Run a phase on a fresh FileSource. Runs in a child process
+    """
+    try:
+        from ogr2vrt_simple.utils import ogr_utils
+        from ogr2vrt_simple.vrt_data_sources.file_source import FileSource
+
+        ogr_utils.warm_up()  # don't measure GDAL import and driver registration
+        tracemalloc.start()
+        start = time.perf_counter()
+        src = FileSource(path, {"db_friendly": True})
+        getattr(src, phase)()
+        duration = time.perf_counter() - start
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+        return
+    python_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    # ru_maxrss is in KiB on linux (bytes on macOS), and includes GDAL's own allocations
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put({"duration": duration, "python_peak_memory": python_peak, "max_rss": max_rss})
+
+
+def run_case(path: str, phase: str, repeat: int) -> dict:
+    """
+    Run a case several times, each in its own process
+    :return: median duration (seconds), max python peak memory and max RSS over the runs
+    """
+    ctx = multiprocessing.get_context("spawn")
+    runs = []
+    for _ in range(repeat):
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_run_phase, args=(path, phase, queue))
+        proc.start()
+        run = queue.get()
+        proc.join()
+        if "error" in run:
+            raise RuntimeError(f"{phase} failed on {path}: {run['error']}")
+        runs.append(run)
+    return {
+        "duration": statistics.median([r["duration"] for r in runs]),
+        "python_peak_memory": max(r["python_peak_memory"] for r in runs),
+        "max_rss": max(r["max_rss"] for r in runs),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    :return: list of regression messages, empty if none
+    """
+    regressions = []
+    for case, result in results.items():
+        reference = baseline.get(case, None)
+        if reference is None:
+            continue
+        for metric in ("duration", "python_peak_memory"):
+            if reference[metric] and result[metric] > reference[metric] * (1 + threshold):
+                regressions.append(
+                    f"{case}: {metric} {result[metric]:.4g} > {reference[metric]:.4g} (+{threshold:.0%} allowed)"
+                )
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=list(datasets.scales.keys()), default="tiny")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case, the median duration is kept")
+    parser.add_argument("--threshold", type=float, default=default_threshold,
+                        help="relative slow-down tolerated before failing. Default: 0.2")
+    parser.add_argument("--filter", help="only run the cases which name contains this string")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    names = [
+        n for n in datasets.dataset_names
+        if not args.filter or any(args.filter in f"{n}::{phase}" for phase in phases)
+    ]
+    paths = datasets.build_datasets(args.scale, names)
+    results = {}
+    for name, path in paths.items():
+        for phase in phases:
+            case = f"{name}::{phase}"
+            if args.filter and args.filter not in case:
+                continue
+            results[case] = run_case(path, phase, args.repeat)
+            print(f"{case:50s} {results[case]['duration']:9.3f}s "
+                  f"python peak {results[case]['python_peak_memory'] / 1024 ** 2:8.1f} MiB "
+                  f"max RSS {results[case]['max_rss'] / 1024:8.1f} MiB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(baseline_path(args.scale), "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {baseline_path(args.scale)}")
+        return 0
+
+    try:
+        with open(baseline_path(args.scale)) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"No baseline for scale {args.scale}, run with --save-baseline first")
+        return 0
+    regressions = compare(results, baseline, args.threshold)
+    for r in regressions:
+        print(f"REGRESSION {r}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,36 @@
 """ogr2vrt *simple*, generate a simple VRT file from an OGR-compatible dataset"""
+import importlib
 import logging
 logging.getLogger(__name__).addHandler(logging.NullHandler())
 
 __version__ = "0.2.4"
 
-from .vrt_data_sources.http_source import HttpSource
-from .vrt_data_sources.file_source import FileSource
-from .vrt_data_sources import archive_extension_list, compression_extension_list, \
-    common_dataset_extensions
-from .utils.ogr_utils import vsimappings, vsiprefix_from_archive_extension, \
-    is_valid_ogr_path, collect_layers, layers2vrt
+# The public API is loaded lazily (PEP 562): importing the sources pulls GDAL and other heavy dependencies, we
+# don't want to pay for it until they are actually used
+_lazy_attributes = {
+    "HttpSource": ".vrt_data_sources.http_source",
+    "FileSource": ".vrt_data_sources.file_source",
+    "archive_extension_list": ".vrt_data_sources",
+    "compression_extension_list": ".vrt_data_sources",
+    "common_dataset_extensions": ".vrt_data_sources",
+    "vsimappings": ".utils.ogr_utils",
+    "vsiprefix_from_archive_extension": ".utils.ogr_utils",
+    "is_valid_ogr_path": ".utils.ogr_utils",
+    "collect_layers": ".utils.ogr_utils",
+    "layers2vrt": ".utils.ogr_utils",
+}
+
+__all__ = list(_lazy_attributes.keys())
+
+
+def __getattr__(name):
+    module_name = _lazy_attributes.get(name, None)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + __all__)
@@ -0,0 +1,213 @@
+"""
+Batch processing: generate VRT files for a list of sources, on a process pool (or a thread pool: source objects are
+thread-safe, and threads save the workers startup and memory cost when the sources are mostly remote).
+Each worker process initializes GDAL once, then processes many sources. Results are reported as JSON lines, one
+per source, as soon as it is done.
+
+The manifest is a JSONL or CSV file (or stdin) listing the sources, with optional per-source options:
+source, out_file, db_friendly, no_vsicurl, data_formats, relative_to_file, fields_include, fields_exclude, where
+"""
+import csv
+import io
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, List
+from urllib.parse import urlparse
+
+from ogr2vrt_simple.utils import string_utils
+
+manifest_option_keys = [
+    "out_file",
+    "db_friendly",
+    "no_vsicurl",
+    "data_formats",
+    "relative_to_file",
+    "fields_include",
+    "fields_exclude",
+    "where",
+]
+boolean_option_keys = ["db_friendly", "no_vsicurl", "relative_to_file"]
+
+
+def read_manifest(manifest: str) -> List[Dict]:
+    """
+    Read the manifest entries. Format is guessed from the extension (.csv or JSONL), or from the content for stdin
+    :param manifest: file path, or - for stdin
+    :return: list of entries (dicts), each having at least a "source" key
+    """
+    if manifest == "-":
+        content = sys.stdin.read()
+        is_csv = not content.lstrip().startswith("{")
+    else:
+        with open(manifest, encoding="utf-8") as f:
+            content = f.read()
+        is_csv = os.path.splitext(manifest)[1].lower() == ".csv"
+
+    entries = list(_read_csv(content) if is_csv else _read_jsonl(content))
+    for e in entries:
+        if not e.get("source", None):
+            raise ValueError(f"Manifest entry without source: {e}")
+    return entries
+
+
+def _read_jsonl(content: str) -> Iterator[Dict]:
+    for line in content.splitlines():
+        if line.strip():
+            yield json.loads(line)
+
+
+def _read_csv(content: str) -> Iterator[Dict]:
+    for row in csv.DictReader(io.StringIO(content)):
+        entry = {k.strip(): v.strip() for k, v in row.items() if k and v is not None and v.strip()}
+        for key in boolean_option_keys:
+            if key in entry:
+                entry[key] = entry[key].lower() in ("1", "true", "yes", "y")
+        yield entry
+
+
+def entry_config(entry: Dict, defaults: Dict = None) -> Dict:
+    """
+    Build the source config dict for a manifest entry, the same way the generate-vrt command does
+    :param entry: manifest entry
+    :param defaults: options applying to all entries, overridden by the entry's own options
+    :return:
+    """
+    options = dict(defaults or {})
+    options.update({k: v for k, v in entry.items() if k in manifest_option_keys})
+    out_file = options.get("out_file", None)
+    return {
+        "filename": os.path.splitext(out_file)[0] if out_file else "",
+        "relative_to_file": options.get("relative_to_file", False),
+        "db_friendly": options.get("db_friendly", False),
+        "no_vsicurl": options.get("no_vsicurl", False),
+        "data_formats": string_utils.add_dots(options.get("data_formats", None)),
+        "template": options.get("template", None),
+        "fields_include": options.get("fields_include", None),
+        "fields_exclude": options.get("fields_exclude", None),
+        "where": options.get("where", None),
+    }
+
+
+def default_out_file(source: str, out_dir: str, index: int) -> str:
+    """
+    VRT file path used when the manifest entry does not provide one
+    """
+    path = urlparse(source).path if source.startswith("http") else source
+    stem = os.path.splitext(os.path.basename(path.rstrip("/")))[0]
+    name = string_utils.db_friendly_name(stem) if stem else f"source_{index}"
+    return os.path.join(out_dir, f"{name}.vrt")
+
+
+def assign_out_files(entries: List[Dict], out_dir: str) -> List[Dict]:
+    """
+    Set the out_file of the entries that don't provide one. Default names are made unique with an _<index> suffix,
+    e.g. for .../a/data.csv and .../b/data.csv, or for URLs all ending with /download
+    :param entries: manifest entries
+    :param out_dir: folder for the default VRT files
+    :return: copies of the entries, all having an out_file
+    """
+    used = {os.path.abspath(e["out_file"]) for e in entries if e.get("out_file", None)}
+    assigned = []
+    for idx, entry in enumerate(entries):
+        entry = dict(entry)
+        if not entry.get("out_file", None):
+            out_file = default_out_file(entry["source"], out_dir, idx)
+            stem, suffix = os.path.splitext(out_file)[0], idx
+            while os.path.abspath(out_file) in used:
+                out_file = f"{stem}_{suffix}.vrt"
+                suffix += 1
+            entry["out_file"] = out_file
+            used.add(os.path.abspath(out_file))
+        assigned.append(entry)
+    return assigned
+
+
+def init_worker():
+    """
+    Process pool initializer: import GDAL and register drivers once per worker
+    """
+    from ogr2vrt_simple.utils import ogr_utils
+
+    ogr_utils.warm_up()
+
+
+def process_entry(entry: Dict, config: Dict) -> Dict:
+    """
+    Generate the VRT file for one manifest entry. Never raises: errors are reported in the result
+    :param entry: manifest entry. Its out_file key must be set
+    :param config: source config
+    :return: result dict
+    """
+    from ogr2vrt_simple.vrt_data_sources import get_source
+
+    result = {"source": entry["source"], "out_file": entry["out_file"], "status": "error"}
+    timings = {}
+    start = time.perf_counter()
+    try:
+        with get_source(entry["source"], config) as data_source:
+            t = time.perf_counter()
+            information = data_source.collect_information()
+            timings["collect_information"] = time.perf_counter() - t
+            result["can_be_remotely_accessed"] = information.get("can_be_remotely_accessed", None)
+            result["can_be_remotely_accessed_comments"] = information.get("can_be_remotely_accessed_comments", None)
+            result["access_plan"] = information.get("access_plan", None)
+
+            t = time.perf_counter()
+            layers_collection = data_source.collect_layers()
+            timings["collect_layers"] = time.perf_counter() - t
+            layers = [layer for c in layers_collection for layer in c["layers"]]
+            result["layers_count"] = len(layers)
+            result["fields_count"] = sum(len(layer.fields_definition) for layer in layers)
+
+            t = time.perf_counter()
+            vrt_xml = data_source.render_vrt(layers_collection)
+            timings["render_vrt"] = time.perf_counter() - t
+        if not vrt_xml or not layers:
+            result["error"] = "No layer could be found"
+        else:
+            with open(entry["out_file"], "w") as f:
+                f.write(vrt_xml)
+            result["status"] = "ok"
+    except Exception as e:
+        logging.debug(f"Error processing {entry['source']}", exc_info=True)
+        result["error"] = f"{type(e).__name__}: {e}"
+    timings["total"] = time.perf_counter() - start
+    result["timings"] = {k: round(v, 4) for k, v in timings.items()}
+    return result
+
+
+def run_batch(
+        entries: List[Dict], defaults: Dict, out_dir: str = ".", workers: int = None, threads: bool = False
+) -> Iterator[Dict]:
+    """
+    Process the manifest entries on a process pool
+    :param entries: manifest entries
+    :param defaults: options applying to all entries
+    :param out_dir: folder for the VRT files of entries that don't provide an out_file
+    :param workers: pool size. Defaults to the number of CPUs (processes) or the ThreadPoolExecutor default (threads)
+    :param threads: use a thread pool instead of a process pool
+    :return: iterator on the results, in completion order
+    """
+    if threads:
+        init_worker()
+        pool = ThreadPoolExecutor(max_workers=workers)
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker)
+    with pool as executor:
+        futures = {}
+        for entry in assign_out_files(entries, out_dir):
+            futures[executor.submit(process_entry, entry, entry_config(entry, defaults))] = entry
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                # process_entry never raises: the worker died (BrokenProcessPool, e.g. a crash in GDAL or the OOM
+                # killer) or the entry could not be sent to it
+                entry = futures[future]
+                logging.error(f"Error processing {entry['source']}: {type(e).__name__}: {e}")
+                yield {"source": entry["source"], "out_file": entry["out_file"], "status": "error",
+                       "error": f"{type(e).__name__}: {e}"}
@@ -0,0 +1,430 @@
+"""
+Local caching proxy for remote sources read through /vsicurl/.
+GDAL reads remote files by byte ranges, and forgets them when the process exits: every run (generating, validating,
+test-opening VRTs) fetches the same ranges again. This proxy stores the ranges on disk, in fixed-size blocks, keyed by
+URL and validator (ETag or Last-Modified). Adjacent missing blocks are fetched in a single upstream request, resources
+are revalidated with conditional requests once their max age is reached, and the cache size is capped (least
+recently used blocks are evicted first). Requests for whole files (no Range header) are passed through uncached.
+
+Usage:
+    ogr2vrt_cli cache-proxy --port 8766
+    ogr2vrt_cli generate-vrt --cache_proxy http://127.0.0.1:8766 https://example.org/data.zip
+
+While probing and introspecting, remote URLs are rewritten to http://127.0.0.1:8766/https/example.org/data.zip (an
+HTTPS URL can't be cached by a classic forward proxy, the connection is a tunnel). The generated VRT keeps the
+original URLs. Plain HTTP clients can also use it as a classic forward proxy (e.g. GDAL_HTTP_PROXY=127.0.0.1:8766).
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+default_host = "127.0.0.1"
+default_port = 8766
+default_cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "ogr2vrt_simple", "ranges")
+default_max_size = 1024 ** 3
+default_max_age = 3600  # seconds before a resource is revalidated upstream
+block_size = 256 * 1024
+# Adjacent missing blocks are fetched together, up to this number of blocks per upstream request
+max_blocks_per_fetch = 16
+upstream_timeout = 60
+# Response headers forwarded to the client
+forwarded_headers = ["Content-Type", "Content-Length", "Content-Range", "Accept-Ranges", "ETag", "Last-Modified"]
+
+
+def to_proxy_url(url: str, proxy_url: str) -> str:
+    """
+    https://example.org/data.zip -> http://127.0.0.1:8766/https/example.org/data.zip
+    """
+    scheme, rest = url.split("://", 1)
+    return f"{proxy_url.rstrip('/')}/{scheme}/{rest}"
+
+
+def from_proxy_path(path: str) -> Optional[str]:
+    """
+    Upstream URL for a request path: either an absolute URL (forward proxy request), or /<scheme>/<host>/<path>
+    :return: upstream URL, None if the path is not a proxied one
+    """
+    if path.startswith(("http://", "https://")):
+        return path
+    m = re.match(r"^/(https?)/(.+)$", path)
+    return f"{m[1]}://{m[2]}" if m else None
+
+
+def rewrite_vsi_path(vsistring: str, proxy_url: str) -> str:
+    """
+    Route the remote parts of a GDAL path through the proxy, e.g.
+    /vsizip//vsicurl/https://example.org/data.zip/a.csv -> /vsizip//vsicurl/http://127.0.0.1:8766/https/example.org/data.zip/a.csv
+    """
+    proxy_url = proxy_url.rstrip("/")
+    return re.sub(r"(/vsicurl(?:_streaming)?/)(https?)://", lambda m: f"{m[1]}{proxy_url}/{m[2]}/", vsistring)
+
+
+def parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    :param range_header: Range header value. Only single ranges are supported, which is what GDAL sends
+    :param size: resource size
+    :return: (start, end) inclusive, None if the header is not a supported range
+    """
+    m = re.match(r"^bytes=(\d*)-(\d*)$", (range_header or "").strip())
+    if not m or not (m[1] or m[2]):
+        return None
+    if m[1]:
+        start = int(m[1])
+        end = min(int(m[2]), size - 1) if m[2] else size - 1
+    else:  # suffix range: last N bytes
+        start, end = max(size - int(m[2]), 0), size - 1
+    return start, end
+
+
+def missing_runs(missing: List[int], max_len: int = max_blocks_per_fetch) -> List[Tuple[int, int]]:
+    """
+    Coalesce missing block indexes into runs of adjacent blocks
+    :param missing: sorted block indexes
+    :param max_len: maximum number of blocks per run
+    :return: list of (first block, last block)
+    """
+    runs = []
+    for idx in missing:
+        if runs and idx == runs[-1][1] + 1 and idx - runs[-1][0] < max_len:
+            runs[-1] = (runs[-1][0], idx)
+        else:
+            runs.append((idx, idx))
+    return runs
+
+
+class RangeCache:
+    """
+    On-disk storage: <sha1(url)>.json holds the resource metadata, <sha1(url|validator)>/<block index> the blocks.
+    A changed validator means new block keys: outdated blocks are never served, and get evicted eventually
+    """
+
+    def __init__(self, cache_dir: str = default_cache_dir, max_size: int = default_max_size):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self.size = sum(size for _, _, size in self._blocks())
+
+    @staticmethod
+    def _key(value: str) -> str:
+        return hashlib.sha1(value.encode("utf-8")).hexdigest()
+
+    def get_meta(self, url: str) -> Optional[Dict]:
+        try:
+            with open(os.path.join(self.cache_dir, self._key(url) + ".json")) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def set_meta(self, url: str, meta: Dict):
+        self._write(os.path.join(self.cache_dir, self._key(url) + ".json"), json.dumps(meta).encode("utf-8"))
+
+    def _block_path(self, meta: Dict, idx: int) -> str:
+        return os.path.join(self.cache_dir, self._key(f"{meta['url']}|{meta['validator']}"), str(idx))
+
+    def get_block(self, meta: Dict, idx: int) -> Optional[bytes]:
+        path = self._block_path(meta, idx)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)  # recently used, evicted last
+        except OSError:
+            pass
+        return data
+
+    def has_block(self, meta: Dict, idx: int) -> bool:
+        return os.path.exists(self._block_path(meta, idx))
+
+    def put_block(self, meta: Dict, idx: int, data: bytes):
+        path = self._block_path(meta, idx)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._write(path, data)
+        with self._lock:
+            self.size += len(data)
+            if self.size > self.max_size:
+                self._evict()
+
+    def _blocks(self):
+        """
+        :return: generator of (path, last use time, size) of all the cached blocks
+        """
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_dir():
+                for block in os.scandir(entry.path):
+                    stat = block.stat()
+                    yield block.path, stat.st_mtime, stat.st_size
+
+    def _evict(self):
+        """
+        Remove the least recently used blocks, down to 90% of the size cap. Called with the lock held
+        """
+        for path, _, size in sorted(self._blocks(), key=lambda b: b[1]):
+            if self.size <= self.max_size * 0.9:
+                break
+            try:
+                os.remove(path)
+                self.size -= size
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _write(path: str, data: bytes):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
+class _ResourceChanged(Exception):
+    pass
+
+
+class CachingProxyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+    def do_HEAD(self):
+        self._handle(send_body=False)
+
+    def do_GET(self):
+        if self.path == "/_stats":
+            body = json.dumps(self.server.get_stats()).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        self._handle(send_body=True)
+
+    def _handle(self, send_body: bool):
+        self._headers_sent = False
+        url = from_proxy_path(self.path)
+        if url is None:
+            self._send_status(404)
+            return
+        try:
+            meta = self._get_resource(url)
+            if meta is None or (send_body and parse_range(self.headers.get("Range", None), meta["size"]) is None):
+                # Full downloads are not cached: GDAL reads ranges, the rest are one-off reads of whole files
+                self._pass_through(url, send_body)
+                return
+            self._serve_from_cache(meta, send_body)
+        except _ResourceChanged:
+            # Changed upstream while we were reading it: get fresh metadata next time, serve this one directly
+            self.server.cache.set_meta(url, {})
+            if self._headers_sent:
+                # Too late to answer anything else: the client sees a truncated response and retries
+                self.close_connection = True
+                return
+            self._pass_through(url, send_body)
+        except (urllib.error.URLError, OSError) as e:
+            logging.warning(f"Upstream error for {url}: {e}")
+            self._send_status(getattr(e, "code", 502))
+
+    def _get_resource(self, url: str) -> Optional[Dict]:
+        """
+        Resource metadata, revalidated upstream if older than max_age
+        :return: metadata dict, None if the resource can't be cached (no size, or no range support)
+        """
+        cache = self.server.cache
+        meta = cache.get_meta(url)
+        if meta and meta.get("url") and time.time() - meta["checked"] < self.server.max_age:
+            return meta if meta["cacheable"] else None
+
+        headers = {}
+        if meta and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        elif meta and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        self.server.count("upstream_requests")
+        try:
+            resp = urllib.request.urlopen(
+                urllib.request.Request(url, method="HEAD", headers=headers), timeout=upstream_timeout
+            )
+            resp.close()
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and meta:
+                meta["checked"] = time.time()
+                cache.set_meta(url, meta)
+                return meta if meta["cacheable"] else None
+            if e.code in (405, 501):  # HEAD not allowed
+                return None
+            raise
+        size = resp.headers.get("Content-Length", None)
+        etag = resp.headers.get("ETag", None)
+        last_modified = resp.headers.get("Last-Modified", None)
+        meta = {
+            "url": url,
+            "size": int(size) if size else None,
+            "etag": etag,
+            "last_modified": last_modified,
+            "validator": etag or last_modified or size,
+            "content_type": resp.headers.get("Content-Type", None),
+            "cacheable": bool(size) and "bytes" in resp.headers.get("Accept-Ranges", "").lower(),
+            "checked": time.time(),
+        }
+        cache.set_meta(url, meta)
+        return meta if meta["cacheable"] else None
+
+    def _serve_from_cache(self, meta: Dict, send_body: bool):
+        """
+        Serve a range from the cached blocks. Missing blocks are fetched by windows of max_blocks_per_fetch blocks,
+        each one written to the client before the next one is fetched: large ranges are not held in memory
+        """
+        size = meta["size"]
+        requested = parse_range(self.headers.get("Range", None), size) if size else None
+        if requested is not None and requested[0] >= size:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        start, end = requested if requested else (0, size - 1)
+        first, last = start // block_size, end // block_size
+        # The first window is fetched before answering: if the resource changed, the request is passed through
+        window = {}
+        if send_body and size:
+            window = self._fetch_missing(meta, first, min(first + max_blocks_per_fetch - 1, last))
+
+        self.send_response(206 if requested else 200)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1 if size else 0))
+        if requested:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        for name, key in (("Content-Type", "content_type"), ("ETag", "etag"), ("Last-Modified", "last_modified")):
+            if meta.get(key):
+                self.send_header(name, meta[key])
+        self.end_headers()
+        self._headers_sent = True
+        if not send_body or not size:
+            return
+        for window_first in range(first, last + 1, max_blocks_per_fetch):
+            window_last = min(window_first + max_blocks_per_fetch - 1, last)
+            if window_first != first:
+                window = self._fetch_missing(meta, window_first, window_last)
+            for idx in range(window_first, window_last + 1):
+                block = window.get(idx, None) or self.server.cache.get_block(meta, idx)
+                if block is None:
+                    # Evicted in the meantime (the requested range is close to the size cap, or concurrent requests)
+                    block = self._fetch_missing(meta, idx, idx)[idx]
+                block_start = idx * block_size
+                chunk = block[max(start - block_start, 0): end - block_start + 1]
+                self.server.count("bytes_from_cache", len(chunk))
+                self.wfile.write(chunk)
+
+    def _fetch_missing(self, meta: Dict, first: int, last: int) -> Dict[int, bytes]:
+        """
+        Fetch the missing blocks between first and last (inclusive), adjacent ones in a single request. Callers keep
+        the range within max_blocks_per_fetch blocks
+        :return: the fetched blocks, by index
+        """
+        fetched = {}
+        cache = self.server.cache
+        missing = [idx for idx in range(first, last + 1) if not cache.has_block(meta, idx)]
+        self.server.count("block_hits", last - first + 1 - len(missing))
+        self.server.count("block_misses", len(missing))
+        for run_first, run_last in missing_runs(missing):
+            range_start = run_first * block_size
+            range_end = min((run_last + 1) * block_size, meta["size"]) - 1
+            # Blocks are byte ranges of the data itself: no compressed transfer
+            headers = {"Range": f"bytes={range_start}-{range_end}", "Accept-Encoding": "identity"}
+            if meta.get("etag") or meta.get("last_modified"):
+                # If the resource changed, the server sends it all (200) instead of the range
+                headers["If-Range"] = meta.get("etag") or meta.get("last_modified")
+            self.server.count("upstream_requests")
+            with urllib.request.urlopen(
+                    urllib.request.Request(meta["url"], headers=headers), timeout=upstream_timeout
+            ) as resp:
+                if resp.status != 206:
+                    raise _ResourceChanged()
+                for idx in range(run_first, run_last + 1):
+                    data = resp.read(min(block_size, meta["size"] - idx * block_size))
+                    self.server.count("bytes_from_upstream", len(data))
+                    cache.put_block(meta, idx, data)
+                    fetched[idx] = data
+        return fetched
+
+    def _pass_through(self, url: str, send_body: bool):
+        """
+        Forward the request upstream without caching (streaming services, servers without range support)
+        """
+        headers = {"Range": self.headers["Range"]} if self.headers.get("Range", None) else {}
+        # Content-Encoding is not forwarded: the body must stay as is
+        headers["Accept-Encoding"] = "identity"
+        self.server.count("upstream_requests")
+        try:
+            resp = urllib.request.urlopen(
+                urllib.request.Request(url, method=self.command, headers=headers), timeout=upstream_timeout
+            )
+        except urllib.error.HTTPError as e:
+            resp = e
+        with resp:
+            self.send_response(resp.status if hasattr(resp, "status") else resp.code)
+            for name in forwarded_headers:
+                if resp.headers.get(name, None):
+                    self.send_header(name, resp.headers[name])
+            if not resp.headers.get("Content-Length", None):
+                # The end of the body will be the end of the connection
+                self.send_header("Connection", "close")
+                self.close_connection = True
+            self.end_headers()
+            if send_body:
+                shutil.copyfileobj(resp, self.wfile)
+
+    def _send_status(self, status: int):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+class CachingProxyServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, cache: RangeCache, max_age: float = default_max_age):
+        super().__init__(address, CachingProxyHandler)
+        self.cache = cache
+        self.max_age = max_age
+        self._stats: Dict[str, int] = {}
+        self._stats_lock = threading.Lock()
+
+    def count(self, name: str, value: int = 1):
+        with self._stats_lock:
+            self._stats[name] = self._stats.get(name, 0) + value
+
+    def get_stats(self) -> Dict:
+        with self._stats_lock:
+            return dict(self._stats, cache_size=self.cache.size)
+
+
+def create_proxy(
+        host: str = default_host,
+        port: int = default_port,
+        cache_dir: str = default_cache_dir,
+        max_size: int = default_max_size,
+        max_age: float = default_max_age,
+) -> CachingProxyServer:
+    """
+    Create the caching proxy server. Call serve_forever() on it to run it
+    :param host:
+    :param port: 0 to pick a free port
+    :param cache_dir: where the cached blocks are stored
+    :param max_size: cache size cap, in bytes
+    :param max_age: seconds before a resource is revalidated upstream
+    :return:
+    """
+    return CachingProxyServer((host, port), RangeCache(cache_dir, max_size), max_age)
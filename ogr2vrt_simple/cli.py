@@ -13,14 +13,8 @@ import click
 import logging
 import os
 
-from ogr2vrt_simple.vrt_data_sources.file_source import FileSource
-from ogr2vrt_simple.vrt_data_sources.http_source import HttpSource
-
-# Handle the cases where you run it directly or as a built and installed package (2nd option)
-if __name__ == "__main__":
-    from utils import ogr_utils, io_utils
-else:
-    from .utils import ogr_utils, io_utils
+from ogr2vrt_simple.utils import string_utils
+from ogr2vrt_simple.vrt_data_sources import get_source
 
 logger = logging.getLogger()
 handler = logging.StreamHandler()
@@ -65,6 +59,130 @@ def cli():
     help="file extensions to look for when querying an archive (zip, tgz, etc). "
     "Defaults to a list of common data file extensions",
 )
+@click.option(
+    "--fields_include",
+    help="comma-separated list of the fields to keep, glob patterns allowed (e.g. 'code_*,nom'). Default: all",
+)
+@click.option(
+    "--fields_exclude",
+    help="comma-separated list of the fields to drop, glob patterns allowed",
+)
+@click.option(
+    "--where",
+    help="attribute filter, as an OGR SQL WHERE clause (e.g. \"dep = '59'\"). Generates a <SrcSql> statement",
+)
+@click.option(
+    "--union",
+    is_flag=True,
+    help="expose the layers sharing the same schema (e.g. one CSV per month) as a single union layer",
+)
+@click.option(
+    "--union_source_field",
+    help="union mode: name of a field holding the name of the layer each feature comes from",
+)
+@click.option(
+    "--preserve_fid",
+    is_flag=True,
+    help="union mode: keep the FIDs of the source layers (they might then not be unique)",
+)
+@click.option(
+    "--no_transcode",
+    is_flag=True,
+    help="do not transcode non-UTF-8 CSV files into a UTF-8 copy (OGR only reads UTF-8 CSV files)",
+)
+@click.option(
+    "--transcode_dir",
+    help="folder where the UTF-8 copies of non-UTF-8 CSV files are written. Default: a temporary folder",
+)
+@click.option(
+    "--transcode_in_place",
+    is_flag=True,
+    help="write the UTF-8 copies of non-UTF-8 CSV files beside the sources",
+)
+@click.option(
+    "--geojson_sample_size",
+    type=int,
+    help="large GeoJSON files: number of features the schema is sampled from, instead of letting OGR parse the "
+    "whole file. 0 to let OGR parse it anyway. Default: 1000",
+)
+@click.option(
+    "--geojson_sampling",
+    type=click.Choice(["head", "reservoir"]),
+    help="large GeoJSON files: sample the first features (head), or the whole file (reservoir, slower). "
+    "Default: head",
+)
+@click.option(
+    "--geojson_max_buffer",
+    type=int,
+    help="large GeoJSON files: memory ceiling for a single feature, in MB. Default: 64",
+)
+@click.option(
+    "--materialize",
+    type=click.Choice(["gpkg", "fgb", "parquet"], case_sensitive=False),
+    help="convert each layer into a local, indexed file of this format and point the VRT at it",
+)
+@click.option(
+    "--materialize_dir",
+    help="folder where the materialized files are written. Default: <out_file>_data, or 'materialized'",
+)
+@click.option(
+    "--ensure_indexes",
+    is_flag=True,
+    help="create the missing spatial indexes (and attribute indexes on --index_fields) of local, writable "
+    "shapefiles and GeoPackages",
+)
+@click.option(
+    "--index_fields",
+    help="comma-separated list of fields to create an attribute index on (materialized GeoPackages, or sources "
+    "with --ensure_indexes)",
+)
+@click.option(
+    "--max_memory_download",
+    type=float,
+    help="remote datasets downloaded for introspection are kept in memory up to this size, in MB, rather than "
+    "written to a temporary file. 0 to always use disk. Default: 8",
+)
+@click.option(
+    "--access_mode",
+    type=click.Choice(["vsicurl", "vsicurl_streaming", "download", "sample"]),
+    help="remote datasets: force how the data is introspected instead of choosing the cheapest way from network "
+    "measurements. download: from a local copy, sample: from the first MB only (CSV, GeoJSONSeq). The VRT still "
+    "points at the remote data",
+)
+@click.option(
+    "--max_access_cost",
+    type=float,
+    help="remote CSV and GeoJSONSeq datasets: above this estimated cost, in seconds, only a sample is introspected. "
+    "Default: 300",
+)
+@click.option(
+    "--cache_proxy",
+    help="probe and introspect remote sources through a running 'cache-proxy' instance, e.g. http://127.0.0.1:8766",
+)
+@click.option(
+    "--s3_endpoint",
+    help="s3:// sources: endpoint of the S3-compatible store, e.g. https://s3.fr-par.scw.cloud. "
+    "Default: AWS_S3_ENDPOINT environment variable, or AWS",
+)
+@click.option("--s3_region", help="s3:// sources: region. Default: AWS_REGION environment variable, or us-east-1")
+@click.option(
+    "--s3_anonymous",
+    is_flag=True,
+    help="s3:// sources: do not sign the requests (public buckets), even if AWS credentials are set",
+)
+@click.option(
+    "--server",
+    help="delegate the work to a running 'serve' instance: http://host:port or unix:///path/to/socket",
+)
+@click.option("--trace", help="write timing spans and counters for each phase to this JSON file")
+@click.option(
+    "--trace_format",
+    type=click.Choice(["chrome", "summary"]),
+    default="chrome",
+    help="trace file format: Chrome trace-event (chrome://tracing, perfetto) or a flat summary. Default: chrome",
+)
+@click.option("--trace_memory", is_flag=True, help="also record peak memory per phase (tracemalloc, slower)")
+@click.option("--profile", help="run under cProfile and dump the stats to this file")
 @click.option("--logfile", help="logfile path. Default: prints logs to the console")
 @click.option("-t", "--template", help="template file path. Default: templates/vrt.j2")
 @click.option("-v", "--verbose", is_flag=True, help="verbose output (debug loglevel)")
@@ -75,6 +193,34 @@ def generate_vrt(
     db_friendly,
     no_vsicurl,
     data_formats,
+    fields_include,
+    fields_exclude,
+    where,
+    union,
+    union_source_field,
+    preserve_fid,
+    no_transcode,
+    transcode_dir,
+    transcode_in_place,
+    geojson_sample_size,
+    geojson_sampling,
+    geojson_max_buffer,
+    materialize,
+    materialize_dir,
+    ensure_indexes,
+    index_fields,
+    max_memory_download,
+    access_mode,
+    max_access_cost,
+    cache_proxy,
+    s3_endpoint,
+    s3_region,
+    s3_anonymous,
+    server,
+    trace,
+    trace_format,
+    trace_memory,
+    profile,
     logfile,
     template,
     verbose,
@@ -84,7 +230,7 @@ def generate_vrt(
     Generate a VRT file from a OGR-compatible source. The result is to be considered as a "kickoff" VRT file, to
     refine according to your desires but it will save you some time.
 
-    SOURCE can be a local file or a remote URL
+    SOURCE can be a local file, a remote URL or an s3://bucket/prefix URL
     """
 
     config = {
@@ -92,18 +238,48 @@ def generate_vrt(
         "relative_to_file": relative_to_file,
         "db_friendly": db_friendly,
         "no_vsicurl": no_vsicurl,
-        "data_formats": _add_dots(data_formats),
+        "data_formats": string_utils.add_dots(data_formats),
         "template": template,
+        "fields_include": fields_include,
+        "fields_exclude": fields_exclude,
+        "where": where,
+        "union": union,
+        "union_source_field": union_source_field,
+        "preserve_fid": preserve_fid,
+        "transcode": not no_transcode,
+        "transcode_dir": transcode_dir,
+        "transcode_in_place": transcode_in_place,
+        "geojson_sample_size": geojson_sample_size,
+        "geojson_sampling": geojson_sampling,
+        "geojson_max_buffer": geojson_max_buffer * 1024 ** 2 if geojson_max_buffer else None,
+        "materialize": materialize,
+        "materialize_dir": materialize_dir or (f"{os.path.splitext(out_file)[0]}_data" if out_file else None),
+        "ensure_indexes": ensure_indexes,
+        "index_fields": index_fields,
+        "access_mode": access_mode,
+        "max_access_cost": max_access_cost,
+        "cache_proxy": cache_proxy,
+        "s3_endpoint": s3_endpoint,
+        "s3_region": s3_region,
+        "s3_anonymous": s3_anonymous,
+        "vsimem_max_size": None if max_memory_download is None else int(max_memory_download * 1024 ** 2),
     }
-    data_source = source
-    vrt_factory = None
-    if source.startswith("http"):
-        vrt_factory = HttpSource(data_source, config)
+    if server:
+        from ogr2vrt_simple.server import request_vrt
+
+        if not source.startswith(("http", "ftp://", "s3://")) and os.path.exists(source):
+            # the server might not run from the same working directory
+            source = os.path.abspath(source)
+        status, response = request_vrt(server, source, config)
+        if status != 200:
+            logger.error(f"Server error ({status}): {response.get('error', '')}")
+        vrt_xml = response.get("vrt", None)
     else:
-        vrt_factory = FileSource(data_source, config)
-    source_paths = vrt_factory.get_source_paths()
-    # print(source_paths)
-    vrt_xml = vrt_factory.build_vrt()
+        try:
+            vrt_xml = _build_vrt(source, config, trace, trace_format, trace_memory, profile)
+        except ValueError as e:
+            # Invalid filters: fail at generation time rather than when reading the VRT
+            raise click.ClickException(str(e))
     if vrt_xml:
         if out_file:
             with open(out_file, "w") as f:
@@ -115,21 +291,168 @@ def generate_vrt(
         logger.error("error build VRT file")
 
 
-def _add_dots(formats: str) -> str:
+def _build_vrt(
+    source: str,
+    config: dict,
+    trace: str = None,
+    trace_format: str = "chrome",
+    trace_memory: bool = False,
+    profile: str = None,
+) -> str:
+    """
+    Build the VRT, optionally under tracing and/or profiling
+    """
+    tracer = None
+    if trace:
+        from ogr2vrt_simple.utils import tracing
+
+        tracer = tracing.start_tracing(trace_memory)
+    profiler = None
+    if profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        with get_source(source, config) as vrt_factory:
+            if tracer:
+                with tracing.span("build_vrt", source=source):
+                    return vrt_factory.build_vrt()
+            return vrt_factory.build_vrt()
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(profile)
+            logger.info(f"Profiling stats written to {profile}")
+        if tracer:
+            tracing.stop_tracing()
+            tracer.write(trace, trace_format)
+            logger.info(f"Trace written to {trace}")
+
+
+@cli.command()
+@click.option("--out_dir", default=".", help="folder for the VRT files of entries without out_file. Default: .")
+@click.option("-w", "--workers", type=int, help="number of worker processes. Default: number of CPUs")
+@click.option(
+    "--threads",
+    is_flag=True,
+    help="use worker threads instead of processes: lighter, and faster when the sources are mostly remote",
+)
+@click.option("-d", "--db_friendly", is_flag=True, help="default for the entries' db_friendly option")
+@click.option("--no_vsicurl", is_flag=True, help="default for the entries' no_vsicurl option")
+@click.option("--data_formats", help="default for the entries' data_formats option")
+@click.option("-t", "--template", help="template file path. Default: templates/vrt.j2")
+@click.argument("manifest")
+def generate_batch(out_dir, workers, threads, db_friendly, no_vsicurl, data_formats, template, manifest):
+    """
+    Generate VRT files for all the sources listed in MANIFEST, on a process pool. Prints a JSON line per source
+    as soon as it is processed (status, output path, timings, layers and fields count, diagnostics).
+
+    MANIFEST is a JSONL or CSV file (- for stdin). Each entry has a source and optionally out_file,
+    db_friendly, no_vsicurl, data_formats, relative_to_file
+    """
+    import json
+    import sys
+
+    from ogr2vrt_simple import batch
+
+    entries = batch.read_manifest(manifest)
+    defaults = {
+        "db_friendly": db_friendly,
+        "no_vsicurl": no_vsicurl,
+        "data_formats": data_formats,
+        "template": template,
+    }
+    os.makedirs(out_dir, exist_ok=True)
+    failures = 0
+    for result in batch.run_batch(entries, defaults, out_dir, workers, threads):
+        if result["status"] != "ok":
+            failures += 1
+        click.echo(json.dumps(result))
+    logger.info(f"Processed {len(entries)} sources, {failures} failures")
+    if failures:
+        sys.exit(1)
+
+
+@cli.command()
+@click.option("--out_dir", help="folder where the VRT files are written. Default: next to their source")
+@click.option("--debounce", default=1.0, help="seconds of quiet on a source before regenerating. Default: 1")
+@click.option("--poll_interval", default=2.0, help="seconds between scans, when polling. Default: 2")
+@click.option("--polling", is_flag=True, help="poll the files even if filesystem events are available")
+@click.option("--no_initial_run", is_flag=True, help="do not generate missing or outdated VRT files at startup")
+@click.option("-d", "--db_friendly", is_flag=True, help="convert layer and field names to DB-friendly names")
+@click.option("--data_formats", help="file extensions to look for when querying an archive")
+@click.argument("paths", nargs=-1, required=True)
+def watch(out_dir, debounce, poll_interval, polling, no_initial_run, db_friendly, data_formats, paths):
+    """
+    Watch PATHS (files or directory trees) and regenerate the VRT file of each source when it changes.
+    Uses filesystem events if the watchdog library is installed, polling otherwise.
+    """
+    from ogr2vrt_simple.watcher import VrtWatcher
+
+    config = {
+        "db_friendly": db_friendly,
+        "data_formats": string_utils.add_dots(data_formats),
+    }
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    watcher = VrtWatcher(list(paths), config, out_dir, debounce, poll_interval, polling)
+    if not no_initial_run:
+        watcher.initial_run()
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
+
+
+@cli.command()
+@click.option("--host", default="127.0.0.1", help="interface to listen on. Default: 127.0.0.1")
+@click.option("--port", default=8765, help="port to listen on. Default: 8765")
+@click.option("--socket", "unix_socket", help="listen on this unix socket instead of host:port")
+@click.option("--workers", default=4, help="maximum number of requests processed concurrently. Default: 4")
+@click.option("--cache_size", default=256, help="maximum number of results kept in cache. Default: 256")
+def serve(host, port, unix_socket, workers, cache_size):
+    """
+    Run a local HTTP/JSON server generating VRT files. It keeps GDAL loaded and shares caches between requests,
+    which is much faster than calling generate-vrt repeatedly.
+
+    POST /vrt with {"source": "...", "config": {...}} returns {"vrt": "...", "information": {...}}
     """
-    In the OGR datasources we will want format extensions with a dot in front.
-    Add them if not provided by the user
-    :param formats:
-    :return:
+    from ogr2vrt_simple import server as vrt_server
+    from ogr2vrt_simple.utils import ogr_utils
+
+    ogr_utils.warm_up()
+    httpd = vrt_server.create_server(host, port, unix_socket, workers, cache_size)
+    logger.info(f"Serving on {unix_socket or f'http://{host}:{port}'}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+@cli.command()
+@click.option("--host", default="127.0.0.1", help="interface to listen on. Default: 127.0.0.1")
+@click.option("--port", default=8766, help="port to listen on. Default: 8766")
+@click.option("--cache_dir", help="folder where the cached byte ranges are stored. Default: ~/.cache/ogr2vrt_simple/ranges")
+@click.option("--max_size", default=1024, help="cache size cap, in MB. Default: 1024")
+@click.option("--max_age", default=3600, help="seconds before a resource is revalidated upstream. Default: 3600")
+def cache_proxy(host, port, cache_dir, max_size, max_age):
+    """
+    Run a local caching proxy for remote sources: byte ranges read by GDAL are stored on disk, so that repeated runs
+    against the same sources (with generate-vrt --cache_proxy) mostly avoid network traffic.
     """
-    if not formats:
-        return ""
-
-    fixed = []
-    for ext in formats.split(","):
-        if not ext.startswith("."):
-            fixed.append(f".{ext}")
-    return ",".join(fixed)
+    from ogr2vrt_simple import caching_proxy as proxy
+
+    httpd = proxy.create_proxy(host, port, cache_dir or proxy.default_cache_dir, max_size * 1024 * 1024, max_age)
+    logger.info(f"Caching proxy on http://{host}:{port}, cache in {httpd.cache.cache_dir}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,205 @@
+"""
+Long-running service mode: a local HTTP/JSON server generating VRT files on demand.
+Saves the cost of starting python, importing GDAL and setting up the templates on each call, and shares caches
+(GDAL's own /vsicurl/ cache, compiled templates, results) between requests.
+
+Request: POST /vrt with a JSON body {"source": "<URL or file path>", "config": {<same keys as the CLI config>}}
+Response: {"vrt": "<VRT XML>", "information": {<collect_information output>}}
+"""
+import http.client
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+from urllib.parse import urlparse
+
+default_host = "127.0.0.1"
+default_port = 8765
+default_workers = 4
+default_cache_size = 256
+request_timeout = 600
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache of the generated results. Entries are keyed by source and config, and only valid
+    as long as the source fingerprint does not change
+    """
+
+    def __init__(self, max_size: int = default_cache_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, fingerprint: str):
+        if not fingerprint:
+            return None
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is None or entry[0] != fingerprint:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: str, fingerprint: str, result: Dict):
+        if not fingerprint:
+            return
+        with self._lock:
+            self._entries[key] = (fingerprint, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+def process_request(payload: Dict, cache: ResultCache = None) -> Dict:
+    """
+    Generate the VRT for the source described in the payload
+    :param payload: dict with "source" (URL or file path) and optional "config" keys
+    :param cache: result cache. If None, always computes the result
+    :return: dict with "vrt" and "information" keys
+    """
+    from ogr2vrt_simple.vrt_data_sources import get_source
+
+    source = payload["source"]
+    config = payload.get("config", None) or {}
+    key = json.dumps([source, config], sort_keys=True)
+    # Closing the source frees its in-memory downloads right away, the server runs for a long time
+    with get_source(source, config) as data_source:
+        fingerprint = data_source.get_fingerprint() if cache else None
+        result = cache.get(key, fingerprint) if cache else None
+        if result is not None:
+            logging.debug(f"Serving {source} from cache")
+            return result
+
+        information = data_source.collect_information()
+        vrt_xml = data_source.build_vrt()
+    result = {"vrt": vrt_xml, "information": information}
+    if cache:
+        cache.put(key, fingerprint, result)
+    return result
+
+
+class VrtRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        else:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/vrt":
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length))
+            if not payload.get("source", None):
+                raise ValueError("Missing 'source' key")
+        except ValueError as e:
+            self._send_json(400, {"error": f"Invalid request: {e}"})
+            return
+        try:
+            # Runs on the bounded worker pool, the connection thread only waits for the result
+            future = self.server.executor.submit(process_request, payload, self.server.cache)
+            self._send_json(200, future.result(timeout=request_timeout))
+        except FileNotFoundError:
+            self._send_json(404, {"error": f"Source not found: {payload['source']}"})
+        except Exception as e:
+            logging.exception(f"Error processing {payload['source']}")
+            self._send_json(500, {"error": str(e)})
+
+    def address_string(self):
+        # Unix sockets don't provide a client address
+        return self.client_address[0] if self.client_address else "unix-socket"
+
+    def log_message(self, format, *args):
+        logging.debug("%s - %s" % (self.address_string(), format % args))
+
+    def _send_json(self, status: int, content: Dict):
+        body = json.dumps(content, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _ServerMixin:
+    daemon_threads = True
+
+    def setup_service(self, workers: int, cache_size: int):
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.cache = ResultCache(cache_size)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False)
+
+
+class VrtHTTPServer(_ServerMixin, ThreadingHTTPServer):
+    pass
+
+
+class VrtUnixHTTPServer(_ServerMixin, socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    pass
+
+
+def create_server(
+        host: str = default_host,
+        port: int = default_port,
+        unix_socket: str = None,
+        workers: int = default_workers,
+        cache_size: int = default_cache_size,
+):
+    """
+    Create the server. Listens on a unix socket if unix_socket is provided, on host:port otherwise
+    Call serve_forever() on the result to start serving
+    :return: server object
+    """
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        server = VrtUnixHTTPServer(unix_socket, VrtRequestHandler)
+    else:
+        server = VrtHTTPServer((host, port), VrtRequestHandler)
+    server.setup_service(workers, cache_size)
+    return server
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float = request_timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def request_vrt(server_url: str, source: str, config: Dict = None) -> Tuple[int, Dict]:
+    """
+    Thin client: ask a running server to generate the VRT
+    :param server_url: http://host:port or unix:///path/to/socket
+    :param source: URL or file path (as seen by the server)
+    :param config:
+    :return: tuple (HTTP status, response dict)
+    """
+    url = urlparse(server_url)
+    if url.scheme == "unix":
+        conn = _UnixHTTPConnection(url.path)
+    else:
+        conn = http.client.HTTPConnection(url.hostname, url.port or default_port, timeout=request_timeout)
+    try:
+        body = json.dumps({"source": source, "config": config or {}})
+        conn.request("POST", "/vrt", body=body, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        conn.close()
@@ -0,0 +1,266 @@
+"""
+Cost-based choice of how a remote dataset is introspected: /vsicurl/ (ranged reads), /vsicurl_streaming/ (a single
+sequential read), a full download, or sample-only introspection (the schema is read from the first bytes).
+Whatever the mode, the generated VRT points at the remote data whenever OGR can read it remotely: the local copy or
+sample is only read to describe the layers.
+Each mode's cost is estimated in seconds from cheap measurements (round-trip time, throughput measured on a small
+ranged read, Range support, advertised size) and from how the format is read: GeoPackages and shapefiles need many
+small random reads, CSV headers a single one, GeoJSON files are parsed to the end.
+"""
+import math
+import time
+import urllib.request
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from . import tracing
+
+VSICURL = "vsicurl"
+VSICURL_STREAMING = "vsicurl_streaming"
+DOWNLOAD = "download"
+SAMPLE = "sample"
+# By order of preference, when costs are close: remote paths make self-sufficient VRT files
+modes = [VSICURL, VSICURL_STREAMING, DOWNLOAD]
+remote_modes = [VSICURL, VSICURL_STREAMING]
+
+# Bytes read to measure the throughput
+default_probe_size = 256 * 1024
+# Bytes read to introspect a dataset in sample mode
+default_sample_size = 1024 ** 2
+# A mode further in the preference order must save at least this (seconds), and this share of the cost, to be chosen
+default_min_saving = 1.0
+min_saving_ratio = 0.1
+# Above this cost (seconds), sample-only introspection is used when the format allows it
+default_max_cost = 300.0
+# Size assumed for datasets whose size is not advertised (streaming services)
+assumed_size = 64 * 1024 ** 2
+# GDAL's /vsicurl/ reads at least CPL_VSIL_CURL_CHUNK_SIZE bytes per request, and doubles the size of the requests
+# of sequential reads
+vsicurl_chunk_size = 16 * 1024
+# Transfers shorter than this are not timed reliably
+min_transfer_time = 1e-4
+
+
+@dataclass(frozen=True)
+class NetworkMeasures:
+    rtt: float  # seconds
+    throughput: float  # bytes per second
+    range_support: bool
+
+
+@dataclass(frozen=True)
+class FormatReads:
+    """
+    How OGR reads a format to open it and describe its layers
+    """
+    requests: int  # random reads, each a round trip through /vsicurl/
+    fraction: float  # share of the file read
+    sequential: bool  # read front to back: /vsicurl_streaming/ works
+    sample: bool = False  # line-based: a truncated copy can be introspected
+
+
+format_reads = {
+    ".csv": FormatReads(1, 0.0, True, True),
+    ".geojson": FormatReads(1, 1.0, True),
+    ".json": FormatReads(1, 1.0, True),
+    ".geojsonl": FormatReads(1, 1.0, True, True),
+    ".geojsons": FormatReads(1, 1.0, True, True),
+    ".geojsonseq": FormatReads(1, 1.0, True, True),
+    ".gpkg": FormatReads(30, 0.01, False),
+    # .shp, .shx, .dbf, .prj and .cpg headers
+    ".shp": FormatReads(10, 0.0, False),
+    ".xlsx": FormatReads(6, 1.0, False),
+    ".ods": FormatReads(6, 1.0, False),
+    ".xls": FormatReads(4, 1.0, False),
+    # Archives: central directory and member headers. Compressed streams can't seek: read through
+    ".zip": FormatReads(4, 0.0, False),
+    ".tar.gz": FormatReads(1, 1.0, True),
+    ".tgz": FormatReads(1, 1.0, True),
+    ".rar": FormatReads(4, 1.0, False),
+    ".7z": FormatReads(4, 1.0, False),
+}
+unknown_format_reads = FormatReads(10, 1.0, False)
+
+
+@dataclass(frozen=True)
+class AccessPlan:
+    mode: str
+    estimates: Dict[str, Optional[float]]  # mode -> seconds, None when the mode can't be used
+    ranking: List[str]  # usable modes, cheapest first (sample excluded)
+    measures: Optional[NetworkMeasures] = None
+    comment: str = ""
+
+    @property
+    def remote_modes(self) -> List[str]:
+        """
+        Usable remote protocols, cheapest first
+        """
+        return [m for m in self.ranking if m in remote_modes]
+
+    def describe(self) -> Dict:
+        """
+        Diagnostics, JSON-serializable
+        """
+        return {
+            "mode": self.mode,
+            "estimates": {m: None if c is None else round(c, 3) for m, c in self.estimates.items()},
+            "rtt": round(self.measures.rtt, 4) if self.measures else None,
+            "throughput": round(self.measures.throughput) if self.measures else None,
+            "range_support": self.measures.range_support if self.measures else None,
+            "comment": self.comment,
+        }
+
+
+def get_format_reads(extension: str) -> FormatReads:
+    return format_reads.get((extension or "").lower(), unknown_format_reads)
+
+
+def measure_http(url: str, rtt: float = None, probe_size: int = default_probe_size) -> NetworkMeasures:
+    """
+    Read the first bytes of a URL (uncompressed ranged request) and time it
+    :param url:
+    :param rtt: round-trip time, if already measured (e.g. on the HEAD request). Default: time to the response
+    headers
+    :param probe_size: bytes read
+    :return:
+    """
+    headers = {"Range": f"bytes=0-{probe_size - 1}", "Accept-Encoding": "identity"}
+    request = urllib.request.Request(url, headers=headers)
+    with tracing.span("measure_network", url=url):
+        tracing.count("http_requests")
+        start = time.perf_counter()
+        with urllib.request.urlopen(request) as response:
+            headers_time = time.perf_counter()
+            # Servers without Range support send it all: stop after probe_size bytes
+            data = response.read(probe_size)
+            end = time.perf_counter()
+            range_support = response.status == 206
+    tracing.count("bytes_downloaded", len(data))
+    return NetworkMeasures(
+        rtt=headers_time - start if rtt is None else rtt,
+        throughput=len(data) / max(end - headers_time, min_transfer_time),
+        range_support=range_support,
+    )
+
+
+def _sequential_requests(nbytes: float) -> int:
+    """
+    Requests /vsicurl/ makes to read nbytes sequentially, doubling the size of each request
+    """
+    return max(1, math.ceil(math.log2(max(nbytes / vsicurl_chunk_size, 1)) + 1))
+
+
+def estimate_costs(
+        measures: NetworkMeasures,
+        size: Optional[int],
+        reads: FormatReads,
+        remote: bool = True,
+        sample_size: int = default_sample_size,
+) -> Dict[str, Optional[float]]:
+    """
+    Estimate the time each access mode takes to open the dataset and describe its layers
+    :param measures:
+    :param size: advertised size, None if unknown
+    :param reads: how the format is read
+    :param remote: whether OGR can open the dataset through a vsi protocol at all (URL, format, encoding)
+    :param sample_size:
+    :return: mode -> seconds, None when the mode can't be used
+    """
+    rtt, throughput = measures.rtt, measures.throughput
+    known_size = size is not None
+    size = size if known_size else assumed_size
+    read_bytes = reads.fraction * size
+    costs = {m: None for m in modes + [SAMPLE]}
+    # Stat (HEAD), then each random read, sequential parts being read with growing requests
+    if remote and measures.range_support and known_size:
+        requests = 1 + reads.requests + (_sequential_requests(read_bytes) if read_bytes else 0)
+        costs[VSICURL] = requests * rtt + max(read_bytes, reads.requests * vsicurl_chunk_size) / throughput
+    # Stat, then a single stream
+    if remote and reads.sequential:
+        costs[VSICURL_STREAMING] = 2 * rtt + max(read_bytes, vsicurl_chunk_size) / throughput
+    costs[DOWNLOAD] = rtt + size / throughput
+    if remote and reads.sample:
+        costs[SAMPLE] = rtt + min(size, sample_size) / throughput
+    return costs
+
+
+def choose(
+        costs: Dict[str, Optional[float]],
+        min_saving: float = default_min_saving,
+        max_cost: float = default_max_cost,
+) -> List[str]:
+    """
+    Rank the usable access modes. A mode goes before a mode preferred to it (see modes) only if it saves at least
+    min_saving seconds, and min_saving_ratio of its cost. Sample-only introspection comes first when all the other modes cost more than max_cost
+    :param costs: see estimate_costs
+    :param min_saving:
+    :param max_cost:
+    :return: usable modes, the chosen one first
+    """
+    ranking = []
+    candidates = [m for m in modes if costs.get(m, None) is not None]
+    while candidates:
+        best = candidates[0]
+        for m in candidates[1:]:
+            if costs[m] < costs[best] - max(min_saving, min_saving_ratio * costs[best]):
+                best = m
+        ranking.append(best)
+        candidates.remove(best)
+    if costs.get(SAMPLE, None) is not None and ranking and costs[ranking[0]] > max_cost:
+        ranking.insert(0, SAMPLE)
+    return ranking
+
+
+def plan(
+        measures: NetworkMeasures,
+        size: Optional[int],
+        extension: str,
+        remote: bool = True,
+        config: Dict = None,
+) -> AccessPlan:
+    """
+    Choose the access mode of a dataset
+    :param measures:
+    :param size: advertised size, None if unknown
+    :param extension: file extension, archive extensions included
+    :param remote: whether OGR can open the dataset through a vsi protocol at all
+    :param config: uses the access_min_saving, max_access_cost and access_sample_size keys
+    :return:
+    """
+    config = config or {}
+    costs = estimate_costs(
+        measures, size, get_format_reads(extension), remote,
+        config.get("access_sample_size", None) or default_sample_size,
+    )
+    min_saving = config.get("access_min_saving", None)
+    max_cost = config.get("max_access_cost", None)
+    ranking = choose(
+        costs,
+        default_min_saving if min_saving is None else min_saving,
+        default_max_cost if max_cost is None else max_cost,
+    )
+    estimates = ", ".join(f"{m} {c:.2f}s" for m, c in costs.items() if c is not None)
+    return AccessPlan(
+        mode=ranking[0],
+        estimates=costs,
+        ranking=[m for m in ranking if m != SAMPLE],
+        measures=measures,
+        comment=f"Estimated costs: {estimates}",
+    )
+
+
+def fixed_plan(mode: str, comment: str, ranking: List[str] = None) -> AccessPlan:
+    """
+    Plan decided without measurements (forced by the config, or no remote access possible)
+    :param mode:
+    :param comment:
+    :param ranking: usable modes. Default: the mode, then a download
+    """
+    if ranking is None:
+        ranking = [mode, DOWNLOAD]
+    return AccessPlan(
+        mode=mode,
+        estimates={m: None for m in modes + [SAMPLE]},
+        ranking=[m for m in dict.fromkeys(ranking) if m != SAMPLE],
+        comment=comment,
+    )
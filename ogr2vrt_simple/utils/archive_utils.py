@@ -0,0 +1,112 @@
+"""
+Read the members of local archives (.zip, .tar.gz/.tgz, .rar, .7z) as streams, without extracting them to disk.
+Used to detect the charset of CSV members from a bounded sample, and to transcode them into UTF-8 sidecars.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from . import tracing
+
+# Bytes read from the start of each member to detect its charset
+default_sample_size = 256 * 1024
+# Number of members sampled concurrently (each worker opens its own handle on the archive)
+default_workers = 4
+# Members whose charset matters: OGR reads CSV files as UTF-8
+text_extensions = [".csv"]
+
+
+@contextmanager
+def open_member(archive_path: str, ext: str, member: str, limit: int = None):
+    """
+    Open an archive member as a binary stream
+    :param archive_path:
+    :param ext: archive extension, one of archive_extension_list
+    :param member: member path in the archive
+    :param limit: number of bytes that will be read, if known. 7z members can't be streamed: they are decompressed
+    in memory, up to limit bytes
+    :return: context manager yielding a binary file object
+    """
+    if ext == ".zip":
+        import zipfile
+        with zipfile.ZipFile(archive_path, "r") as zip_file:
+            with zip_file.open(member) as f:
+                yield f
+    elif ext in (".tar.gz", ".tgz"):
+        from . import gzip_index
+        with gzip_index.open_tar(archive_path) as tar:
+            f = tar.extractfile(member)
+            if f is None:
+                raise KeyError(f"{member} is not a file")
+            with f:
+                yield f
+    elif ext == ".rar":
+        import rarfile
+        with rarfile.RarFile(archive_path) as rf:
+            with rf.open(member) as f:
+                yield f
+    elif ext == ".7z":
+        import py7zr
+        with py7zr.SevenZipFile(archive_path, mode="r") as z:
+            if hasattr(z, "read"):
+                # py7zr < 1.0
+                f = z.read(targets=[member])[member]
+            else:
+                from py7zr.io import BytesIOFactory
+                factory = BytesIOFactory(limit or 2 ** 62)
+                z.extract(targets=[member], factory=factory)
+                f = factory.get(member)
+                f.seek(0)
+            yield f
+    else:
+        raise ValueError(f"Compression format not supported ({ext})")
+
+
+def read_member_sample(archive_path: str, ext: str, member: str, size: int = default_sample_size) -> bytes:
+    """
+    :return: the first size bytes of an archive member (less if the member is smaller)
+    """
+    with open_member(archive_path, ext, member, size) as f:
+        return f.read(size)
+
+
+def detect_members_charsets(
+        archive_path: str,
+        ext: str,
+        members: List[str],
+        sample_size: int = None,
+        workers: int = None,
+) -> Dict[str, Optional[str]]:
+    """
+    Detect the charset of archive members, each from a sample streamed from the archive. Members are sampled
+    concurrently
+    :param archive_path:
+    :param ext: archive extension
+    :param members: member paths
+    :param sample_size: bytes read from each member. Default: default_sample_size
+    :param workers: number of concurrent workers. Default: default_workers
+    :return: dict member -> charset, None when it could not be detected (or the member could not be read)
+    """
+    import charset_normalizer
+
+    def _detect(member: str) -> Optional[str]:
+        with tracing.span("get_charset", path=member):
+            try:
+                sample = read_member_sample(archive_path, ext, member, sample_size or default_sample_size)
+            except Exception as e:
+                # Each archive library has its own errors (e.g. rarfile.RarCannotExec without an unrar tool,
+                # zipfile.BadZipFile, RuntimeError for encrypted members): the charset is then unknown
+                logging.debug(f"Could not read {member} from {archive_path}: {e}")
+                return None
+            cn = charset_normalizer.from_bytes(sample).best()
+        return cn.encoding if cn else None
+
+    if not members:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(workers or default_workers, len(members))) as executor:
+        return dict(zip(members, executor.map(_detect, members)))
+
+
+def is_text_member(member: str) -> bool:
+    return any(member.lower().endswith(e) for e in text_extensions)
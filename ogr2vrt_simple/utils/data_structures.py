@@ -2,12 +2,16 @@
 Data structures used for internal representation of the VRT configuration
 Uses dataclasses
 """
+import hashlib
 from dataclasses import dataclass, field
 
-from osgeo import ogr
-from typing import List
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
 
-from . import string_utils
+from . import geometry_utils, string_utils
+
+if TYPE_CHECKING:
+    # Only for type hints: the sources use SourceProfile, they should not have to load GDAL
+    from osgeo import ogr
 
 
 @dataclass
@@ -18,6 +22,18 @@ class FieldDefinition:
     width: int
 
 
+@dataclass
+class GeometryFieldDefinition:
+    name: str
+    output_name: str
+    type: str
+    srs: str = None
+    # When the geometry is not read from the source but built from columns (PointFromColumns)
+    encoding: str = None
+    x: str = None
+    y: str = None
+
+
 @dataclass
 class DataLayer:
     """
@@ -25,12 +41,40 @@ class DataLayer:
     CSV files, shapefiles, have only 1 layer. Excel, LibreOffice Calc, geopackage can have several
     """
 
-    ogr_layer: ogr.Layer
+    # None when the schema was not read by OGR, see from_schema
+    ogr_layer: Optional["ogr.Layer"]
     db_friendly: bool = field(default=True)
     layer_name: str = field(init=False)
     fields_definition: List[FieldDefinition] = field(init=False)
+    geometry_fields: List[GeometryFieldDefinition] = field(init=False)
+    # OGR SQL statement reading the layer, when rows are filtered (see filter_utils)
+    src_sql: str = field(default=None, init=False)
+    # Open options the VRT passes to the source driver
+    open_options: Dict[str, str] = field(default=None, init=False)
+
+    @classmethod
+    def from_schema(
+            cls,
+            layer_name: str,
+            fields_definition: List[FieldDefinition],
+            geometry_fields: List[GeometryFieldDefinition],
+    ) -> "DataLayer":
+        """
+        Build a layer from a schema computed without OGR (e.g. sampled from a GeoJSON stream)
+        :param layer_name:
+        :param fields_definition: output names are expected to be set already
+        :param geometry_fields:
+        :return:
+        """
+        layer = cls(ogr_layer=None)
+        layer.layer_name = layer_name
+        layer.fields_definition = fields_definition
+        layer.geometry_fields = geometry_fields
+        return layer
 
     def __post_init__(self):
+        if self.ogr_layer is None:
+            return
         self.layer_name = self.ogr_layer.GetName()
 
         defs = []
@@ -48,3 +92,76 @@ class DataLayer:
                 )
             )
         self.fields_definition = defs
+        self.geometry_fields = self._collect_geometry_fields(layer_schema)
+
+    def schema_fingerprint(self) -> str:
+        """
+        Identify the layer schema (fields names and types, geometry fields): layers with the same fingerprint can be
+        read as one. Does not depend on the layer name
+        :return:
+        """
+        h = hashlib.sha1()
+        for f in self.fields_definition:
+            h.update(f"{f.name}\x1f{f.type}\x1f{f.width}\x1e".encode("utf-8"))
+        for g in self.geometry_fields:
+            h.update(f"{g.name}\x1f{g.type}\x1f{g.srs}\x1f{g.encoding}\x1f{g.x}\x1f{g.y}\x1e".encode("utf-8"))
+        return h.hexdigest()
+
+    def _collect_geometry_fields(self, layer_schema: "ogr.FeatureDefn") -> List[GeometryFieldDefinition]:
+        """
+        List the geometry fields of the layer. When the layer has no geometry field (CSV, spreadsheets), look for
+        a pair of coordinate columns (lon/lat, x/y) to build point geometries from
+        :param layer_schema:
+        :return:
+        """
+        geoms = []
+        for geom_idx in range(layer_schema.GetGeomFieldCount()):
+            geom_field = layer_schema.GetGeomFieldDefn(geom_idx)
+            geoms.append(
+                GeometryFieldDefinition(
+                    geom_field.GetName(),
+                    string_utils.db_friendly_name(geom_field.GetName())
+                    if self.db_friendly
+                    else geom_field.GetName(),
+                    geometry_utils.geometry_type_name(geom_field.GetType()),
+                    geometry_utils.compact_srs(geom_field.GetSpatialRef()),
+                )
+            )
+        if geoms:
+            return geoms
+
+        coordinates = geometry_utils.find_coordinate_columns([f.name for f in self.fields_definition])
+        if coordinates:
+            x, y, srs = coordinates
+            geoms.append(
+                GeometryFieldDefinition(
+                    "geometry",
+                    "geometry",
+                    "wkbPoint",
+                    srs,
+                    encoding="PointFromColumns",
+                    x=x,
+                    y=y,
+                )
+            )
+        return geoms
+
+
+@dataclass(frozen=True)
+class SourceProfile:
+    """
+    Snapshot of the facts about a data source (see the sources' get_profile function), computed once. Immutable and
+    picklable: it can be passed to worker processes or kept in caches, and given back to a source object so that it
+    does not compute them again
+    """
+
+    url: str  # file path, for file sources
+    type: str
+    file_extension: str
+    is_archive: bool
+    is_streaming: bool
+    file_size: Optional[Tuple[int, str]]
+    charset: Optional[str]
+    fingerprint: Optional[str]
+    # (level of confidence 0-10, comments)
+    remote_access: Tuple[int, str]
@@ -0,0 +1,132 @@
+"""
+Column projection and row filtering, pushed into the generated VRT: only the needed fields are declared, and an
+attribute filter is turned into a <SrcSql> statement, so that the OGR driver only decodes the needed columns and rows.
+Filters are validated against the collected schema, so that a typo fails at generation time rather than when the
+VRT is read.
+"""
+import fnmatch
+from typing import Dict, List
+
+from . import tracing
+
+# FieldDefinition.type (OGR field type names) to OGR field types, to rebuild a schema for validation
+ogr_field_types = {
+    "Integer": "OFTInteger",
+    "Integer64": "OFTInteger64",
+    "Real": "OFTReal",
+    "Date": "OFTDate",
+    "Time": "OFTTime",
+    "DateTime": "OFTDateTime",
+    "Binary": "OFTBinary",
+}
+
+
+def parse_patterns(patterns: str) -> List[str]:
+    """
+    :param patterns: comma-separated list of field names or glob patterns (e.g. "code_*,nom")
+    :return: list of patterns
+    """
+    return [p.strip() for p in (patterns or "").split(",") if p.strip()]
+
+
+def match_any(name: str, patterns: List[str]) -> bool:
+    """
+    Case-insensitive glob matching
+    """
+    return any(fnmatch.fnmatchcase(name.lower(), p.lower()) for p in patterns)
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def select_fields(fields_definition: List, include: List[str], exclude: List[str]) -> List:
+    """
+    :param fields_definition: list of FieldDefinition
+    :param include: patterns of the fields to keep. Empty list to keep all fields
+    :param exclude: patterns of the fields to drop, applied after include
+    :return: the selected fields, in their original order
+    """
+    return [
+        f for f in fields_definition
+        if (not include or match_any(f.name, include)) and not match_any(f.name, exclude)
+    ]
+
+
+def build_src_sql(layer, fields: List, where: str) -> str:
+    """
+    Build the OGR SQL statement reading the fields and rows of a layer. Geometry fields are implicitly selected;
+    columns used to build geometries (PointFromColumns) are kept, since the VRT reads them
+    :param layer: DataLayer
+    :param fields: FieldDefinition list, the fields to read
+    :param where: attribute filter (OGR SQL WHERE clause)
+    :return: SQL statement
+    """
+    columns = [f.name for f in fields]
+    for geom in layer.geometry_fields:
+        for c in (geom.x, geom.y):
+            if c and c not in columns:
+                columns.append(c)
+    select = ", ".join(quote_identifier(c) for c in columns) if columns else "*"
+    sql = f"SELECT {select} FROM {quote_identifier(layer.layer_name)}"
+    if where:
+        sql += f" WHERE {where}"
+    return sql
+
+
+def validate_where(layer, where: str):
+    """
+    Check that the attribute filter is valid for the layer schema: apply it to an empty in-memory layer with the
+    same fields. Costs nothing compared to opening the source
+    :param layer: DataLayer
+    :param where: attribute filter
+    :raise ValueError: if the filter is invalid (syntax error, unknown field)
+    """
+    from osgeo import gdal, ogr
+
+    ds = ogr.GetDriverByName("Memory").CreateDataSource("")
+    mem_layer = ds.CreateLayer("validation", None, ogr.wkbNone)
+    for f in layer.fields_definition:
+        mem_layer.CreateField(ogr.FieldDefn(f.name, getattr(ogr, ogr_field_types.get(f.type, "OFTString"))))
+    gdal.PushErrorHandler("CPLQuietErrorHandler")
+    try:
+        gdal.ErrorReset()
+        err = mem_layer.SetAttributeFilter(where)
+        message = gdal.GetLastErrorMsg()
+    finally:
+        gdal.PopErrorHandler()
+    if err != 0:
+        raise ValueError(f"Invalid filter for layer {layer.layer_name}: {where} ({message})")
+
+
+def apply_filters(layers_collection: List[Dict], config: dict) -> List[Dict]:
+    """
+    Apply the fields_include, fields_exclude and where config keys to the layers of the collection: restrict their
+    fields definition and set their src_sql when rows are filtered. Layers are modified in place
+    :param layers_collection: as returned by the sources' collect_layers function
+    :param config: source config
+    :return: the layers collection
+    :raise ValueError: if a pattern does not match any field, or if the filter is invalid
+    """
+    include = parse_patterns(config.get("fields_include", None))
+    exclude = parse_patterns(config.get("fields_exclude", None))
+    where = config.get("where", None)
+    if not (include or exclude or where):
+        return layers_collection
+
+    with tracing.span("apply_filters"):
+        layers = [layer for c in layers_collection for layer in c["layers"]]
+        all_names = [f.name for layer in layers for f in layer.fields_definition]
+        unmatched = [p for p in include + exclude if not any(match_any(n, [p]) for n in all_names)]
+        if layers and unmatched:
+            raise ValueError(f"No field matches {', '.join(unmatched)}")
+        for layer in layers:
+            if where:
+                validate_where(layer, where)
+            fields = select_fields(layer.fields_definition, include, exclude)
+            if where:
+                layer.src_sql = build_src_sql(layer, fields, where)
+            # Without row filter, projecting the fields list is enough: the VRT driver tells the source layer to
+            # ignore the fields it does not declare
+            layer.fields_definition = fields
+    return layers_collection
@@ -0,0 +1,264 @@
+"""
+FTP helpers. The control connections are kept open and shared: one per host and user, re-used by all the sources
+of that host (logging in costs several round-trips). Sizes and modification times are read with SIZE/MDTM, or MLSD
+when the server does not support them, without downloading anything. Partial reads and downloads resume with REST.
+"""
+import ftplib
+import json
+import logging
+import os
+import posixpath
+import threading
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+from . import tracing
+
+default_timeout = 60
+block_size = 64 * 1024
+# Bytes read to detect the charset of a remote file
+sample_size = 64 * 1024
+part_suffix = ".part"
+
+
+def parse_url(url: str) -> Tuple[Tuple[str, int, str, str], str]:
+    """
+    :param url: ftp://[user[:password]@]host[:port]/path
+    :return: (connection key (host, port, user, password), file path)
+    """
+    u = urlparse(url)
+    key = (u.hostname, u.port or 21, unquote(u.username or "anonymous"), unquote(u.password or ""))
+    return key, unquote(u.path)
+
+
+class FtpConnectionPool:
+    """
+    One persistent control connection per (host, port, user). A control connection runs one command at a time:
+    operations on the same host are serialized
+    """
+
+    def __init__(self, timeout: float = default_timeout):
+        self.timeout = timeout
+        self._connections: Dict[Tuple, ftplib.FTP] = {}
+        self._locks: Dict[Tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def run(self, url: str, operation: Callable):
+        """
+        Run operation(ftp, path) on the connection of the URL's host. If the connection turns out to be closed
+        (e.g. idle timeout on the server side), reconnect and run it again: operations must be idempotent
+        :param url:
+        :param operation: function (ftplib.FTP, file path) -> result
+        :return: the operation's result
+        """
+        key, path = parse_url(url)
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            for attempt in range(2):
+                ftp = self._connections.get(key, None)
+                try:
+                    if ftp is None:
+                        ftp = self._connect(key)
+                        self._connections[key] = ftp
+                    return operation(ftp, path)
+                except ftplib.error_perm:
+                    # The command was refused (e.g. file not found): the connection is fine
+                    raise
+                except ftplib.all_errors as e:
+                    self._discard(key)
+                    if attempt:
+                        raise
+                    logging.debug(f"FTP connection to {key[0]} lost ({e}), reconnecting")
+
+    def _connect(self, key: Tuple) -> ftplib.FTP:
+        host, port, user, password = key
+        with tracing.span("ftp_connect", host=host):
+            tracing.count("ftp_connections")
+            ftp = ftplib.FTP(timeout=self.timeout)
+            ftp.connect(host, port)
+            ftp.login(user, password)
+        return ftp
+
+    def _discard(self, key: Tuple):
+        ftp = self._connections.pop(key, None)
+        if ftp is not None:
+            try:
+                ftp.close()
+            except ftplib.all_errors:
+                pass
+
+    def close_all(self):
+        with self._lock:
+            for key in list(self._connections):
+                ftp = self._connections.pop(key)
+                try:
+                    ftp.quit()
+                except ftplib.all_errors:
+                    ftp.close()
+
+
+pool = FtpConnectionPool()
+
+
+def _mlsd_facts(ftp: ftplib.FTP, path: str) -> Optional[Dict[str, str]]:
+    """
+    Facts about a file (size, modify), from the listing of its folder
+    """
+    folder, name = posixpath.split(path)
+    try:
+        # Servers send the size and modify facts by default, and not all of them support selecting facts (OPTS MLST)
+        for entry, facts in ftp.mlsd(folder or "/"):
+            if entry == name:
+                return facts
+    except ftplib.error_perm:
+        logging.debug("MLSD is not supported by the server")
+    return None
+
+
+def get_size(url: str) -> Optional[int]:
+    """
+    :return: file size in bytes, None if the server can't tell
+    """
+    def _size(ftp: ftplib.FTP, path: str):
+        try:
+            # SIZE is only reliable in binary mode
+            ftp.voidcmd("TYPE I")
+            return ftp.size(path)
+        except ftplib.error_perm:
+            facts = _mlsd_facts(ftp, path)
+            return int(facts["size"]) if facts and "size" in facts else None
+
+    return pool.run(url, _size)
+
+
+def get_modification_time(url: str) -> Optional[str]:
+    """
+    :return: modification time as YYYYMMDDHHMMSS, None if the server can't tell
+    """
+    def _modified(ftp: ftplib.FTP, path: str):
+        try:
+            return ftp.voidcmd(f"MDTM {path}")[4:].strip()
+        except ftplib.error_perm:
+            facts = _mlsd_facts(ftp, path)
+            return facts.get("modify", None) if facts else None
+
+    return pool.run(url, _modified)
+
+
+def _end_transfer(ftp: ftplib.FTP):
+    """
+    Read the reply of a transfer closed before its end: servers reply either 426 (aborted) or 226 (complete, if
+    they had already sent everything)
+    """
+    try:
+        ftp.voidresp()
+    except ftplib.error_temp:
+        pass
+
+
+def read_range(url: str, offset: int, length: int) -> bytes:
+    """
+    Read part of a file, starting at offset (REST), without downloading the rest
+    :param url:
+    :param offset:
+    :param length: maximum number of bytes read
+    :return: the bytes read, shorter than length at the end of the file
+    """
+    def _read(ftp: ftplib.FTP, path: str):
+        ftp.voidcmd("TYPE I")
+        data = bytearray()
+        conn = ftp.transfercmd(f"RETR {path}", rest=offset or None)
+        try:
+            while len(data) < length:
+                chunk = conn.recv(min(block_size, length - len(data)))
+                if not chunk:
+                    break
+                data += chunk
+        finally:
+            conn.close()
+        _end_transfer(ftp)
+        tracing.count("bytes_downloaded", len(data))
+        return bytes(data)
+
+    with tracing.span("ftp_read_range", url=url, offset=offset):
+        return pool.run(url, _read)
+
+
+def get_version(url: str) -> Dict[str, Optional[str]]:
+    """
+    :return: what identifies the current version of a file: {"size", "modified"}, None values when the server can't
+    tell
+    """
+    size = get_size(url)
+    return {"size": None if size is None else str(size), "modified": get_modification_time(url)}
+
+
+def _write_part_version(part: str, version: Dict[str, Optional[str]]):
+    """
+    Record, next to a .part file, the version of the file being downloaded
+    """
+    with open(part + ".json", "w") as f:
+        json.dump(version, f)
+
+
+def _can_resume(part: str, version: Dict[str, Optional[str]]) -> bool:
+    """
+    Whether a .part file is the beginning of that version of the file
+    """
+    if not os.path.exists(part):
+        return False
+    try:
+        with open(part + ".json") as f:
+            recorded = json.load(f)
+    except (FileNotFoundError, ValueError):
+        recorded = None
+    if recorded != version or not any(version.values()):
+        logging.debug(f"{part} is from another version of the file, or can't be checked: restarting the download")
+        return False
+    return True
+
+
+def download(url: str, filename: str) -> str:
+    """
+    Download a file. Data goes to <filename>.part first: an interrupted download resumes (REST) where it stopped,
+    within the run or on the next one, if the size and modification time of the remote file did not change
+    :param url:
+    :param filename:
+    :return: filename
+    """
+    part = filename + part_suffix
+    version = get_version(url)
+    if not _can_resume(part, version):
+        with open(part, "wb"):
+            pass
+        _write_part_version(part, version)
+
+    def _download(ftp: ftplib.FTP, path: str):
+        offset = os.path.getsize(part)
+        ftp.voidcmd("TYPE I")
+        with open(part, "ab" if offset else "wb") as f:
+            if offset:
+                logging.debug(f"Resuming the download of {url} at {offset} bytes")
+            ftp.retrbinary(f"RETR {path}", f.write, block_size, rest=offset or None)
+
+    with tracing.span("download_dataset", url=url):
+        pool.run(url, _download)
+        tracing.count("bytes_downloaded", os.path.getsize(part))
+    os.replace(part, filename)
+    os.remove(part + ".json")
+    return filename
+
+
+def download_to_buffer(url: str, max_size: int, spill_path: str) -> Tuple[Optional[bytearray], Optional[str]]:
+    """
+    Same as io_utils.download_to_buffer. Larger files resume from what was already read
+    """
+    version = get_version(url)
+    data = read_range(url, 0, max_size + 1)
+    if len(data) <= max_size:
+        return bytearray(data), None
+    with open(spill_path + part_suffix, "wb") as f:
+        f.write(data)
+    _write_part_version(spill_path + part_suffix, version)
+    return None, download(url, spill_path)
@@ -0,0 +1,480 @@
+"""
+GeoJSON fast path: the OGR GeoJSON driver parses and ingests the whole FeatureCollection to build the layer schema,
+which takes minutes and a lot of memory for multi-GB files. Instead, the document is streamed and the schema (fields
+names and types, geometry type, SRS) is derived from a sample of the features: the first ones, or a reservoir
+sample over the whole file. Newline-delimited GeoJSON (GeoJSONSeq) is supported too.
+Memory use is bounded: a single feature larger than the buffer ceiling stops the fast path, and the source is then
+introspected by OGR as usual.
+"""
+import codecs
+import json
+import logging
+import os
+import random
+import re
+from typing import Dict, Iterator, List, Optional
+
+from . import string_utils, tracing
+
+# Files smaller than this are introspected by OGR, which is exact and fast enough for them
+fast_path_min_size = 16 * 1024 ** 2
+default_sample_size = 1000
+default_max_buffer = 64 * 1024 ** 2
+read_size = 1024 ** 2
+geojson_extensions = [".geojson", ".json"]
+geojsonseq_extensions = [".geojsonl", ".geojsons", ".geojsonseq"]
+# The consumers' GeoJSON driver should type the fields the way the sample was typed, whatever comes after the sample
+feature_collection_open_options = {"DATE_AS_STRING": "YES", "ARRAY_AS_STRING": "YES"}
+
+geometry_types = {
+    "Point": "wkbPoint",
+    "LineString": "wkbLineString",
+    "Polygon": "wkbPolygon",
+    "MultiPoint": "wkbMultiPoint",
+    "MultiLineString": "wkbMultiLineString",
+    "MultiPolygon": "wkbMultiPolygon",
+    "GeometryCollection": "wkbGeometryCollection",
+}
+# Same guesses as the OGR GeoJSON driver, when dates are not read as strings
+date_patterns = [
+    ("DateTime", re.compile(r"^\d{4}[-/]\d{2}[-/]\d{2}[T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}(:?\d{2})?)?$")),
+    ("Date", re.compile(r"^\d{4}[-/]\d{2}[-/]\d{2}$")),
+    ("Time", re.compile(r"^\d{2}:\d{2}(:\d{2}(\.\d+)?)?$")),
+]
+int32_range = (-2 ** 31, 2 ** 31 - 1)
+# Characters that matter to find the end of an object or array, outside and inside strings
+structural_chars = re.compile(r'["{}\[\]]')
+string_chars = re.compile(r'["\\]')
+
+
+class SampleTooLarge(Exception):
+    pass
+
+
+def is_geojson_path(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in geojson_extensions + geojsonseq_extensions
+
+
+def _open(path: str):
+    """
+    Open a file for binary reading: through GDAL's virtual file system for /vsi paths (archive members, remote
+    files), directly otherwise
+    """
+    if not path.startswith("/vsi"):
+        return open(path, "rb")
+    from osgeo import gdal
+
+    class _VsiFile:
+        def __init__(self):
+            self.f = gdal.VSIFOpenL(path, "rb")
+            if self.f is None:
+                raise FileNotFoundError(path)
+
+        def read(self, n: int) -> bytes:
+            return gdal.VSIFReadL(1, n, self.f)
+
+        def close(self):
+            gdal.VSIFCloseL(self.f)
+
+    return _VsiFile()
+
+
+def file_size(path: str) -> Optional[int]:
+    if not path.startswith("/vsi"):
+        return os.path.getsize(path)
+    from osgeo import gdal
+
+    stat = gdal.VSIStatL(path)
+    return stat.size if stat is not None else None
+
+
+class _ValueScanner:
+    """
+    Find the end of a JSON object or array, chunk after chunk: each chunk is scanned once, whatever the number of
+    chunks the value spans
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        # A backslash ended the previous chunk: the first character of the next one is escaped
+        self.escape_pending = False
+
+    def scan(self, text: str, pos: int) -> int:
+        """
+        :param text: chunk
+        :param pos: where to start scanning text
+        :return: the offset in text just after the end of the value, -1 if it goes on in the next chunk
+        """
+        if self.escape_pending and pos < len(text):
+            self.escape_pending = False
+            pos += 1
+        while True:
+            if self.in_string:
+                m = string_chars.search(text, pos)
+                if m is None:
+                    return -1
+                if m.group() == "\\":
+                    pos = m.end() + 1
+                    if pos > len(text):
+                        self.escape_pending = True
+                        return -1
+                    continue
+                self.in_string = False
+            else:
+                m = structural_chars.search(text, pos)
+                if m is None:
+                    return -1
+                c = m.group()
+                if c == '"':
+                    self.in_string = True
+                elif c in "{[":
+                    self.depth += 1
+                else:
+                    self.depth -= 1
+                    if self.depth == 0:
+                        return m.end()
+            pos = m.end()
+
+
+class JsonStream:
+    """
+    Decode the JSON values of a document one after the other, reading it by chunks: only the value being decoded
+    is held in memory
+    """
+
+    def __init__(self, f, max_buffer: int = default_max_buffer):
+        self.f = f
+        self.max_buffer = max_buffer
+        self.decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _read(self) -> str:
+        if self.eof:
+            return ""
+        chunk = self.f.read(read_size)
+        self.eof = not chunk
+        return self.decoder.decode(chunk, final=self.eof)
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        self.buffer = self.buffer[self.pos:] + self._read()
+        self.pos = 0
+        if len(self.buffer) > self.max_buffer:
+            raise SampleTooLarge(f"A single value is larger than the {self.max_buffer} bytes buffer")
+        return not self.eof or len(self.buffer) > 0
+
+    def peek(self, skip: str = " \t\r\n") -> str:
+        """
+        :param skip: characters to skip before the next one
+        :return: the next significant character, "" at the end of the document
+        """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in skip:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r}, got {self.peek()!r}")
+        self.pos += 1
+
+    def value(self):
+        """
+        Decode the next JSON value
+        """
+        if self.peek() in ("{", "["):
+            return self._container_value()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buffer, self.pos)
+                # A number at the end of the buffer might be cut
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def _container_value(self):
+        """
+        Decode the object or array starting at the current position. Its end is found first, scanning each chunk
+        once, then it is decoded once: decoding from its start after every read would be quadratic in the number of
+        chunks it spans. The chunks are only joined once the end is found, the consumed ones are dropped
+        """
+        scanner = _ValueScanner()
+        parts = []
+        size = 0
+        text, start = self.buffer, self.pos
+        end = scanner.scan(text, start)
+        while end < 0:
+            parts.append(text[start:])
+            size += len(text) - start
+            if size > self.max_buffer:
+                raise SampleTooLarge(f"A single value is larger than the {self.max_buffer} bytes buffer")
+            text, start = self._read(), 0
+            if not text and self.eof:
+                raise ValueError("Unexpected end of the document")
+            end = scanner.scan(text, 0)
+        parts.append(text[start:end])
+        self.buffer, self.pos = text, end
+        return self.json_decoder.decode("".join(parts))
+
+
+def iter_features(path: str, max_buffer: int = default_max_buffer, header: Dict = None) -> Iterator[Dict]:
+    """
+    Stream the features of a GeoJSON FeatureCollection or GeoJSONSeq file
+    :param path:
+    :param max_buffer: memory ceiling, in bytes, for a single feature
+    :param header: filled with the FeatureCollection members found before the features (name, crs), and with a
+    "sequence" key telling whether the file is a GeoJSONSeq one
+    :return: iterator on the features (dicts)
+    """
+    header = header if header is not None else {}
+    f = _open(path)
+    try:
+        stream = JsonStream(f, max_buffer)
+        first = stream.peek()
+        header["sequence"] = first == "\x1e" or os.path.splitext(path)[1].lower() in geojsonseq_extensions
+        if header["sequence"]:
+            # One feature per line, optionally prefixed by a record separator (RFC 8142)
+            while stream.peek(" \t\r\n\x1e"):
+                yield stream.value()
+            return
+
+        stream.expect("{")
+        while stream.peek() not in ("}", ""):
+            key = stream.value()
+            stream.expect(":")
+            if key != "features":
+                value = stream.value()
+                if key in ("name", "crs", "type"):
+                    header[key] = value
+                if key == "type" and value != "FeatureCollection":
+                    raise ValueError(f"Not a FeatureCollection ({value})")
+            else:
+                header["features"] = True
+                stream.expect("[")
+                while stream.peek() not in ("]", ""):
+                    yield stream.value()
+                    if stream.peek() == ",":
+                        stream.pos += 1
+                stream.expect("]")
+            if stream.peek() == ",":
+                stream.pos += 1
+    finally:
+        f.close()
+
+
+def sample_features(features: Iterator[Dict], size: int, reservoir: bool = False) -> List[Dict]:
+    """
+    :param features:
+    :param size: sample size
+    :param reservoir: sample the whole stream (reservoir sampling) rather than taking the first features
+    :return:
+    """
+    sample = []
+    if not reservoir:
+        for feature in features:
+            sample.append(feature)
+            if len(sample) >= size:
+                break
+        return sample
+    rng = random.Random(0)  # reproducible VRT files
+    for idx, feature in enumerate(features):
+        if idx < size:
+            sample.append(feature)
+        else:
+            j = rng.randint(0, idx)
+            if j < size:
+                sample[j] = feature
+    return sample
+
+
+def value_type(value, dates: bool = True, lists: bool = True) -> Optional[str]:
+    """
+    OGR field type of a JSON value, as the GeoJSON driver types it
+    :param value:
+    :param dates: detect date, time and datetime strings
+    :param lists: type arrays as lists (IntegerList, etc.). Otherwise arrays are strings
+    :return: OGR field type name, None for null values
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return "Integer"
+    if isinstance(value, int):
+        return "Integer" if int32_range[0] <= value <= int32_range[1] else "Integer64"
+    if isinstance(value, float):
+        return "Real"
+    if isinstance(value, str):
+        if dates:
+            for name, pattern in date_patterns:
+                if pattern.match(value):
+                    return name
+        return "String"
+    if isinstance(value, list) and lists:
+        item_type = None
+        for item in value:
+            item_type = merge_types(item_type, value_type(item, dates=False, lists=False))
+        if item_type in ("Integer", "Integer64", "Real", "String"):
+            return item_type + "List"
+    return "String"
+
+
+def merge_types(current: Optional[str], new: Optional[str]) -> Optional[str]:
+    """
+    Widen a field type so that it holds the values of both types
+    """
+    if current is None or current == new:
+        return new
+    if new is None:
+        return current
+    pair = {current, new}
+    for widened in ("Integer64", "Real"):
+        numeric = {"Integer", "Integer64", "Real"} if widened == "Real" else {"Integer", "Integer64"}
+        if pair <= numeric:
+            return widened
+        if pair <= {t + "List" for t in numeric}:
+            return widened + "List"
+    if pair == {"Date", "DateTime"}:
+        return "DateTime"
+    return "String"
+
+
+def geometry_type(features: List[Dict]) -> str:
+    """
+    Layer geometry type: the type shared by all the geometries, promoted to its multi variant when single and
+    multi geometries are mixed, wkbUnknown otherwise. 25D suffix when coordinates have a Z value
+    """
+    types = set()
+    has_z = False
+    for feature in features:
+        geom = feature.get("geometry", None)
+        if not geom:
+            continue
+        types.add(geom.get("type", None))
+        if not has_z:
+            has_z = _has_z(geom.get("coordinates", None))
+    types.discard(None)
+    if len(types) == 1:
+        name = geometry_types.get(types.pop(), "wkbUnknown")
+    elif len(types) == 2 and any(f"Multi{t}" in types for t in types):
+        name = geometry_types[next(t for t in types if t.startswith("Multi"))]
+    else:
+        return "wkbUnknown"
+    return name + "25D" if has_z and name != "wkbUnknown" else name
+
+
+def _has_z(coordinates) -> bool:
+    # Look at the first position only
+    while isinstance(coordinates, list) and coordinates and isinstance(coordinates[0], list):
+        coordinates = coordinates[0]
+    return isinstance(coordinates, list) and len(coordinates) > 2
+
+
+def feature_id_type(features: List[Dict]) -> Optional[str]:
+    """
+    Feature-level id members, as the GeoJSON driver reads them: non-negative integers are used as FIDs, other ids
+    (strings, negative integers) end up in an id field, unless the properties have an id member already
+    :return: type of the id field, None if there is none
+    """
+    ids = [feature["id"] for feature in features if feature.get("id", None) is not None]
+    if any("id" in (feature.get("properties", None) or {}) for feature in features):
+        return None
+    if all(isinstance(i, int) and not isinstance(i, bool) and i >= 0 for i in ids):
+        return None
+    id_type = None
+    for i in ids:
+        id_type = merge_types(id_type, value_type(i, dates=False, lists=False))
+    return id_type
+
+
+def crs_name(crs: Dict) -> str:
+    """
+    SRS from a (pre-RFC 7946) crs member. RFC 7946 GeoJSON is always WGS84
+    """
+    name = ((crs or {}).get("properties", None) or {}).get("name", "")
+    m = re.match(r"^urn:ogc:def:crs:EPSG:[\d.]*:(\d+)$", name) or re.match(r"^EPSG:(\d+)$", name)
+    if m:
+        return f"EPSG:{m[1]}"
+    return "EPSG:4326"
+
+
+def collect_layers(path: str, db_friendly: bool = True, config: dict = None):
+    """
+    Same as ogr_utils.collect_layers, with the GeoJSON fast path for large GeoJSON files. Other files are collected
+    by OGR
+    :param path: file path, vsi prefixes allowed
+    :param db_friendly:
+    :param config: uses the geojson_sample_size (0 to disable the fast path), geojson_sampling (head or reservoir)
+    and geojson_max_buffer (bytes) keys
+    :return: list of DataLayer
+    """
+    from . import ogr_utils
+
+    config = config or {}
+    sample_size = config.get("geojson_sample_size", None)
+    sample_size = default_sample_size if sample_size is None else sample_size
+    if not sample_size or not is_geojson_path(path) or (file_size(path) or 0) < fast_path_min_size:
+        return ogr_utils.collect_layers(path, db_friendly)
+    try:
+        with tracing.span("geojson_sample", path=path):
+            return [sample_layer(
+                path, db_friendly, sample_size, config.get("geojson_sampling", None) == "reservoir",
+                config.get("geojson_max_buffer", None) or default_max_buffer,
+            )]
+    except (SampleTooLarge, ValueError) as e:
+        logging.info(f"GeoJSON fast path not usable for {path} ({e}), opening it with OGR")
+        return ogr_utils.collect_layers(path, db_friendly)
+
+
+def sample_layer(path: str, db_friendly: bool = True, sample_size: int = default_sample_size,
+                 reservoir: bool = False, max_buffer: int = default_max_buffer):
+    """
+    Build the DataLayer of a GeoJSON file from a sample of its features
+    :return: DataLayer
+    :raise ValueError: if the file is not a GeoJSON FeatureCollection or GeoJSONSeq file
+    :raise SampleTooLarge: if a feature does not fit in max_buffer
+    """
+    from .data_structures import DataLayer, FieldDefinition, GeometryFieldDefinition
+
+    header = {}
+    stream = iter_features(path, max_buffer, header)
+    try:
+        features = sample_features(stream, sample_size, reservoir)
+    finally:
+        stream.close()
+    if not header["sequence"] and not (header.get("features", False) or header.get("type", None)):
+        raise ValueError("No features member found")
+    tracing.count("geojson_sampled_features", len(features))
+    # The GeoJSONSeq driver has no option to read dates and arrays as strings: type them as it does
+    typed_like_driver = header["sequence"]
+    types: Dict[str, Optional[str]] = {}
+    id_type = feature_id_type(features)
+    if id_type:
+        types["id"] = id_type
+    for feature in features:
+        for name, value in (feature.get("properties", None) or {}).items():
+            types[name] = merge_types(types.get(name, None), value_type(value, typed_like_driver, typed_like_driver))
+
+    layer_name = header.get("name", None) or os.path.splitext(os.path.basename(path))[0]
+    layer = DataLayer.from_schema(
+        layer_name,
+        [
+            FieldDefinition(name, string_utils.db_friendly_name(name) if db_friendly else name, t or "String", 0)
+            for name, t in types.items()
+        ],
+        [GeometryFieldDefinition("", "", geometry_type(features), crs_name(header.get("crs", None)))],
+    )
+    if not header["sequence"]:
+        layer.open_options = dict(feature_collection_open_options)
+    return layer
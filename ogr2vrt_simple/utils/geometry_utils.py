@@ -0,0 +1,103 @@
+"""
+Utility functions around geometries: geometry types, spatial reference systems and coordinate columns
+"""
+from typing import List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from osgeo import osr
+
+# Names as expected by the OGR VRT driver in <GeometryType> elements
+vrt_geometry_type_names = [
+    "wkbUnknown",
+    "wkbNone",
+    "wkbPoint",
+    "wkbLineString",
+    "wkbPolygon",
+    "wkbMultiPoint",
+    "wkbMultiLineString",
+    "wkbMultiPolygon",
+    "wkbGeometryCollection",
+    "wkbPoint25D",
+    "wkbLineString25D",
+    "wkbPolygon25D",
+    "wkbMultiPoint25D",
+    "wkbMultiLineString25D",
+    "wkbMultiPolygon25D",
+    "wkbGeometryCollection25D",
+    "wkbPointM",
+    "wkbLineStringM",
+    "wkbPolygonM",
+    "wkbMultiPointM",
+    "wkbMultiLineStringM",
+    "wkbMultiPolygonM",
+    "wkbGeometryCollectionM",
+    "wkbPointZM",
+    "wkbLineStringZM",
+    "wkbPolygonZM",
+    "wkbMultiPointZM",
+    "wkbMultiLineStringZM",
+    "wkbMultiPolygonZM",
+    "wkbGeometryCollectionZM",
+]
+
+# Candidate (x, y) column names, looked up case-insensitively. The boolean tells whether the pair
+# is expected to hold geographic coordinates (hence WGS84)
+coordinate_column_pairs = [
+    ("longitude", "latitude", True),
+    ("lon", "lat", True),
+    ("long", "lat", True),
+    ("lng", "lat", True),
+    ("x", "y", False),
+    ("easting", "northing", False),
+]
+wgs84_srs = "EPSG:4326"
+
+
+def geometry_type_name(geom_type: int) -> str:
+    """
+    Convert an OGR geometry type code into the name used by the VRT driver (e.g. wkbPolygon)
+    :param geom_type: OGR geometry type code, as returned by GetGeomType()
+    :return: geometry type name. Defaults to wkbUnknown if the type is not a known one
+    """
+    from osgeo import ogr
+
+    for name in vrt_geometry_type_names:
+        if getattr(ogr, name, None) == geom_type:
+            return name
+    return "wkbUnknown"
+
+
+def compact_srs(srs: "osr.SpatialReference") -> Optional[str]:
+    """
+    Express a spatial reference system in the most compact way we can: an authority code (e.g. EPSG:2154) if
+    we can identify it, the WKT definition otherwise
+    :param srs:
+    :return: SRS string, None if no SRS is provided
+    """
+    if srs is None:
+        return None
+    srs = srs.Clone()
+    if not srs.GetAuthorityName(None):
+        srs.AutoIdentifyEPSG()
+    authority = srs.GetAuthorityName(None)
+    code = srs.GetAuthorityCode(None)
+    if authority and code:
+        return f"{authority}:{code}"
+    return srs.ExportToWkt()
+
+
+def find_coordinate_columns(field_names: List[str]) -> Optional[Tuple[str, str, Optional[str]]]:
+    """
+    Look for a pair of fields that looks like point coordinates (lon/lat, x/y etc)
+    :param field_names: source field names
+    :return: tuple (x field name, y field name, SRS or None) or None if no pair was found
+    """
+    lowercase_names = {f.lower(): f for f in field_names}
+    for x, y, is_geographic in coordinate_column_pairs:
+        if x in lowercase_names and y in lowercase_names:
+            return (
+                lowercase_names[x],
+                lowercase_names[y],
+                wgs84_srs if is_geographic else None,
+            )
+    return None
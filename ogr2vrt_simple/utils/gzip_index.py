@@ -0,0 +1,209 @@
+"""
+Access to the members of gzip-compressed tar archives (.tar.gz, .tgz).
+A gzip stream can only be read from its start: opening N members one after the other (what /vsitar/ does when we
+collect the layers of each candidate path) decompresses the archive up to N times.
+Two ways around it:
+  * if the indexed_gzip library is installed, a seek-point index is built once and cached beside the archive
+    (<archive>.gzidx, the archive size and modification time it was built for being recorded in <archive>.gzidx.json).
+    Reading a member then only decompresses from the closest seek point.
+  * otherwise, the candidate members are extracted in a single sequential pass over the archive.
+Extraction can be bounded: only the head of line-based members (their schema is read from the first lines), and
+no copy at all of members above a size cap. Callers that need the whole content of some members (e.g. to transcode
+them) get it during the same pass, see extract_members' on_extract.
+"""
+import json
+import logging
+import os
+import shutil
+import tarfile
+import threading
+from contextlib import contextmanager
+from typing import BinaryIO, Callable, Dict, List, Optional
+
+from . import tracing
+
+try:
+    import indexed_gzip
+except ImportError:
+    indexed_gzip = None
+
+index_extension = ".gzidx"
+# Distance between 2 seek points, in uncompressed bytes. Smaller means faster seeks but a bigger index
+index_spacing = 4 * 1024 ** 2
+
+
+def index_path(archive_path: str) -> str:
+    return archive_path + index_extension
+
+
+def _archive_stamp(archive_path: str) -> Dict:
+    stat = os.stat(archive_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def has_fresh_index(archive_path: str) -> bool:
+    """
+    Whether an index was saved beside the archive for its current version. The archive size and modification time
+    are compared to the ones recorded with the index: comparing the index and archive modification times would trust
+    a stale index after the archive is replaced by an older copy (cp -p, rsync -t)
+    """
+    idx = index_path(archive_path)
+    try:
+        with open(idx + ".json") as f:
+            stamp = json.load(f)
+        return os.path.getsize(idx) > 0 and stamp == _archive_stamp(archive_path)
+    except (OSError, ValueError):
+        return False
+
+
+def save_index(gz, archive_path: str, stamp: Dict):
+    """
+    Save the index of an opened archive beside it, with the archive stamp it was built for. Both files are written
+    atomically: a concurrent run, or an interrupted one, never leaves a truncated index behind
+    :param gz: indexed_gzip.IndexedGzipFile with a full index
+    :param archive_path:
+    :param stamp: archive size and modification time, read before the index was built
+    """
+    idx = index_path(archive_path)
+    # Unique per thread too: the same archive can be opened by several sources at once
+    suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        gz.export_index(idx + suffix)
+        os.replace(idx + suffix, idx)
+        with open(idx + ".json" + suffix, "w") as f:
+            json.dump(stamp, f)
+        os.replace(idx + ".json" + suffix, idx + ".json")
+    except OSError as e:
+        # Read-only folder: the index is still used for this run
+        logging.debug(f"Could not save the gzip index {idx}: {e}")
+        for path in (idx + suffix, idx + ".json" + suffix):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+@contextmanager
+def open_tar(archive_path: str):
+    """
+    Open a gzip-compressed tar archive. When possible, the archive is opened through a gzip seek-point index, which is
+    built on first use and stored beside the archive for the next runs
+    :param archive_path:
+    :return: context manager yielding a tarfile.TarFile
+    """
+    if indexed_gzip is None:
+        with tarfile.open(archive_path, "r:gz") as tar:
+            yield tar
+        return
+
+    idx = index_path(archive_path)
+    gz = None
+    if has_fresh_index(archive_path):
+        try:
+            gz = indexed_gzip.IndexedGzipFile(archive_path, index_file=idx)
+        except Exception as e:
+            # Corrupted index (indexed_gzip raises ZranError, a plain Exception, among others): build it again
+            logging.warning(f"Could not load the gzip index {idx}, rebuilding it: {e}")
+    if gz is None:
+        stamp = _archive_stamp(archive_path)
+        gz = indexed_gzip.IndexedGzipFile(archive_path, spacing=index_spacing)
+        with tracing.span("build_gzip_index", path=archive_path):
+            gz.build_full_index()
+        save_index(gz, archive_path, stamp)
+    try:
+        with tarfile.open(fileobj=gz, mode="r:") as tar:
+            yield tar
+    finally:
+        gz.close()
+
+
+def extract_members(
+        archive_path: str,
+        select: Callable[[str], bool],
+        out_dir: str,
+        head_size: Callable[[str], Optional[int]] = None,
+        max_size: int = None,
+        on_extract: Callable[[str, str, BinaryIO], None] = None,
+) -> List[str]:
+    """
+    Extract the archive members selected by select(member name) into out_dir.
+    Uses random access if an index is available, a single sequential pass over the archive otherwise
+    :param archive_path:
+    :param select: function telling whether a member (by name) should be extracted. Called for every file member,
+    in archive order
+    :param out_dir:
+    :param head_size: function giving, for a member name, the number of bytes to extract for a line-based member
+    (the copy is then cut after its last complete line), None to extract the whole member
+    :param max_size: members larger than this, and not cut by head_size, are not extracted
+    :param on_extract: function called for each extracted member, with its name, the path of its extracted copy, and
+    a binary stream over the whole member content (even if only its head was extracted). The stream can only be read
+    during the call: the archive is not read again
+    :return: the names of the extracted members, in archive order
+    """
+    out_dir = os.path.abspath(out_dir)
+    extracted = []
+
+    def _process(tar: tarfile.TarFile, member: tarfile.TarInfo):
+        if not member.isfile() or not select(member.name):
+            return
+        head = head_size(member.name) if head_size else None
+        if head is None and max_size is not None and member.size > max_size:
+            logging.debug(f"Not extracting archive member {member.name}: {member.size} bytes")
+            return
+        if _extract(tar, member, out_dir, head, on_extract):
+            extracted.append(member.name)
+
+    with tracing.span("extract_members", path=archive_path):
+        if indexed_gzip is not None:
+            with open_tar(archive_path) as tar:
+                for member in tar.getmembers():
+                    _process(tar, member)
+        else:
+            # Stream mode: members must be read in order, while going through the archive
+            with tarfile.open(archive_path, "r|gz") as tar:
+                for member in tar:
+                    _process(tar, member)
+    return extracted
+
+
+def _extract(tar: tarfile.TarFile, member: tarfile.TarInfo, out_dir: str, head_size: int = None,
+             on_extract: Callable[[str, str, BinaryIO], None] = None) -> bool:
+    target = os.path.abspath(os.path.join(out_dir, member.name))
+    # Don't let a crafted member name (../../etc) write outside out_dir
+    if not target.startswith(out_dir + os.sep):
+        logging.warning(f"Skipping archive member {member.name}: path is outside of the archive")
+        return False
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with tar.extractfile(member) as src:
+        head = None
+        with open(target, "wb") as dst:
+            if head_size is None or member.size <= head_size:
+                shutil.copyfileobj(src, dst)
+            else:
+                head = src.read(head_size)
+                dst.write(head[:head.rindex(b"\n") + 1] if b"\n" in head else head)
+        if on_extract is not None:
+            if head is None:
+                with open(target, "rb") as f:
+                    on_extract(member.name, target, f)
+            else:
+                on_extract(member.name, target, _ResumedMember(head, src))
+    return True
+
+
+class _ResumedMember:
+    """
+    Binary stream over a member of which the head was already read: the head is replayed, then the rest of the
+    member is read from the archive
+    """
+
+    def __init__(self, head: bytes, rest: BinaryIO):
+        self.head = head
+        self.rest = rest
+
+    def read(self, size: int = -1) -> bytes:
+        if not self.head:
+            return self.rest.read(size)
+        if size is None or size < 0:
+            data, self.head = self.head + self.rest.read(), b""
+        else:
+            data, self.head = self.head[:size], self.head[size:]
+        return data
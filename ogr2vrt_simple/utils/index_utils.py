@@ -0,0 +1,245 @@
+"""
+Spatial and attribute indexes provisioning. Without them, every bbox or attribute query from the VRT consumer is a
+full scan of the source.
+Only local, writable sources are indexed: shapefiles (.qix spatial index, .ind/.idm attribute indexes) and
+GeoPackages (R-tree spatial index, SQL indexes). Archives, remote sources and read-only files are skipped.
+"""
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from . import tracing
+
+indexable_drivers = ["ESRI Shapefile", "GPKG"]
+
+
+def is_indexable(source_path: str) -> bool:
+    """
+    Whether indexes can be created for a source path: a local file (not a /vsi path nor a driver-prefixed connection
+    string), that we are allowed to write in, as well as in its folder (index files are created beside it)
+    :param source_path:
+    :return:
+    """
+    return (
+        os.path.isfile(source_path)
+        and os.access(source_path, os.W_OK)
+        and os.access(os.path.dirname(os.path.abspath(source_path)), os.W_OK)
+    )
+
+
+def ensure_indexes(layers_collection: List[Dict], index_fields: List[str] = None, workers: int = None) -> List[Dict]:
+    """
+    Create the missing spatial indexes, and attribute indexes on index_fields, for the layers of the collection.
+    Datasets are processed in parallel. The layers of a dataset are processed one after the other, since they share
+    the same file (a GeoPackage can only be written by one connection at a time)
+    :param layers_collection: as returned by the sources' collect_layers function
+    :param index_fields: names of the fields to create an attribute index on, when they exist in a layer
+    :param workers: maximum number of datasets processed concurrently
+    :return: report, one dict per layer: source_path, layer, spatial_index (created, exists, skipped,
+    not supported or failed), attribute_indexes (created index fields), duration (seconds)
+    """
+    index_fields = index_fields or []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        reports = list(executor.map(
+            lambda c: _index_dataset(c["source_path"], c["layers"], index_fields), layers_collection
+        ))
+    report = [entry for r in reports for entry in r]
+    for entry in report:
+        logging.info(
+            f"Indexes on {entry['source_path']} ({entry['layer']}): spatial index {entry['spatial_index']}, "
+            f"attribute indexes created on [{', '.join(entry['attribute_indexes'])}] in {entry['duration']:.3f}s"
+        )
+    return report
+
+
+def create_attribute_indexes(path: str, layer_name: str, fields: List[str]) -> List[str]:
+    """
+    Create attribute indexes for the fields that exist in the layer. Only supported for GeoPackages and shapefiles
+    :param path:
+    :param layer_name:
+    :param fields:
+    :return: the fields an index was created on
+    """
+    from osgeo import ogr
+
+    ds = ogr.Open(path, 1)
+    if ds is None or ds.GetDriver().GetName() not in indexable_drivers:
+        logging.debug(f"Attribute indexes are not supported for {path}")
+        return []
+    return _create_attribute_indexes(ds, layer_name, fields)
+
+
+def _index_dataset(source_path: str, layers: List, index_fields: List[str]) -> List[Dict]:
+    from osgeo import ogr
+
+    def _entry(layer_name: str, spatial_index: str, attribute_indexes: List[str] = None, duration: float = 0):
+        return {
+            "source_path": source_path,
+            "layer": layer_name,
+            "spatial_index": spatial_index,
+            "attribute_indexes": attribute_indexes or [],
+            "duration": duration,
+        }
+
+    if not is_indexable(source_path):
+        return [_entry(layer.layer_name, "skipped") for layer in layers]
+
+    with tracing.span("ensure_indexes", path=source_path):
+        tracing.count("gdal_opens")
+        ds = ogr.Open(source_path, 1)
+        if ds is None or ds.GetDriver().GetName() not in indexable_drivers:
+            return [_entry(layer.layer_name, "not supported") for layer in layers]
+        report = []
+        for layer in layers:
+            start = time.perf_counter()
+            if ds.GetDriver().GetName() == "GPKG":
+                spatial_index = _gpkg_spatial_index(ds, layer)
+            else:
+                spatial_index = _shapefile_spatial_index(ds, source_path, layer)
+            attribute_indexes = _create_attribute_indexes(ds, layer.layer_name, index_fields)
+            report.append(_entry(layer.layer_name, spatial_index, attribute_indexes, time.perf_counter() - start))
+        ds = None  # flush to disk
+    return report
+
+
+def _geometry_fields(layer) -> List:
+    # Geometries built from columns (PointFromColumns) only exist in the VRT, there is nothing to index in the source
+    return [g for g in layer.geometry_fields if not g.encoding]
+
+
+def _shapefile_spatial_index(ds, source_path: str, layer) -> str:
+    if not _geometry_fields(layer):
+        return "skipped"
+    if os.path.exists(os.path.splitext(source_path)[0] + ".qix"):
+        return "exists"
+    ds.ExecuteSQL(f"CREATE SPATIAL INDEX ON {_quote_identifier(layer.layer_name, ogr_sql=True)}")
+    return "created" if os.path.exists(os.path.splitext(source_path)[0] + ".qix") else "failed"
+
+
+def _gpkg_spatial_index(ds, layer) -> str:
+    geometry_fields = _geometry_fields(layer)
+    if not geometry_fields:
+        return "skipped"
+    status = "exists"
+    for geom in geometry_fields:
+        args = f"{_quote_literal(layer.layer_name)}, {_quote_literal(geom.name)}"
+        if _sql_value(ds, f"SELECT HasSpatialIndex({args})"):
+            continue
+        _sql_value(ds, f"SELECT CreateSpatialIndex({args})")
+        if not _sql_value(ds, f"SELECT HasSpatialIndex({args})"):
+            return "failed"
+        status = "created"
+    return status
+
+
+def _create_attribute_indexes(ds, layer_name: str, fields: List[str]) -> List[str]:
+    layer = ds.GetLayerByName(layer_name)
+    if layer is None:
+        return []
+    layer_schema = layer.GetLayerDefn()
+    is_gpkg = ds.GetDriver().GetName() == "GPKG"
+    indexed = _gpkg_indexed_fields(ds, layer_name) if is_gpkg else _shapefile_indexed_fields(ds, layer_name)
+    created = []
+    for f in fields:
+        if layer_schema.GetFieldIndex(f) < 0:
+            logging.debug(f"Cannot index field {f}: not found in layer {layer_name}")
+            continue
+        if f.lower() in indexed:
+            logging.debug(f"Field {f} of layer {layer_name} is already indexed")
+            continue
+        if is_gpkg:
+            index_name = _quote_identifier(f"idx_{layer_name}_{f}")
+            sql = f"CREATE INDEX IF NOT EXISTS {index_name} ON {_quote_identifier(layer_name)} ({_quote_identifier(f)})"
+        else:
+            # OGR SQL dialect, creates the .ind/.idm files of the shapefile
+            sql = f"CREATE INDEX ON {_quote_identifier(layer_name, True)} USING {_quote_identifier(f, True)}"
+        error = _execute_sql(ds, sql)
+        if error:
+            logging.warning(f"Could not create an index on field {f} of layer {layer_name}: {error}")
+            continue
+        created.append(f)
+    return created
+
+
+def _gpkg_indexed_fields(ds, layer_name: str) -> List[str]:
+    """
+    Fields (lower case) that are the first column of an index of a GeoPackage table
+    """
+    result = ds.ExecuteSQL(
+        f"SELECT ii.name FROM pragma_index_list({_quote_literal(layer_name)}) AS il, pragma_index_info(il.name) AS ii "
+        f"WHERE ii.seqno = 0"
+    )
+    if result is None:
+        return []
+    fields = [feature.GetField(0).lower() for feature in result if feature.GetField(0)]
+    ds.ReleaseResultSet(result)
+    return fields
+
+
+def _shapefile_indexed_fields(ds, layer_name: str) -> List[str]:
+    """
+    Fields (lower case) listed in the .idm file of a shapefile, that describes its attribute indexes (.ind file)
+    """
+    path = ds.GetDescription()
+    if os.path.isdir(path):
+        path = os.path.join(path, layer_name)
+    stem = os.path.splitext(path)[0]
+    if not os.path.exists(stem + ".ind"):
+        return []
+    try:
+        with open(stem + ".idm") as f:
+            return [name.lower() for name in re.findall(r"<FieldName>(.*?)</FieldName>", f.read())]
+    except OSError:
+        return []
+
+
+def _execute_sql(ds, sql: str) -> str:
+    """
+    Run a SQL statement that returns no result, whether GDAL exceptions are enabled or not
+    :return: the error message, None if the statement succeeded
+    """
+    from osgeo import gdal
+
+    gdal.PushErrorHandler("CPLQuietErrorHandler")
+    try:
+        gdal.ErrorReset()
+        result = ds.ExecuteSQL(sql)
+        if result is not None:
+            ds.ReleaseResultSet(result)
+        if gdal.GetLastErrorType() >= gdal.CE_Failure:
+            return gdal.GetLastErrorMsg()
+    except RuntimeError as e:
+        return str(e)
+    finally:
+        gdal.PopErrorHandler()
+    return None
+
+
+def _quote_identifier(name: str, ogr_sql: bool = False) -> str:
+    """
+    Quote a table or field name for SQLite (GeoPackages), or for the OGR SQL dialect, where quotes are escaped with a
+    backslash
+    """
+    if ogr_sql:
+        return '"' + name.replace('"', '\\"') + '"'
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _quote_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _sql_value(ds, sql: str):
+    """
+    Run a SQL query returning a single value
+    """
+    result = ds.ExecuteSQL(sql)
+    if result is None:
+        return None
+    feature = result.GetNextFeature()
+    value = feature.GetField(0) if feature else None
+    ds.ReleaseResultSet(result)
+    return value
@@ -4,15 +4,18 @@ Utility functions for I/O operations
 import logging
 import mimetypes
 import os
+import shutil
 import tarfile
 import urllib
 import zipfile
+import zlib
 from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple
 from urllib.parse import urlparse
-from urllib.request import urlretrieve
+from urllib.request import urlopen
 from uuid import uuid4
 
-import humanize
+from . import tracing
 
 compression_extension_list = [".zip", ".tgz", ".tar.gz", ".gz", ".rar", ".7z"]
 archive_extension_list = [".zip", ".tgz", ".tar.gz", ".rar", ".7z"]
@@ -24,8 +27,12 @@ common_dataset_extensions = [
     ".shp",
     ".gpkg",
     ".geojson",
+    ".geojsonl",
+    ".geojsons",
 ]
 
+download_chunk_size = 64 * 1024
+
 default_download_config = {
     "with_vsicurl": False,
     "data_format": "",
@@ -34,20 +41,263 @@ default_download_config = {
 }
 
 
-def download_dataset(url: str, filename: str = None, extension: str = None) -> str:
+def accepted_encodings() -> List[str]:
+    """
+    Content codings the downloads accept, by order of preference: brotli and zstd when their (optional) decoders
+    are installed, then gzip and deflate
+    """
+    encodings = []
+    if _import_brotli():
+        encodings.append("br")
+    if _import_zstandard():
+        encodings.append("zstd")
+    return encodings + ["gzip", "deflate"]
+
+
+def _import_brotli():
+    try:
+        import brotli
+    except ImportError:
+        try:
+            import brotlicffi as brotli
+        except ImportError:
+            return None
+    return brotli
+
+
+def _import_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+class _DeflateDecompressor:
+    """
+    "deflate" should be zlib-wrapped (RFC 9110), but some servers send raw deflate: detected from the first bytes
+    """
+
+    def __init__(self):
+        self._decompressor = None
+
+    def decompress(self, data: bytes) -> bytes:
+        if self._decompressor is None:
+            self._decompressor = zlib.decompressobj()
+            try:
+                return self._decompressor.decompress(data)
+            except zlib.error:
+                self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        return self._decompressor.decompress(data)
+
+    def flush(self) -> bytes:
+        return self._decompressor.flush() if self._decompressor else b""
+
+
+class _GzipDecompressor:
+    """
+    gzip bodies may hold several members, one after the other
+    """
+
+    def __init__(self):
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def decompress(self, data: bytes) -> bytes:
+        out = self._decompressor.decompress(data)
+        while self._decompressor.eof and self._decompressor.unused_data:
+            data = self._decompressor.unused_data
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            out += self._decompressor.decompress(data)
+        return out
+
+    def flush(self) -> bytes:
+        return self._decompressor.flush()
+
+
+class _BrotliDecompressor:
+    def __init__(self):
+        self._decompressor = _import_brotli().Decompressor()
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._decompressor.process(data)
+
+    def flush(self) -> bytes:
+        return b""
+
+
+class _ZstdDecompressor:
+    def __init__(self):
+        self._decompressor = _import_zstandard().ZstdDecompressor().decompressobj()
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._decompressor.decompress(data)
+
+    def flush(self) -> bytes:
+        return self._decompressor.flush()
+
+
+_decompressors = {
+    "gzip": _GzipDecompressor,
+    "x-gzip": _GzipDecompressor,
+    "deflate": _DeflateDecompressor,
+    "br": _BrotliDecompressor,
+    "zstd": _ZstdDecompressor,
+}
+# Bodies that are gzip files themselves: servers often send them with "Content-Encoding: gzip", meaning the type of
+# the file rather than a transfer coding. Decoding them would save a .tar instead of a .tar.gz
+gzip_file_extensions = [".gz", ".tgz"]
+gzip_content_types = ["application/gzip", "application/x-gzip", "application/x-gtar", "application/x-tgz"]
+
+
+class DecodingReader:
+    """
+    Binary file-like reader of an HTTP response body, decompressed on the fly according to its Content-Encoding.
+    Counts the bytes received (on the wire) and the bytes decoded
     """
-    Download the data, save it as temporary file.
+
+    def __init__(self, response):
+        self.response = response
+        self.content_encoding = (response.headers.get("Content-Encoding", None) or "identity").strip().lower()
+        self._decompressor = None
+        if self.content_encoding == "identity":
+            pass
+        elif self.content_encoding not in _decompressors:
+            logging.warning(f"Content-Encoding not supported ({self.content_encoding}), keeping the body as is")
+        elif _decompressors[self.content_encoding] is _GzipDecompressor and self._is_gzip_file():
+            logging.debug("The body is a gzip file, keeping it compressed")
+        else:
+            self._decompressor = _decompressors[self.content_encoding]()
+        self.bytes_received = 0
+        self.bytes_decoded = 0
+        self._pending = bytearray()
+        self._eof = False
+
+    @property
+    def is_compressed(self) -> bool:
+        return self._decompressor is not None
+
+    def _is_gzip_file(self) -> bool:
+        path = urlparse(getattr(self.response, "url", None) or "").path.lower()
+        content_type = (self.response.headers.get("Content-Type", None) or "").split(";")[0].strip().lower()
+        return path.endswith(tuple(gzip_file_extensions)) or content_type in gzip_content_types
+
+    def read(self, size: int = -1) -> bytes:
+        """
+        :param size: maximum number of decoded bytes to return, -1 for all of them
+        :return: decoded bytes, b"" at the end of the body
+        """
+        while not self._eof and (size < 0 or len(self._pending) < size):
+            chunk = self.response.read(download_chunk_size)
+            if not chunk:
+                self._eof = True
+                if self._decompressor:
+                    self._pending += self._decompressor.flush()
+                break
+            self.bytes_received += len(chunk)
+            self._pending += self._decompressor.decompress(chunk) if self._decompressor else chunk
+        if size < 0 or size >= len(self._pending):
+            data, self._pending = bytes(self._pending), bytearray()
+        else:
+            data = bytes(self._pending[:size])
+            del self._pending[:size]
+        self.bytes_decoded += len(data)
+        return data
+
+    def count_bytes(self):
+        """
+        Report the transfer to the tracing counters: bytes_downloaded is what went over the network,
+        bytes_decompressed what compressed responses expanded to
+        """
+        tracing.count("bytes_downloaded", self.bytes_received)
+        if self.is_compressed:
+            tracing.count("bytes_decompressed", self.bytes_decoded)
+
+
+def open_url(url: str, compressed: bool = True):
+    """
+    GET a URL, negotiating a compressed transfer. Ranged requests must not use it: ranges would apply to the
+    compressed representation (urllib sends "Accept-Encoding: identity" when no Accept-Encoding is set)
     :param url:
+    :param compressed: accept compressed content codings (see accepted_encodings)
+    :return: the response, to be read through a DecodingReader
+    """
+    headers = {"Accept-Encoding": ", ".join(accepted_encodings())} if compressed else {}
+    return urlopen(urllib.request.Request(url, headers=headers))
+
+
+def read_head(url: str, size: int) -> bytes:
+    """
+    Read the first bytes of a resource, with an uncompressed ranged request. Servers without Range support send it
+    all: only size bytes are read before closing the connection
+    :param url:
+    :param size: maximum number of bytes read
+    :return:
+    """
+    request = urllib.request.Request(url, headers={"Range": f"bytes=0-{size - 1}", "Accept-Encoding": "identity"})
+    with tracing.span("read_head", url=url):
+        tracing.count("http_requests")
+        with urlopen(request) as response:
+            data = response.read(size)
+    tracing.count("bytes_downloaded", len(data))
+    return data
+
+
+def download_dataset(url: str, filename: str = None, extension: str = None, compressed: bool = True) -> str:
+    """
+    Download the data, save it as temporary file. Compressed transfers are decompressed while writing the file.
+    :param url:
+    :param compressed: negotiate a compressed transfer
     :return: tuple[file path:str , extension: str, is an archive: bool]
     """
     if not filename:
         filename = f"{uuid4()}"
 
     # Download the dataset
-    file_path, http_headers = urlretrieve(url, filename)
+    with tracing.span("download_dataset", url=url):
+        tracing.count("http_requests")
+        with open_url(url, compressed) as response:
+            reader = DecodingReader(response)
+            with open(filename, "wb") as f:
+                shutil.copyfileobj(reader, f, download_chunk_size)
+        reader.count_bytes()
+    file_path = filename
 
     # Set file extension if needed
     if not os.path.splitext(file_path)[1]:
         os.rename(file_path, file_path + extension)
         file_path = file_path + extension
     return file_path
+
+
+def download_to_buffer(
+        url: str, max_size: int, spill_path: str, compressed: bool = True
+) -> Tuple[Optional[bytearray], Optional[str]]:
+    """
+    Download the data in memory, unless it turns out to be larger than max_size: then it is written to spill_path
+    (the part already read is not downloaded again). Works for streaming responses, whose size is not known
+    in advance. Compressed transfers are decompressed on the fly, max_size applies to the decompressed data
+    :param url:
+    :param max_size: maximum size kept in memory, in bytes
+    :param spill_path: file path used for larger data
+    :param compressed: negotiate a compressed transfer
+    :return: (buffer, None), or (None, spill_path) if the data was larger than max_size
+    """
+    with tracing.span("download_dataset", url=url):
+        tracing.count("http_requests")
+        with open_url(url, compressed) as response:
+            reader = DecodingReader(response)
+            buffer = bytearray()
+            while len(buffer) <= max_size:
+                chunk = reader.read(download_chunk_size)
+                if not chunk:
+                    break
+                buffer += chunk
+            else:
+                with open(spill_path, "wb") as f:
+                    f.write(buffer)
+                    buffer = None
+                    shutil.copyfileobj(reader, f, download_chunk_size)
+                reader.count_bytes()
+                return None, spill_path
+        reader.count_bytes()
+    return buffer, None
@@ -0,0 +1,188 @@
+"""
+Materialize the collected layers: convert each of them once into a local format that is fast to query
+(GeoPackage, FlatGeobuf, Parquet) and point the VRT at the converted copy.
+Useful for sources that are slow to parse (non-UTF-8 CSV, streaming APIs, big spreadsheets, nested archives)
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple
+
+from osgeo import gdal, ogr
+
+from . import ogr_utils, string_utils
+from .index_utils import create_attribute_indexes
+
+# format name: (OGR driver name, file extension, layer creation options)
+materialize_formats = {
+    "gpkg": ("GPKG", ".gpkg", ["SPATIAL_INDEX=YES"]),
+    "fgb": ("FlatGeobuf", ".fgb", ["SPATIAL_INDEX=YES"]),
+    "parquet": ("Parquet", ".parquet", []),
+}
+default_materialize_format = "gpkg"
+default_materialize_dir = "materialized"
+# Keeps track of the fingerprint of the data each materialized file was generated from
+manifest_filename = "materialized.json"
+
+
+def get_materialize_format(name: str) -> Tuple[str, str, List[str]]:
+    """
+    Get the conversion parameters for a format name. Falls back on GeoPackage if the format is unknown or if
+    the corresponding driver is not available in this GDAL build (Parquet is optional)
+    :param name: one of the materialize_formats keys
+    :return: tuple (driver name, file extension, layer creation options)
+    """
+    fmt = materialize_formats.get(str(name).lower(), None)
+    if fmt is None:
+        logging.warning(f"Unknown materialize format {name}. Using {default_materialize_format}")
+        fmt = materialize_formats[default_materialize_format]
+    if ogr.GetDriverByName(fmt[0]) is None:
+        logging.warning(f"OGR driver {fmt[0]} is not available. Using {default_materialize_format}")
+        fmt = materialize_formats[default_materialize_format]
+    return fmt
+
+
+def source_dir_name(source: str) -> str:
+    """
+    :param source: source URL or file path
+    :return: name of the folder the layers of source are materialized into, e.g. data_1a2b3c4d for
+    https://example.com/data.csv. Sources with the same name get different folders
+    """
+    stem = os.path.splitext(os.path.basename(urllib.parse.urlparse(source).path.rstrip("/")))[0]
+    return f"{string_utils.db_friendly_name(stem) or 'source'}_{hashlib.sha1(source.encode('utf-8')).hexdigest()[:8]}"
+
+
+def materialize_layers(layers_collection: List[Dict], fingerprint: str, config: dict, source: str = None) -> List[Dict]:
+    """
+    Convert each layer of the collection into a local file and return a new layers collection, pointing at the
+    converted files. Layers are converted in parallel. A layer is not converted again if the source fingerprint
+    and the layer definition did not change since the last run.
+    :param layers_collection: as returned by the sources' collect_layers function
+    :param fingerprint: source fingerprint. If None, the layers are always converted
+    :param config: uses the materialize (format), materialize_dir, materialize_workers, index_fields and
+    relative_to_file keys
+    :param source: source URL or file path. If set, the layers are written in a subfolder of materialize_dir
+    dedicated to the source (see source_dir_name): sources sharing materialize_dir don't overwrite each other's files
+    :return: layers collection
+    """
+    driver_name, extension, creation_options = get_materialize_format(config.get("materialize"))
+    out_dir = config.get("materialize_dir", None) or default_materialize_dir
+    if source:
+        out_dir = os.path.join(out_dir, source_dir_name(source))
+    os.makedirs(out_dir, exist_ok=True)
+    index_fields = [f for f in (config.get("index_fields", None) or "").split(",") if f]
+    manifest = _load_manifest(out_dir)
+
+    tasks = []
+    used_names = set()
+    for collection in layers_collection:
+        for layer in collection["layers"]:
+            name = string_utils.db_friendly_name(layer.layer_name)
+            unique_name, i = name, 1
+            while unique_name in used_names:
+                i += 1
+                unique_name = f"{name}_{i}"
+            used_names.add(unique_name)
+            tasks.append((collection["source_path"], layer, os.path.join(out_dir, unique_name + extension)))
+
+    def _run(task):
+        try:
+            return _materialize_layer(*task)
+        except Exception as e:
+            # e.g. an OSError removing a stale file: the other layers are still converted
+            logging.error(f"Could not materialize {task[2]}: {e}")
+            return None, None
+
+    def _materialize_layer(source_path, layer, dest):
+        layer_vrt = ogr_utils.layers2vrt([{"source_path": source_path, "layers": [layer]}])
+        layer_fingerprint = _layer_fingerprint(fingerprint, layer_vrt, driver_name, index_fields)
+        if (
+            layer_fingerprint
+            and os.path.exists(dest)
+            and manifest.get(os.path.basename(dest), None) == layer_fingerprint
+        ):
+            logging.info(f"{dest} is up-to-date, skipping conversion")
+            return dest, layer_fingerprint
+        if _convert_layer(layer_vrt, dest, driver_name, creation_options, index_fields):
+            return dest, layer_fingerprint
+        return None, None
+
+    with ThreadPoolExecutor(max_workers=config.get("materialize_workers", None)) as executor:
+        results = list(executor.map(_run, tasks))
+
+    materialized_collection = []
+    for (source_path, layer, _), (dest, layer_fingerprint) in zip(tasks, results):
+        if dest is None:
+            # Conversion failed, keep pointing at the original data
+            materialized_collection.append({"source_path": source_path, "layers": [layer]})
+            continue
+        manifest[os.path.basename(dest)] = layer_fingerprint
+        dest_path = os.path.relpath(dest) if config.get("relative_to_file", False) else os.path.abspath(dest)
+        layers = ogr_utils.collect_layers(dest, db_friendly=False)
+        if layers:
+            materialized_collection.append({"source_path": dest_path, "layers": layers})
+    _save_manifest(out_dir, manifest)
+    return materialized_collection
+
+
+def _convert_layer(
+        layer_vrt: str, dest: str, driver_name: str, creation_options: List[str], index_fields: List[str]
+) -> bool:
+    """
+    Convert a single layer, described by a VRT string, to dest file
+    :return: True if conversion succeeded
+    """
+    # The OGR VRT driver accepts the XML content as connection string. Relative paths are then resolved from the
+    # current directory, as they would be for a VRT written there
+    vrt_ds = gdal.OpenEx(layer_vrt[layer_vrt.index("<OGRVRTDataSource"):], gdal.OF_VECTOR)
+    if vrt_ds is None:
+        logging.error(f"Could not open the VRT definition to materialize {dest}")
+        return False
+    layer_name = os.path.splitext(os.path.basename(dest))[0]
+    if os.path.exists(dest):
+        os.remove(dest)
+    out_ds = gdal.VectorTranslate(
+        dest,
+        vrt_ds,
+        format=driver_name,
+        layerName=layer_name,
+        layerCreationOptions=creation_options,
+    )
+    if out_ds is None:
+        logging.error(f"Could not convert layer into {dest}")
+        return False
+    out_ds = None  # flush to disk
+    if index_fields:
+        create_attribute_indexes(dest, layer_name, index_fields)
+    logging.info(f"Materialized layer into {dest}")
+    return True
+
+
+def _layer_fingerprint(fingerprint: str, layer_vrt: str, driver_name: str, index_fields: List[str]) -> str:
+    if not fingerprint:
+        return None
+    h = hashlib.sha1()
+    for part in (fingerprint, layer_vrt, driver_name, ",".join(index_fields)):
+        h.update(part.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _load_manifest(out_dir: str) -> Dict:
+    try:
+        with open(os.path.join(out_dir, manifest_filename)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_manifest(out_dir: str, manifest: Dict):
+    # Written atomically: an interrupted run must not leave a truncated manifest behind
+    path = os.path.join(out_dir, manifest_filename)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
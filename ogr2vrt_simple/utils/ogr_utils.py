@@ -2,17 +2,20 @@
 Utility functions around OGR library
 """
 import logging
+import os
+from functools import lru_cache
 try:
     # Python < 3.9
     import importlib_resources as ilr
 except ImportError:
     import importlib.resources as ilr
 
-from jinja2 import Template
-from osgeo import ogr
 from typing import List, Dict
 
-from . import data_structures
+from . import tracing
+
+# osgeo and jinja2 are slow to import: they are imported in the functions that need them, so that importing the
+# package (or running the CLI --help) stays fast
 
 default_template = "templates/vrt.j2"
 vsimappings = {
@@ -30,19 +33,54 @@ def is_valid_ogr_path(vsistring: str) -> bool:
     :param vsistring:
     :return:
     """
-    in_data_source = ogr.Open(vsistring)
+    from osgeo import ogr
+
+    with tracing.span("ogr_open", path=vsistring):
+        tracing.count("gdal_opens")
+        in_data_source = ogr.Open(vsistring)
     return in_data_source is not None
 
 
+def vsi_path_exists(vsistring: str) -> bool:
+    """
+    Check that a file exists, without opening it as a dataset. For archive members, only the archive index is read,
+    and GDAL caches it: checking many members of the same archive is cheap
+    :param vsistring:
+    :return:
+    """
+    from osgeo import gdal
+
+    tracing.count("vsi_stats")
+    return gdal.VSIStatL(vsistring) is not None
+
+
+def list_vsi_dir(vsistring: str) -> List[str]:
+    """
+    List the files of a vsi folder or archive, recursively. For remote archives (e.g. /vsizip//vsis3/...), only the
+    archive index is read, with ranged requests
+    :param vsistring:
+    :return: paths relative to vsistring. Folders are not included
+    """
+    from osgeo import gdal
+
+    tracing.count("vsi_stats")
+    return [p for p in gdal.ReadDirRecursive(vsistring) or [] if not p.endswith("/")]
+
+
 def collect_layers(filename: str, db_friendly: bool = True):
+    from osgeo import ogr
+    from . import data_structures
+
     layers: list[data_structures.DataLayer] = []
 
-    in_data_source = ogr.Open(filename)
-    for layer_idx in range(in_data_source.GetLayerCount()):
-        layer = in_data_source.GetLayerByIndex(layer_idx)
-        layers.append(
-            data_structures.DataLayer(ogr_layer=layer, db_friendly=db_friendly)
-        )
+    with tracing.span("ogr_collect_layers", path=filename):
+        tracing.count("gdal_opens")
+        in_data_source = ogr.Open(filename)
+        for layer_idx in range(in_data_source.GetLayerCount()):
+            layer = in_data_source.GetLayerByIndex(layer_idx)
+            layers.append(
+                data_structures.DataLayer(ogr_layer=layer, db_friendly=db_friendly)
+            )
     if len(layers) > 0:
         return layers
     else:
@@ -55,23 +93,50 @@ def layers2vrt(
     try:
         if vrt_template:
             logging.debug(f"Using template {vrt_template}")
-            with open(vrt_template) as tplfile:
-                template = Template(tplfile.read())
+            template = _load_template(vrt_template, os.path.getmtime(vrt_template))
         else:
             logging.debug(f"Using default template")
-            tplcontent = (
-                ilr.files("ogr2vrt_simple")
-                .joinpath(default_template)
-                .read_text(encoding="utf-8")
-            )
-            template = Template(tplcontent)
+            template = _load_template(None, None)
 
-        vrt_xml = template.render(layers_collection=layers_collection)
+        with tracing.span("render_template"):
+            vrt_xml = template.render(layers_collection=layers_collection)
         return vrt_xml
     except Exception as e:
         logging.debug("An exception occurred:", e)
 
 
+@lru_cache(maxsize=16)
+def _load_template(vrt_template: str = None, mtime: float = None):
+    """
+    Load and compile the jinja template. Compiled templates are cached, this matters for long-running processes.
+    :param vrt_template: template file path. If None, the default template is used
+    :param mtime: template file modification time, only used as cache key to reload modified templates
+    :return: jinja2 Template
+    """
+    from jinja2 import Template
+
+    if vrt_template:
+        with open(vrt_template) as tplfile:
+            return Template(tplfile.read())
+    tplcontent = (
+        ilr.files("ogr2vrt_simple")
+        .joinpath(default_template)
+        .read_text(encoding="utf-8")
+    )
+    return Template(tplcontent)
+
+
+def warm_up():
+    """
+    Pay the GDAL import, driver registration and template compilation costs once. Useful for long-running
+    processes and worker pools
+    """
+    from osgeo import ogr
+
+    ogr.RegisterAll()
+    _load_template(None, None)
+
+
 def vsiprefix_from_archive_extension(ext: str):
     """
     Map archive extension with vsizip, vsitar etc.
@@ -0,0 +1,245 @@
+"""
+S3-compatible object stores helpers: addressing (s3://bucket/key, endpoint, region), prefix listing with
+ListObjectsV2, request signing (AWS Signature Version 4) and the GDAL configuration needed to read the objects
+through /vsis3/.
+Requests use path-style addressing (endpoint/bucket/key), which all the S3-compatible stores support.
+"""
+import datetime
+import hashlib
+import hmac
+import logging
+import os
+import urllib
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote, urlparse
+
+from . import tracing
+
+default_endpoint = "https://s3.amazonaws.com"
+default_region = "us-east-1"
+# ListObjectsV2 returns at most 1000 keys per page
+default_max_keys = 1000
+s3_namespace = "{http://s3.amazonaws.com/doc/2006-03-01/}"
+empty_payload_hash = hashlib.sha256(b"").hexdigest()
+
+
+@dataclass(frozen=True)
+class S3Config:
+    endpoint: str = default_endpoint  # scheme://host[:port]
+    region: str = default_region
+    anonymous: bool = False
+    access_key: Optional[str] = None
+    secret_key: Optional[str] = None
+    session_token: Optional[str] = None
+
+    @property
+    def signed(self) -> bool:
+        return not self.anonymous and bool(self.access_key and self.secret_key)
+
+
+@dataclass(frozen=True)
+class S3Object:
+    key: str
+    size: int
+    etag: str
+    last_modified: str
+
+
+def get_config(config: Dict = None) -> S3Config:
+    """
+    Build the S3 configuration from the config dict (s3_endpoint, s3_region, s3_anonymous keys), falling back on the
+    usual AWS environment variables, which GDAL reads too
+    :param config:
+    :return:
+    """
+    config = config or {}
+    endpoint = config.get("s3_endpoint", None) or os.environ.get("AWS_S3_ENDPOINT", None) or default_endpoint
+    if "://" not in endpoint:
+        # GDAL's AWS_S3_ENDPOINT has no scheme, HTTPS being the default
+        endpoint = ("https://" if os.environ.get("AWS_HTTPS", "YES").upper() != "NO" else "http://") + endpoint
+    anonymous = config.get("s3_anonymous", False) or os.environ.get("AWS_NO_SIGN_REQUEST", "NO").upper() == "YES"
+    return S3Config(
+        endpoint=endpoint.rstrip("/"),
+        region=config.get("s3_region", None) or os.environ.get("AWS_REGION", None) or default_region,
+        anonymous=anonymous,
+        access_key=os.environ.get("AWS_ACCESS_KEY_ID", None),
+        secret_key=os.environ.get("AWS_SECRET_ACCESS_KEY", None),
+        session_token=os.environ.get("AWS_SESSION_TOKEN", None),
+    )
+
+
+def parse_url(url: str) -> Tuple[str, str]:
+    """
+    :param url: s3://bucket/key or s3://bucket/prefix
+    :return: (bucket, key or prefix)
+    """
+    u = urlparse(url)
+    return u.netloc, urllib.parse.unquote(u.path.lstrip("/"))
+
+
+def vsi_path(bucket: str, key: str) -> str:
+    return f"/vsis3/{bucket}/{key}"
+
+
+def gdal_config_options(s3_config: S3Config) -> Dict[str, str]:
+    """
+    GDAL configuration options matching the S3 configuration, for /vsis3/ paths. Credentials are not included:
+    GDAL reads them from the same environment variables
+    :param s3_config:
+    :return:
+    """
+    u = urlparse(s3_config.endpoint)
+    options = {
+        "AWS_S3_ENDPOINT": u.netloc,
+        "AWS_HTTPS": "YES" if u.scheme == "https" else "NO",
+        "AWS_VIRTUAL_HOSTING": "FALSE",
+        "AWS_REGION": s3_config.region,
+    }
+    if s3_config.anonymous:
+        options["AWS_NO_SIGN_REQUEST"] = "YES"
+    return options
+
+
+def configure_gdal(s3_config: S3Config, bucket: str):
+    """
+    Set the GDAL configuration options for /vsis3/ access to a bucket. With GDAL >= 3.6 they only apply to the
+    bucket's paths, so that sources using different endpoints can run concurrently. Older versions only have
+    options global to the process: set them before starting threads that open /vsis3/ paths
+    """
+    from osgeo import gdal
+
+    set_path_option = getattr(gdal, "SetPathSpecificOption", None)
+    for k, v in gdal_config_options(s3_config).items():
+        if set_path_option:
+            set_path_option(vsi_path(bucket, ""), k, v)
+        else:
+            gdal.SetConfigOption(k, v)
+
+
+def _hmac(key: bytes, msg: str) -> bytes:
+    return hmac.new(key, msg.encode("utf-8"), hashlib.sha256).digest()
+
+
+def sign_request(
+        method: str,
+        url: str,
+        headers: Dict[str, str],
+        s3_config: S3Config,
+        payload_hash: str = empty_payload_hash,
+        now: datetime.datetime = None,
+) -> Dict[str, str]:
+    """
+    Sign a request with AWS Signature Version 4. All the given headers are signed
+    :param method:
+    :param url: full request URL, query string included
+    :param headers: request headers (Host is added if missing)
+    :param s3_config:
+    :param payload_hash: hex SHA-256 of the request body
+    :param now: request time (UTC), defaults to the current time
+    :return: the headers to send, Authorization included
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+    date = amz_date[:8]
+    u = urlparse(url)
+    headers = dict(headers)
+    headers.setdefault("Host", u.netloc)
+    headers["x-amz-date"] = amz_date
+    headers["x-amz-content-sha256"] = payload_hash
+    if s3_config.session_token:
+        headers["x-amz-security-token"] = s3_config.session_token
+
+    canonical_headers = sorted((k.lower(), " ".join(str(v).split())) for k, v in headers.items())
+    signed_headers = ";".join(k for k, _ in canonical_headers)
+    query = sorted(urllib.parse.parse_qsl(u.query, keep_blank_values=True))
+    canonical_request = "\n".join([
+        method,
+        quote(urllib.parse.unquote(u.path) or "/", safe="/~"),
+        "&".join(f"{quote(k, safe='~')}={quote(v, safe='~')}" for k, v in query),
+        "".join(f"{k}:{v}\n" for k, v in canonical_headers),
+        signed_headers,
+        payload_hash,
+    ])
+    scope = f"{date}/{s3_config.region}/s3/aws4_request"
+    string_to_sign = "\n".join([
+        "AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical_request.encode("utf-8")).hexdigest()
+    ])
+    key = _hmac(("AWS4" + s3_config.secret_key).encode("utf-8"), date)
+    for part in (s3_config.region, "s3", "aws4_request"):
+        key = _hmac(key, part)
+    signature = hmac.new(key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+    headers["Authorization"] = (
+        f"AWS4-HMAC-SHA256 Credential={s3_config.access_key}/{scope}, "
+        f"SignedHeaders={signed_headers}, Signature={signature}"
+    )
+    return headers
+
+
+def _request(method: str, url: str, s3_config: S3Config, headers: Dict[str, str] = None):
+    headers = headers or {}
+    if s3_config.signed:
+        headers = sign_request(method, url, headers, s3_config)
+    tracing.count("http_requests")
+    return urllib.request.urlopen(urllib.request.Request(url, headers=headers, method=method))
+
+
+def _bucket_url(bucket: str, s3_config: S3Config) -> str:
+    return f"{s3_config.endpoint}/{quote(bucket)}"
+
+
+def list_objects(bucket: str, prefix: str, s3_config: S3Config, max_keys: int = default_max_keys) -> Iterator[S3Object]:
+    """
+    List the objects under a prefix, with paginated ListObjectsV2 requests. Pages are fetched while iterating
+    :param bucket:
+    :param prefix:
+    :param s3_config:
+    :param max_keys: page size
+    :return: objects, in key order
+    """
+    token = None
+    while True:
+        params = {"list-type": "2", "prefix": prefix, "max-keys": str(max_keys)}
+        if token:
+            params["continuation-token"] = token
+        url = f"{_bucket_url(bucket, s3_config)}?{urllib.parse.urlencode(params, quote_via=quote)}"
+        with tracing.span("s3_list_objects", bucket=bucket, prefix=prefix):
+            with _request("GET", url, s3_config) as response:
+                root = ET.fromstring(response.read())
+        for content in root.iter(f"{s3_namespace}Contents"):
+            yield S3Object(
+                key=content.findtext(f"{s3_namespace}Key"),
+                size=int(content.findtext(f"{s3_namespace}Size", "0")),
+                etag=content.findtext(f"{s3_namespace}ETag", "").strip('"'),
+                last_modified=content.findtext(f"{s3_namespace}LastModified", ""),
+            )
+        if root.findtext(f"{s3_namespace}IsTruncated", "false") != "true":
+            return
+        token = root.findtext(f"{s3_namespace}NextContinuationToken", None)
+        if not token:
+            logging.warning(f"Truncated listing of s3://{bucket}/{prefix} without continuation token")
+            return
+
+
+def read_range(bucket: str, key: str, s3_config: S3Config, offset: int, length: int) -> bytes:
+    """
+    Read part of an object (HTTP Range request). The transfer is not compressed: the range applies to the object
+    :return: the bytes read, shorter than length at the end of the object
+    """
+    url = f"{_bucket_url(bucket, s3_config)}/{quote(key)}"
+    with tracing.span("s3_read_range", key=key, offset=offset):
+        with _request("GET", url, s3_config, {
+            "Range": f"bytes={offset}-{offset + length - 1}", "Accept-Encoding": "identity"
+        }) as response:
+            data = response.read(length)
+    tracing.count("bytes_downloaded", len(data))
+    return data
+
+
+def select_keys(objects: List[S3Object], extensions: List[str]) -> List[S3Object]:
+    """
+    Objects that might be read by OGR: known data or archive extensions. "Folder" placeholders (keys ending with /)
+    are skipped
+    """
+    return [o for o in objects if not o.key.endswith("/") and any(o.key.lower().endswith(e) for e in extensions)]
@@ -21,3 +21,19 @@ def db_friendly_name(s):
     clean = re.sub(r"[\W]", "_", unidecode(s)).lower()
     # see https://docs.python.org/3/library/re.html#re.sub for why \g<0>
     return re.sub(r"^[0-9]", "_\g<0>", clean)
+
+
+def add_dots(formats: str) -> str:
+    """
+    In the OGR datasources we will want format extensions with a dot in front.
+    Add them if not provided by the user
+    :param formats: comma-separated list of extensions, e.g. "csv,.xlsx"
+    :return:
+    """
+    if not formats:
+        return ""
+
+    fixed = []
+    for ext in formats.split(","):
+        fixed.append(ext if ext.startswith(".") else f".{ext}")
+    return ",".join(fixed)
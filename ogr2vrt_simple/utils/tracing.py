@@ -0,0 +1,156 @@
+"""
+Lightweight instrumentation: nested timing spans, counters (bytes downloaded, GDAL opens) and, optionally, peak
+memory per span. Tracing is off by default: span() then returns a shared no-op context manager, and count() returns
+immediately, so instrumented code pays close to nothing.
+
+Usage:
+    tracer = tracing.start_tracing(trace_memory=True)
+    with tracing.span("collect_layers", path=p):
+        ...
+    tracing.stop_tracing()
+    tracer.write("trace.json")  # Chrome trace-event format, open it in chrome://tracing or https://ui.perfetto.dev
+"""
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List
+
+_tracer = None
+_null_span = nullcontext()
+
+
+class Tracer:
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.events: List[Dict] = []
+        self.counters: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+        # Only stop tracemalloc at the end if we started it: the host program might be tracing memory itself
+        self.started_tracemalloc = trace_memory and not tracemalloc.is_tracing()
+        if self.started_tracemalloc:
+            tracemalloc.start()
+
+    def _stack(self) -> list:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def span(self, name: str, **args):
+        stack = self._stack()
+        frame = {"peak": 0}
+        if self.trace_memory:
+            # The peak is global: save the parent's peak so far, then measure this span on its own
+            if stack:
+                stack[-1]["peak"] = max(stack[-1]["peak"], tracemalloc.get_traced_memory()[1])
+            if hasattr(tracemalloc, "reset_peak"):  # python >= 3.9
+                tracemalloc.reset_peak()
+        stack.append(frame)
+        with self._lock:
+            counters_before = dict(self.counters)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            stack.pop()
+            # Counters are process-wide: with concurrent spans, the deltas include the other threads' work
+            with self._lock:
+                deltas = {k: v - counters_before.get(k, 0) for k, v in self.counters.items()
+                          if v != counters_before.get(k, 0)}
+            event_args = {k: str(v) for k, v in args.items()}
+            event_args.update(deltas)
+            if self.trace_memory:
+                peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+                event_args["peak_memory"] = peak
+                if stack:
+                    stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+            with self._lock:
+                self.events.append({
+                    "name": name,
+                    "cat": "ogr2vrt",
+                    "ph": "X",
+                    "ts": round((start - self._origin) * 1e6, 1),
+                    "dur": round((end - start) * 1e6, 1),
+                    "pid": self._pid,
+                    "tid": threading.get_ident(),
+                    "args": event_args,
+                })
+
+    def count(self, name: str, value: int = 1):
+        with self._lock:
+            self.counters[name] += value
+
+    def to_chrome_trace(self) -> Dict:
+        """
+        :return: the trace, in Chrome trace-event format
+        """
+        with self._lock:
+            events = sorted(self.events, key=lambda e: e["ts"])
+            end_ts = round((time.perf_counter() - self._origin) * 1e6, 1)
+            for name, value in self.counters.items():
+                events.append({"name": name, "ph": "C", "ts": end_ts, "pid": self._pid, "args": {name: value}})
+            return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def to_summary(self) -> Dict:
+        """
+        :return: the trace as a flat list of spans (durations in seconds) and counters totals
+        """
+        with self._lock:
+            spans = [
+                {"name": e["name"], "start": e["ts"] / 1e6, "duration": e["dur"] / 1e6, "args": e["args"]}
+                for e in sorted(self.events, key=lambda e: e["ts"])
+            ]
+            return {"spans": spans, "counters": dict(self.counters)}
+
+    def write(self, path: str, trace_format: str = "chrome"):
+        """
+        Write the trace to a JSON file
+        :param path:
+        :param trace_format: chrome (Chrome trace-event format) or summary
+        :return:
+        """
+        content = self.to_summary() if trace_format == "summary" else self.to_chrome_trace()
+        with open(path, "w") as f:
+            json.dump(content, f, indent=1)
+
+
+def start_tracing(trace_memory: bool = False) -> Tracer:
+    global _tracer
+    _tracer = Tracer(trace_memory)
+    return _tracer
+
+
+def stop_tracing() -> Tracer:
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None and tracer.started_tracemalloc:
+        tracemalloc.stop()
+    return tracer
+
+
+def span(name: str, **args):
+    """
+    Time the enclosed block, if tracing is on. Spans can be nested
+    :param name: phase name
+    :param args: additional information recorded with the span (e.g. the path being processed)
+    :return: context manager
+    """
+    if _tracer is None:
+        return _null_span
+    return _tracer.span(name, **args)
+
+
+def count(name: str, value: int = 1):
+    """
+    Increment a counter (e.g. bytes downloaded, number of GDAL opens), if tracing is on
+    """
+    if _tracer is not None:
+        _tracer.count(name, value)
@@ -0,0 +1,167 @@
+"""
+Transcode non-UTF-8 text sources (CSV) into a UTF-8 sidecar file, that the VRT then points at: the OGR CSV driver
+only reads UTF-8, other encodings end up as mojibake in field names and values.
+The source is read by chunks and decoded incrementally, so memory use does not depend on the file size. A small JSON
+file beside the sidecar records the original encoding and the source fingerprint, so that the sidecar is re-used
+across runs while the source is unchanged. Sidecars are written in a temporary folder unless told otherwise: the
+sources folders are left untouched.
+"""
+import codecs
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import BinaryIO, Callable, ContextManager, Dict, Optional
+
+from . import tracing
+
+chunk_size = 1024 ** 2
+sidecar_suffix = ".utf8"
+# Encodings that OGR reads as-is
+utf8_compatible_encodings = ["utf-8", "utf-8-sig", "ascii"]
+# Where sidecars are written when neither an output folder nor in-place sidecars are asked for
+default_sidecar_dir = os.path.join(tempfile.gettempdir(), "ogr2vrt_simple", "transcoded")
+
+
+def needs_transcoding(encoding: str) -> bool:
+    """
+    :param encoding: encoding name, as returned by charset detection or HTTP headers (e.g. cp1252, ISO-8859-1)
+    :return: False if the encoding is unknown (None) or compatible with UTF-8
+    """
+    if not encoding:
+        return False
+    try:
+        return codecs.lookup(encoding).name not in utf8_compatible_encodings
+    except LookupError:
+        logging.warning(f"Unknown encoding {encoding}, cannot transcode")
+        return False
+
+
+def sidecar_path(path: str, out_dir: str = None) -> str:
+    """
+    :return: path of the UTF-8 copy of path, e.g. data.utf8.csv for data.csv
+    """
+    stem, ext = os.path.splitext(os.path.basename(path))
+    return os.path.join(out_dir or os.path.dirname(path), stem + sidecar_suffix + ext)
+
+
+def sidecar_dir(path: str, out_dir: str = None, in_place: bool = False) -> str:
+    """
+    :param path: source file
+    :param out_dir: folder asked for by the user, if any
+    :param in_place: write the sidecar beside the source
+    :return: the folder where the sidecar of path is written: out_dir if set, the source folder if in_place, a
+    subfolder of default_sidecar_dir otherwise (one per source folder, so that sources with the same name in
+    different folders don't share a sidecar)
+    """
+    if out_dir:
+        return out_dir
+    folder = os.path.dirname(os.path.abspath(path))
+    if in_place:
+        return folder
+    return os.path.join(default_sidecar_dir, hashlib.sha1(folder.encode("utf-8")).hexdigest()[:16])
+
+
+def transcode_to_utf8(src: str, dest: str, encoding: str, errors: str = "replace") -> int:
+    """
+    Transcode src into dest, in UTF-8, by chunks. dest is written atomically
+    :param src:
+    :param dest:
+    :param encoding: src encoding
+    :param errors: how to handle bytes that are invalid in encoding, see codecs error handlers
+    :return: number of bytes written
+    """
+    with tracing.span("transcode", path=src, encoding=encoding):
+        with open(src, "rb") as f_in:
+            return transcode_stream(f_in, dest, encoding, errors)
+
+
+def transcode_stream(f_in: BinaryIO, dest: str, encoding: str, errors: str = "replace") -> int:
+    """
+    Same as transcode_to_utf8, reading from a binary stream (e.g. an archive member)
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors=errors)
+    written = 0
+    # Unique per thread too: sources sharing a file can be transcoded concurrently
+    tmp_dest = f"{dest}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_dest, "wb") as f_out:
+        while True:
+            chunk = f_in.read(chunk_size)
+            # final=True flushes a multi-byte sequence left incomplete at the end of the file
+            text = decoder.decode(chunk, final=not chunk)
+            if text:
+                written += f_out.write(text.encode("utf-8"))
+            if not chunk:
+                break
+    os.replace(tmp_dest, dest)
+    return written
+
+
+def read_record(sidecar: str) -> Dict:
+    """
+    :return: the information recorded when the sidecar was generated (source, fingerprint, original encoding), or
+    an empty dict
+    """
+    try:
+        with open(sidecar + ".json") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def ensure_utf8(
+        path: str,
+        fingerprint: str,
+        detect_encoding: Callable[[], str],
+        out_dir: str = None,
+        sidecar: str = None,
+        open_source: Callable[[], ContextManager[BinaryIO]] = None,
+) -> Optional[Dict]:
+    """
+    Make sure a UTF-8 version of path exists. The sidecar of a previous run is re-used if the source fingerprint
+    did not change (the encoding is then not detected again)
+    :param path: source file
+    :param fingerprint: source fingerprint. If None, the source is always transcoded
+    :param detect_encoding: function returning the source encoding. Only called when needed, since it is costly
+    :param out_dir: where to write the sidecar. Default: beside the source
+    :param sidecar: sidecar path, overrides the default one (see sidecar_path)
+    :param open_source: function opening the source as a binary stream, for sources that are not files (e.g.
+    archive members). Default: path is opened
+    :return: the sidecar record ({"path", "source", "fingerprint", "encoding"}), None if the source is already
+    UTF-8 or could not be transcoded
+    """
+    sidecar = sidecar or sidecar_path(path, out_dir)
+    record = read_record(sidecar)
+    if fingerprint and record.get("fingerprint", None) == fingerprint and os.path.exists(sidecar):
+        logging.debug(f"{sidecar} is up-to-date, skipping transcoding")
+        return dict(record, path=sidecar)
+
+    try:
+        encoding = detect_encoding()
+    except Exception as e:
+        logging.debug(f"Could not detect the encoding of {path}: {e}")
+        return None
+    if not needs_transcoding(encoding):
+        return None
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(sidecar)), exist_ok=True)
+        if open_source:
+            with tracing.span("transcode", path=path, encoding=encoding):
+                with open_source() as f_in:
+                    transcode_stream(f_in, sidecar, encoding)
+        else:
+            transcode_to_utf8(path, sidecar, encoding)
+        record = {"source": path if open_source else os.path.abspath(path), "fingerprint": fingerprint,
+                  "encoding": encoding}
+        tmp_record = f"{sidecar}.json.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_record, "w") as f:
+            json.dump(record, f, indent=2)
+        os.replace(tmp_record, sidecar + ".json")
+    except Exception as e:
+        # Archive members: errors are specific to each archive library (rarfile, py7zr...)
+        logging.warning(f"Could not transcode {path} to UTF-8: {e}")
+        return None
+    logging.info(f"Transcoded {path} from {encoding} to UTF-8 into {sidecar}")
+    return dict(record, path=sidecar)
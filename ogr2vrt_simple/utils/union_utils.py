@@ -0,0 +1,122 @@
+"""
+Union mode: archives or folders holding many same-shaped files (e.g. one CSV per departement or per month) give
+hundreds of layers with the same schema. They are grouped by schema and each group is exposed as a single
+<OGRVRTUnionLayer>, that consumers can query at once.
+"""
+import copy
+import logging
+import os
+from typing import Callable, Dict, List
+
+from . import ogr_utils, string_utils, tracing
+
+# Smallest number of layers sharing a schema for them to be grouped
+default_min_members = 2
+# Bytes read to get the header line of a CSV file
+header_read_size = 64 * 1024
+
+
+def read_header_line(path: str) -> bytes:
+    """
+    Read the first line of a file, through GDAL's virtual file system (works for /vsizip/, /vsicurl/ etc.)
+    :param path: file path, vsi prefixes allowed
+    :return: the first line, None if the file could not be read
+    """
+    from osgeo import gdal
+
+    f = gdal.VSIFOpenL(path, "rb")
+    if f is None:
+        return None
+    try:
+        data = gdal.VSIFReadL(1, header_read_size, f)
+    finally:
+        gdal.VSIFCloseL(f)
+    return data.split(b"\n", 1)[0].rstrip(b"\r")
+
+
+class HeaderSchemaCache:
+    """
+    Collect the layers of CSV files whose header line was already seen without opening them with OGR: their schema is
+    the one of the first file with the same header. Other files are collected normally
+    """
+
+    def __init__(self, collect: Callable = None):
+        """
+        :param collect: function collecting the layers of the files that can't be collected from the cache.
+        Default: ogr_utils.collect_layers
+        """
+        self.collect = collect or ogr_utils.collect_layers
+        self.layers_by_header: Dict[bytes, List] = {}
+
+    def collect_layers(self, path: str, db_friendly: bool = True):
+        """
+        Same as ogr_utils.collect_layers
+        """
+        if os.path.splitext(path)[1].lower() != ".csv":
+            return self.collect(path, db_friendly)
+        header = read_header_line(path)
+        cached = self.layers_by_header.get(header, None) if header else None
+        if cached is None:
+            layers = self.collect(path, db_friendly)
+            if header and layers:
+                self.layers_by_header[header] = layers
+            return layers
+        tracing.count("schema_cache_hits")
+        layers = []
+        for layer in cached:
+            # CSV layers are named after the file
+            layer = copy.copy(layer)
+            layer.layer_name = os.path.splitext(os.path.basename(path))[0]
+            layers.append(layer)
+        return layers
+
+
+def union_name(names: List[str], index: int) -> str:
+    """
+    Name the union layer after the common prefix of its members' names (e.g. conso_2023 for conso_2023_01, ...)
+    """
+    # Drop the partial number the names might have in common (conso_2023_0 for conso_2023_01 and conso_2023_02)
+    prefix = os.path.commonprefix(names).rstrip("0123456789").rstrip("_- .")
+    return string_utils.db_friendly_name(prefix) if prefix else f"union_{index}"
+
+
+def group_layers(layers_collection: List[Dict], config: dict) -> List[Dict]:
+    """
+    Group the layers sharing the same schema into union entries. Entries are kept in order, a group takes the place
+    of its first member
+    :param layers_collection: as returned by the sources' collect_layers function
+    :param config: uses the union_source_field, preserve_fid and union_min_members keys
+    :return: layers collection, where grouped layers are replaced by {"union": {"name", "members", "source_field",
+    "preserve_fid"}} entries. Each member is a collection entry with a "layer" key
+    """
+    min_members = config.get("union_min_members", None) or default_min_members
+    groups: Dict[str, List[Dict]] = {}
+    for collection in layers_collection:
+        for layer in collection["layers"]:
+            member = dict(collection, layer=layer)
+            del member["layers"]
+            groups.setdefault(layer.schema_fingerprint(), []).append(member)
+
+    grouped_collection = []
+    emitted = set()
+    for collection in layers_collection:
+        for layer in collection["layers"]:
+            fingerprint = layer.schema_fingerprint()
+            members = groups[fingerprint]
+            if len(members) < min_members:
+                grouped_collection.append(dict(collection, layers=[layer]))
+                continue
+            if fingerprint in emitted:
+                continue
+            emitted.add(fingerprint)
+            name = union_name([m["layer"].layer_name for m in members], len(emitted))
+            logging.info(f"Grouping {len(members)} layers with the same schema into union layer {name}")
+            grouped_collection.append({
+                "union": {
+                    "name": name,
+                    "members": members,
+                    "source_field": config.get("union_source_field", None),
+                    "preserve_fid": config.get("preserve_fid", False),
+                }
+            })
+    return grouped_collection
@@ -9,4 +9,31 @@ common_dataset_extensions = [
     ".shp",
     ".gpkg",
     ".geojson",
+    ".geojsonl",
+    ".geojsons",
 ]
+# Shapefiles are made of several files, that need to be kept together with the .shp
+shapefile_sidecar_extensions = [".dbf", ".shx", ".prj", ".cpg"]
+
+
+def get_source(source: str, config: dict = None, profile=None):
+    """
+    Instantiate the data source object matching the source string (URL or file path)
+    :param source: URL or file path
+    :param config: config dict, passed to the source object
+    :param profile: SourceProfile computed earlier for this source, if any
+    :return: a data source object (implementing AbstractSource)
+    """
+    # Imported here, the source modules themselves import this package
+    if source.startswith("ftp://"):
+        from .ftp_source import FtpSource
+        return FtpSource(source, config, profile)
+    if source.startswith("s3://"):
+        from .s3_source import S3Source
+        return S3Source(source, config, profile)
+    if source.startswith("http"):
+        from .http_source import HttpSource
+        return HttpSource(source, config, profile)
+    else:
+        from .file_source import FileSource
+        return FileSource(source, config, profile)
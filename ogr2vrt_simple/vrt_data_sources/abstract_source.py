@@ -1,14 +1,86 @@
 """
 Abstract class. Implement this when you define a new data source
+
+Source objects can be used from several threads: all their state is per-instance (set in __init__, the class
+attributes are only type hints and constants), the config is a read-only copy, and the facts computed lazily are
+computed once, under the instance lock.
 """
 
+import logging
+import threading
 from abc import ABC, abstractmethod
-from typing import Tuple
+from types import MappingProxyType
+from typing import Tuple, List, Dict, Callable, Any, Mapping
+
+from ogr2vrt_simple.utils import ogr_utils, tracing
+from ogr2vrt_simple.utils.data_structures import SourceProfile
 
 
 class AbstractSource(ABC):
 
     type: str = ""  # one of http, ftp, file
+    config: Mapping
+    # Facts about the source, computed once. Can be provided when creating the source object (e.g. from a cache)
+    profile: SourceProfile
+
+    def __init__(self, config: Dict = None, profile: SourceProfile = None):
+        """
+        :param config: config dict. The source keeps a read-only copy: changing the dict afterwards has no effect,
+        and the same dict can be shared by sources running in different threads
+        :param profile: SourceProfile computed earlier for this source, if any
+        """
+        self.config = MappingProxyType(dict(config or {}))
+        self.profile = profile
+        self._memo = {}
+        # Re-entrant: computing a fact usually reads other facts
+        self._lock = threading.RLock()
+
+    def get_profile(self) -> SourceProfile:
+        """
+        Snapshot of the facts about the source (extension, archive and streaming flags, size, charset,
+        fingerprint, remote access diagnostics). Computed once, then every method reads from it
+        :return:
+        """
+        if self.profile is None:
+            with self._lock:
+                if self.profile is None:
+                    with tracing.span("get_profile"):
+                        self.profile = self._build_profile()
+        return self.profile
+
+    @abstractmethod
+    def _build_profile(self) -> SourceProfile:
+        pass
+
+    def close(self):
+        """
+        Release the resources held by the source (e.g. in-memory downloads)
+        """
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _memoized(self, key: str, compute: Callable[[], Any]) -> Any:
+        """
+        Read a fact from the profile if there is one, compute it (once) otherwise. Facts are computed lazily, one
+        by one: asking for the file extension must not trigger a costly charset detection
+        :param key: SourceProfile attribute name, or any key for facts that are not part of the profile
+        :param compute: function computing the fact
+        :return:
+        """
+        if self.profile is not None and hasattr(self.profile, key):
+            return getattr(self.profile, key)
+        if key in self._memo:
+            return self._memo[key]
+        with self._lock:
+            # Another thread might have computed it while we were waiting for the lock
+            if key not in self._memo:
+                self._memo[key] = compute()
+            return self._memo[key]
 
     @abstractmethod
     def collect_information(self) -> dict:
@@ -47,3 +119,140 @@ class AbstractSource(ABC):
         :return: tuple : (byte size, human-friendly file size (str))
         """
         pass
+
+    def get_url(self) -> str:
+        """
+        :return: the source URL (file path for local files), which identifies it across runs
+        """
+        return self.get_profile().url
+
+    def get_fingerprint(self) -> str:
+        """
+        Cheap identifier of the current state of the source data (e.g. size and modification time). Used to know
+        whether something derived from the data (materialized copy, cached schema) is still up-to-date.
+        :return: fingerprint string, None if the source does not provide enough information to compute one
+        """
+        return None
+
+    @abstractmethod
+    def get_source_paths(self) -> List:
+        """
+        Generate the OGR source path with vsi prefixes and specific logic (e.g. for archives)
+        Since there might be several matches, it will always return a list of candidates
+        :return:
+        """
+        pass
+
+    def collect_layers(self, path: str = None, db_friendly: bool = False) -> List[Dict]:
+        """
+        Collect layers definition for the data pointed by path (path is a vsi-enabled OGR path).
+        If path is not provided, it will look at all the paths returned by get_source_paths
+        :param path:
+        :param db_friendly:
+        :return:
+        """
+        # If param's not set in the function, look in the global config
+        if not db_friendly:
+            db_friendly = self.config.get("db_friendly", False)
+
+        if path:
+            source_paths = [path]
+        else:
+            with tracing.span("get_source_paths"):
+                source_paths = self.get_source_paths()
+        collect = self._get_layers_collector()
+        collections = [self._collect_path(s, collect, db_friendly, path is not None) for s in source_paths]
+        return [c for c in collections if c]
+
+    def _collect_path(self, source_path: str, collect: Callable, db_friendly: bool, explicit: bool) -> Dict:
+        """
+        Collect the layers of a single source path
+        :param source_path:
+        :param collect: layers collector, see _get_layers_collector
+        :param db_friendly:
+        :param explicit: whether the path was explicitly provided (then it is expected to work)
+        :return: layers collection entry, None if the path has no layers or could not be opened
+        """
+        try:
+            with tracing.span("collect_layers", path=source_path):
+                layers = collect(self._open_path(source_path), db_friendly)
+            if layers:
+                return {
+                    "source_path": source_path,
+                    "layers": layers
+                }
+        except Exception as e:
+            if explicit:
+                logging.error(f"Error trying to collect layers for path {source_path}")
+            else:
+                # This is probably expected since we might encounter some false-positive files
+                # when processing all eligible files
+                logging.debug(f"Error trying to collect layers for path {source_path}")
+        return None
+
+    def _open_path(self, path: str) -> str:
+        """
+        Path actually opened when probing and introspecting the source. The generated VRT always uses the original path
+        :param path: vsi-enabled OGR path
+        :return:
+        """
+        return path
+
+    def _get_layers_collector(self) -> Callable:
+        """
+        Large GeoJSON files are sampled instead of being fully parsed by OGR (see geojson_utils). In union mode, CSV
+        files with the same header line as a file already collected re-use its schema instead of being opened with OGR
+        :return: function (path, db_friendly) -> layers, like ogr_utils.collect_layers
+        """
+        from ogr2vrt_simple.utils import geojson_utils
+
+        def collect(path: str, db_friendly: bool):
+            return geojson_utils.collect_layers(path, db_friendly, self.config)
+
+        if self.config.get("union", False):
+            from ogr2vrt_simple.utils import union_utils
+            return union_utils.HeaderSchemaCache(collect).collect_layers
+        return collect
+
+    def build_vrt(self, path: str = None, db_friendly: bool = False) -> str:
+        """
+        Build the VRT file for the data pointed by path.
+        If path is not provided, it will look at all the paths returned by get_source_paths
+        :param path:
+        :param db_friendly:
+        :return:
+        """
+        # If param's not set in the function, look in the global config
+        if not db_friendly:
+            db_friendly = self.config.get("db_friendly", False)
+
+        layers_collection = self.collect_layers(path, db_friendly)
+        return self.render_vrt(layers_collection)
+
+    def render_vrt(self, layers_collection: List[Dict]) -> str:
+        """
+        Render the VRT file for a layers collection, as returned by collect_layers
+        :param layers_collection:
+        :return:
+        """
+        from ogr2vrt_simple.utils import filter_utils
+        layers_collection = filter_utils.apply_filters(layers_collection, self.config)
+        if self.config.get("ensure_indexes", False):
+            from ogr2vrt_simple.utils import index_utils
+            with tracing.span("ensure_indexes"):
+                index_utils.ensure_indexes(
+                    layers_collection,
+                    [f for f in (self.config.get("index_fields", None) or "").split(",") if f],
+                    self.config.get("index_workers", None),
+                )
+        if self.config.get("materialize", None):
+            from ogr2vrt_simple.utils import materialize
+            with tracing.span("materialize"):
+                layers_collection = materialize.materialize_layers(
+                    layers_collection, self.get_fingerprint(), self.config, self.get_url()
+                )
+        if self.config.get("union", False):
+            from ogr2vrt_simple.utils import union_utils
+            layers_collection = union_utils.group_layers(layers_collection, self.config)
+        vrt_content = ogr_utils.layers2vrt(layers_collection, self.config.get("template", None))
+        return vrt_content
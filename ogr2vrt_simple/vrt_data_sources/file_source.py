@@ -4,26 +4,37 @@ Defined by a file path
 """
 import logging
 import os
-from typing import Tuple, List, Dict
+import tempfile
+from typing import Tuple, List, Dict, Optional
 
-import charset_normalizer
-import humanize
-from ogr2vrt_simple.utils import ogr_utils
+from ogr2vrt_simple.utils import ogr_utils, tracing
+from ogr2vrt_simple.utils.data_structures import SourceProfile
 
-from ogr2vrt_simple.vrt_data_sources import archive_extension_list, common_dataset_extensions
+from ogr2vrt_simple.vrt_data_sources import (
+    archive_extension_list,
+    common_dataset_extensions,
+    shapefile_sidecar_extensions,
+)
 from ogr2vrt_simple.vrt_data_sources.abstract_source import AbstractSource
 
+# .tar.gz members larger than this (except line-based ones, of which only the head is extracted) are read through
+# /vsitar/ instead of being extracted. Can be overridden with the max_tar_extract_size config key
+default_max_tar_extract_size = 256 * 1024 ** 2
+
 
 class FileSource(AbstractSource):
-    file_path: str = ""
+    file_path: str
     type: str = "file"
-    config: dict = {}
-    file_extension: str = None
+    # Set when the source was transcoded to a UTF-8 sidecar, see _get_transcoded
+    transcoded: dict
+    # Members extracted from a .tar.gz archive, see _get_tar_scan
+    tar_extract_dir: Optional[tempfile.TemporaryDirectory]
 
-    def __init__(self, file_path: str, config: dict = None):
+    def __init__(self, file_path: str, config: dict = None, profile: SourceProfile = None):
+        super().__init__(config, profile)
         self.file_path = file_path
-        if config:
-            self.config = config
+        self.transcoded = None
+        self.tar_extract_dir = None
 
         # Check that the file exists
         try:
@@ -34,41 +45,72 @@ class FileSource(AbstractSource):
         except OSError:
             logging.error("OS error occurred when trying to fetch file size")
 
+    def close(self):
+        with self._lock:
+            if self.tar_extract_dir is not None:
+                self.tar_extract_dir.cleanup()
+                self.tar_extract_dir = None
+                self._memo.pop("tar_scan", None)
+
     def collect_information(self) -> dict:
         """
         Gather information about the data source.
         path is called url for consistency with the http source
         :return:
         """
+        profile = self.get_profile()
         return {
-            "url": self.file_path,
-            "type": self.type,
-            "file_extension": self.get_file_extension(),
-            "is_archive": self.is_archive(),
-            "is_streaming": False,
-            "file_size": self.get_data_full_size(),
-            "charset": self.get_charset(),
+            "url": profile.url,
+            "type": profile.type,
+            "file_extension": profile.file_extension,
+            "is_archive": profile.is_archive,
+            "is_streaming": profile.is_streaming,
+            "file_size": profile.file_size,
+            "charset": profile.charset,
             "can_be_remotely_accessed": False,
         }
 
+    def _build_profile(self) -> SourceProfile:
+        return SourceProfile(
+            url=self.file_path,
+            type=self.type,
+            file_extension=self.get_file_extension(),
+            is_archive=self.is_archive(),
+            is_streaming=False,
+            file_size=self.get_data_full_size(),
+            charset=self.get_charset(),
+            fingerprint=self.get_fingerprint(),
+            remote_access=(0, "Local file"),
+        )
+
     def is_remote(self) -> bool:
         return False
 
     def get_file_extension(self) -> str:
         """
-        Easy for file-based data
+        Easy for file-based data, except for double extensions like .tar.gz
         :return: file extension string
         """
+        return self._memoized("file_extension", self._find_file_extension)
+
+    def _find_file_extension(self) -> str:
+        for ext in archive_extension_list:
+            if self.file_path.lower().endswith(ext):
+                return ext
         return os.path.splitext(self.file_path)[1]
 
     def is_archive(self) -> bool:
-        ext = self.get_file_extension()
-        return ext in archive_extension_list
+        return self._memoized("is_archive", lambda: self.get_file_extension() in archive_extension_list)
 
     def get_data_full_size(self) -> Tuple[int, str]:
         """
         :return: tuple : (byte size, human-friendly file size (str))
         """
+        return self._memoized("file_size", self._find_data_full_size)
+
+    def _find_data_full_size(self) -> Tuple[int, str]:
+        import humanize
+
         try:
             size = os.path.getsize(self.file_path)
             binary_size = humanize.naturalsize(size, binary=True)
@@ -81,10 +123,41 @@ class FileSource(AbstractSource):
             logging.error("OS error occurred when trying to fetch file size")
             raise OSError
 
+    def get_url(self) -> str:
+        return os.path.abspath(self.file_path)
+
+    def get_fingerprint(self) -> str:
+        """
+        Local files are identified by their absolute path, size and modification time
+        :return:
+        """
+        return self._memoized("fingerprint", self._find_fingerprint)
+
+    def _find_fingerprint(self) -> str:
+        stat = os.stat(self.file_path)
+        return f"{os.path.abspath(self.file_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
     def get_charset(self):
+        return self._memoized("charset", self._detect_charset)
+
+    def _detect_charset(self):
+        """
+        Detected on the head of the file (charset_sample_size config key), so that it does not depend on the file size
+        """
+        import charset_normalizer
+
+        from ogr2vrt_simple.utils import archive_utils
+
         if self.is_archive():
             return None
-        cn = charset_normalizer.from_path(self.file_path).best()
+        sample_size = self.config.get("charset_sample_size", None) or archive_utils.default_sample_size
+        with tracing.span("get_charset", path=self.file_path):
+            with open(self.file_path, "rb") as f:
+                sample = f.read(sample_size)
+            if len(sample) == sample_size and b"\n" in sample:
+                # Don't cut a multi-byte character, it would not be valid in any encoding
+                sample = sample[:sample.rindex(b"\n") + 1]
+            cn = charset_normalizer.from_bytes(sample).best()
         if cn:
             return cn.encoding
 
@@ -96,12 +169,12 @@ class FileSource(AbstractSource):
         files which extension is found in the common_dataset_extensions list. Unless data_formats is provided in config dict
         :return:
         """
+        return self._memoized("archive_paths", self._find_paths_in_archive)
+
+    def _find_paths_in_archive(self) -> List[str]:
         if not self.is_archive():
             return []
-        data_formats = self.config.get("data_formats", None)
-        file_extensions = (
-            data_formats.split(",") if data_formats else common_dataset_extensions
-        )
+        file_extensions = self._get_data_formats()
         ext = self.get_file_extension()
 
         if ext == ".zip":
@@ -113,15 +186,7 @@ class FileSource(AbstractSource):
                     f for f in file_list if os.path.splitext(f)[1] in file_extensions
                 ]
         elif ext in (".tar.gz", ".tgz"):
-            import tarfile
-            with tarfile.open(self.file_path, "r") as tar:
-                file_list = tar.getmembers()
-                # print("The file list is:", file_list)
-                return [
-                    f.name
-                    for f in file_list
-                    if os.path.splitext(f.name)[1] in file_extensions
-                ]
+            return [m for m in self._get_tar_scan()["selected"] if os.path.splitext(m)[1] in file_extensions]
         elif ext == ".7z":
             import py7zr
             with py7zr.SevenZipFile(self.file_path, mode='r') as z:
@@ -143,68 +208,297 @@ class FileSource(AbstractSource):
             return []
             # TODO: add support for other compression formats
 
-    def get_source_paths(self) -> List:
+    def _get_data_formats(self) -> List[str]:
+        data_formats = self.config.get("data_formats", None)
+        return data_formats.split(",") if data_formats else common_dataset_extensions
+
+    def get_source_paths(self) -> List[str]:
         """
         Generate the OGR source path with vsi prefixes and specific logic (e.g. for archives)
         Since there might be several matches, it will always return a list of candidates
         :return:
         """
-        fp = os.path.abspath(self.file_path)
-        if self.config.get("relative_to_file", False):
-            fp = os.path.relpath(self.file_path)
         if self.is_archive():
-            pre = ogr_utils.vsiprefix_from_archive_extension(self.get_file_extension())
-            return [pre + fp + "/" + p for p in self.find_paths_in_archive()]
+            with tracing.span("find_paths_in_archive", path=self.file_path):
+                archive_paths = self.find_paths_in_archive()
+            return [self.get_member_source_path(p) for p in archive_paths]
         else:
-            return [fp]
+            transcoded = self._get_transcoded()
+            return [self._get_path(transcoded["path"] if transcoded else self.file_path)]
+
+    def _get_path(self, file_path: str = None) -> str:
+        file_path = file_path or self.file_path
+        if self.config.get("relative_to_file", False):
+            return os.path.relpath(file_path)
+        return os.path.abspath(file_path)
+
+    def _get_transcoded(self) -> dict:
+        """
+        OGR only reads UTF-8 CSV files: other encodings are transcoded into a UTF-8 sidecar file (unless the
+        transcode config key is False), see _get_transcode_dir for where it is written
+        :return: the sidecar record (path, original encoding), None if the source is used as is
+        """
+        if not self.config.get("transcode", True) or self.get_file_extension().lower() != ".csv":
+            return None
+        with self._lock:
+            if self.transcoded is None:
+                from ogr2vrt_simple.utils import transcode
+                self.transcoded = transcode.ensure_utf8(
+                    self.file_path, self.get_fingerprint(), self.get_charset, self._get_transcode_dir()
+                ) or {}
+        return self.transcoded
+
+    def _get_transcode_dir(self) -> str:
+        """
+        UTF-8 sidecars are written in transcode_dir if set, beside the source if transcode_in_place is set, in a
+        temporary folder otherwise (see transcode.sidecar_dir)
+        """
+        from ogr2vrt_simple.utils import transcode
+
+        return transcode.sidecar_dir(
+            self.file_path, self.config.get("transcode_dir", None), self.config.get("transcode_in_place", False)
+        )
+
+    def get_members_charsets(self) -> Dict[str, str]:
+        """
+        Charset of the CSV members of the archive, each detected on a sample streamed from the archive: nothing is
+        extracted. Members are sampled concurrently, except for .tar.gz archives (see _get_tar_scan)
+        :return: dict member path -> charset (None if it could not be detected)
+        """
+        return self._memoized("members_charsets", self._detect_members_charsets)
+
+    def _detect_members_charsets(self) -> Dict[str, str]:
+        from ogr2vrt_simple.utils import archive_utils
+
+        if not self.is_archive():
+            return {}
+        if self.get_file_extension() in (".tar.gz", ".tgz"):
+            return dict(self._get_tar_scan()["charsets"])
+        members = [m for m in self.find_paths_in_archive() if archive_utils.is_text_member(m)]
+        with tracing.span("get_members_charsets", path=self.file_path, count=len(members)):
+            return archive_utils.detect_members_charsets(
+                self.file_path,
+                self.get_file_extension(),
+                members,
+                self.config.get("charset_sample_size", None),
+                self.config.get("probe_workers", None),
+            )
+
+    def _get_transcoded_member(self, member: str) -> dict:
+        """
+        Same as _get_transcoded, for archive members: non-UTF-8 CSV members are transcoded into a UTF-8 sidecar,
+        streamed from the archive (while it is scanned, for .tar.gz archives, see _get_tar_scan)
+        :param member: member path in the archive
+        :return: the sidecar record, None if the member is used as is
+        """
+        from ogr2vrt_simple.utils import archive_utils
+
+        if not self.config.get("transcode", True) or not archive_utils.is_text_member(member):
+            return None
+        if self.get_file_extension() in (".tar.gz", ".tgz"):
+            return self._get_tar_scan()["transcoded"].get(member, None)
+
+        def _transcode():
+            from ogr2vrt_simple.utils import transcode
+            return transcode.ensure_utf8(
+                self._get_archive_prefix(os.path.abspath(self.file_path)) + member,
+                self.get_fingerprint(),
+                lambda: self.get_members_charsets().get(member, None),
+                sidecar=self._get_member_sidecar_path(member),
+                open_source=lambda: archive_utils.open_member(self.file_path, self.get_file_extension(), member),
+            )
+
+        return self._memoized(f"transcoded_member:{member}", _transcode)
+
+    def _get_member_sidecar_path(self, member: str) -> str:
+        """
+        Sidecars of archive members are named after the archive and the member path, e.g. data_2023_conso.utf8.csv
+        for the 2023/conso.csv member of data.zip. They are written in the same folder as the other sidecars, see
+        _get_transcode_dir
+        """
+        from ogr2vrt_simple.utils import transcode
+
+        stem = os.path.basename(self.file_path)[:-len(self.get_file_extension())]
+        return transcode.sidecar_path(os.path.join(self._get_transcode_dir(), f"{stem}_{member.replace('/', '_')}"))
+
+    def get_member_source_path(self, member: str, prefix: str = None) -> str:
+        """
+        :param member: member path in the archive
+        :param prefix: vsi prefix of the archive. Default: the local archive
+        :return: the source path of an archive member: its UTF-8 sidecar if it was transcoded, the member otherwise
+        """
+        transcoded = self._get_transcoded_member(member)
+        if transcoded:
+            return self._get_path(transcoded["path"])
+        return (prefix or self._get_archive_prefix()) + member
+
+    def annotate_members(self, layers_collection: List[Dict], prefixes: List[str] = None,
+                         original_prefix: str = None) -> List[Dict]:
+        """
+        Attach the charset of the CSV members to their layers collection entries (encoding key). Entries of transcoded
+        members also get the member path and original encoding (original_path, original_encoding keys), entries of
+        non-UTF-8 members that were not transcoded get an unsupported_encoding key
+        :param layers_collection:
+        :param prefixes: vsi prefixes the members' source paths can start with. Default: the local archive
+        :param original_prefix: vsi prefix used for original_path. Default: the local archive
+        :return: layers_collection
+        """
+        from ogr2vrt_simple.utils import transcode
+
+        prefixes = prefixes or [self._get_archive_prefix()]
+        original_prefix = original_prefix or prefixes[0]
+        by_path = {c["source_path"]: c for c in layers_collection}
+        for member, charset in self.get_members_charsets().items():
+            transcoded = self._get_transcoded_member(member)
+            if transcoded:
+                collection = by_path.get(self._get_path(transcoded["path"]), None)
+                if collection:
+                    collection["original_path"] = original_prefix + member
+                    collection["original_encoding"] = transcoded["encoding"]
+            else:
+                collection = next((by_path[p + member] for p in prefixes if p + member in by_path), None)
+                if collection and transcode.needs_transcoding(charset):
+                    logging.warning(f"{member} is {charset} encoded, but OGR reads CSV files as UTF-8")
+                    collection["unsupported_encoding"] = charset
+            if collection:
+                collection["encoding"] = charset
+        return layers_collection
+
+    def _get_archive_prefix(self, file_path: str = None) -> str:
+        """
+        :param file_path: archive path. Default: the source path, see _get_path
+        :return: the vsi path of the archive, to which members paths are appended
+        """
+        return ogr_utils.vsiprefix_from_archive_extension(self.get_file_extension()) + (file_path or self._get_path()) + "/"
 
     def collect_layers(self, path: str = None, db_friendly: bool = False) -> List[Dict]:
         """
-        Collect layers definition for the data pointed by path.
-        If path is not provided, it will look at all the paths returned by get_source_paths
-        :param path:
-        :param db_friendly:
-        :return:
+        Gzip-compressed tar archives get a dedicated implementation, see _collect_tar_layers.
+        Layers of transcoded sources also get the original path and encoding
         """
-        # If param's not set in the function, look in the global config
+        if path or self.get_file_extension() not in (".tar.gz", ".tgz"):
+            layers_collection = super().collect_layers(path, db_friendly)
+            if self.is_archive():
+                return self.annotate_members(layers_collection)
+            transcoded = self._get_transcoded()
+            if not path and transcoded:
+                # Keep track of the original source, it is mentioned in the VRT
+                for collection in layers_collection:
+                    collection["original_path"] = self._get_path()
+                    collection["original_encoding"] = transcoded["encoding"]
+            return layers_collection
         if not db_friendly:
             db_friendly = self.config.get("db_friendly", False)
+        return self.annotate_members(self._collect_tar_layers(db_friendly))
 
-        if path:
-            source_paths = [path]
-        else:
-            source_paths = self.get_source_paths()
+    def _get_tar_scan(self) -> Dict:
+        """
+        A gzip stream can only be read from its start, so .tar.gz archives are read in a single pass (see
+        gzip_index.extract_members) that gives everything the other methods need: the candidate members, extracted
+        copies to read their schemas from, the charset of the CSV members (detected on their extracted head) and their
+        UTF-8 sidecars, transcoded while the member goes by. The extracted copies are kept until the source is closed.
+        Only the head of line-based members (CSV, GeoJSONSeq) is extracted. Other members above the extraction size
+        cap are not extracted
+        :return: dict with the keys dir, selected (candidate members and shapefile sidecars, in archive order),
+        extracted (set of member names), charsets, transcoded (sidecar records, by member name)
+        """
+        return self._memoized("tar_scan", self._scan_tar)
+
+    def _scan_tar(self) -> Dict:
+        from contextlib import nullcontext
+
+        import charset_normalizer
+
+        from ogr2vrt_simple.utils import access_cost, archive_utils, gzip_index, transcode
+
+        file_extensions = self._get_data_formats()
+        sample_size = self.config.get("access_sample_size", None) or access_cost.default_sample_size
+        charset_sample_size = self.config.get("charset_sample_size", None) or archive_utils.default_sample_size
+        max_size = self.config.get("max_tar_extract_size", None)
+        if max_size is None:
+            max_size = default_max_tar_extract_size
+        selected = []
+        charsets = {}
+        transcoded = {}
+
+        def select(name: str) -> bool:
+            ext = os.path.splitext(name)[1]
+            if ext in file_extensions or ext in shapefile_sidecar_extensions:
+                selected.append(name)
+                return True
+            return False
+
+        def head_size(name: str) -> Optional[int]:
+            if archive_utils.is_text_member(name):
+                return max(sample_size, charset_sample_size)
+            return sample_size if access_cost.get_format_reads(os.path.splitext(name)[1]).sample else None
+
+        def on_extract(name: str, path: str, member) -> None:
+            if not archive_utils.is_text_member(name) or os.path.splitext(name)[1] not in file_extensions:
+                return
+            try:
+                with tracing.span("get_charset", path=name):
+                    cn = charset_normalizer.from_path(path).best()
+                charsets[name] = cn.encoding if cn else None
+            except Exception as e:
+                logging.debug(f"Could not detect the charset of {name}: {e}")
+                charsets[name] = None
+            if self.config.get("transcode", True):
+                transcoded[name] = transcode.ensure_utf8(
+                    self._get_archive_prefix(os.path.abspath(self.file_path)) + name,
+                    self.get_fingerprint(),
+                    lambda: charsets[name],
+                    sidecar=self._get_member_sidecar_path(name),
+                    open_source=lambda: nullcontext(member),
+                )
+
+        self.tar_extract_dir = tempfile.TemporaryDirectory(prefix="ogr2vrt_")
+        with tracing.span("scan_tar", path=self.file_path):
+            extracted = gzip_index.extract_members(
+                self.file_path, select, self.tar_extract_dir.name, head_size, max_size, on_extract
+            )
+        return {
+            "dir": self.tar_extract_dir.name,
+            "selected": selected,
+            "extracted": set(extracted),
+            "charsets": charsets,
+            "transcoded": transcoded,
+        }
+
+    def _collect_tar_layers(self, db_friendly: bool) -> List[Dict]:
+        """
+        Through /vsitar/, each member open decompresses the archive from its start. Instead, read the schemas from the
+        copies extracted by the single pass over the archive (see _get_tar_scan). The source paths in the VRT still
+        point to the archive members. Members that were not extracted are read through /vsitar/
+        """
+        scan = self._get_tar_scan()
+        file_extensions = self._get_data_formats()
+        selected = scan["selected"]
         layers_collection = []
-        for s in source_paths:
+        collect = self._get_layers_collector()
+        for m in selected:
+            if os.path.splitext(m)[1] not in file_extensions:
+                continue
+            s = self.get_member_source_path(m)
+            # A shapefile is read from the extracted copies only if all its sidecars were extracted too
+            stem = os.path.splitext(m)[0]
+            parts = [n for n in selected if n == m or os.path.splitext(n)[0] == stem]
+            transcoded = self._get_transcoded_member(m)
+            if transcoded:
+                path = transcoded["path"]
+            elif scan["extracted"].issuperset(parts):
+                path = os.path.join(scan["dir"], m)
+            else:
+                path = s
             try:
-                layers = ogr_utils.collect_layers(s, db_friendly)
+                with tracing.span("collect_layers", path=s):
+                    layers = collect(path, db_friendly)
                 if layers:
                     layers_collection.append({
                         "source_path": s,
                         "layers": layers
                     })
             except Exception as e:
-                if path:
-                    # path was explicitly provided => it is expected to work
-                    logging.error(f"Error trying to collect layers for path {s}")
-                else:
-                    # This is probably expected since we might encounter some false-positive files
-                    # when processing all eligible files
-                    logging.debug(f"Error trying to collect layers for path {s}")
+                # Probably a false-positive file
+                logging.debug(f"Error trying to collect layers for path {s}")
         return layers_collection
-
-    def build_vrt(self, path: str = None, db_friendly: bool = False) -> str:
-        """
-        Build the VRT file for the data pointed by path.
-        If path is not provided, it will look at all the paths returned by get_source_paths
-        :param path:
-        :param db_friendly:
-        :return:
-        """
-        # If param's not set in the function, look in the global config
-        if not db_friendly:
-            db_friendly = self.config.get("db_friendly", False)
-
-        layers_collection = self.collect_layers(path, db_friendly)
-        vrt_content = ogr_utils.layers2vrt(layers_collection)
-        return vrt_content
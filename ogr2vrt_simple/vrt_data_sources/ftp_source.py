@@ -0,0 +1,115 @@
+"""
+FTP data source.
+Defined by an ftp:// URL. There are no HTTP headers: the size and modification time are asked to the server
+(SIZE, MDTM or MLSD) and exposed as their HTTP equivalents (Content-Length, Last-Modified), the charset is detected on the first bytes of the file (partial read with REST).
+Remote access (/vsicurl/ftp://...) is probed and falls back on a local copy the same way as for HTTP sources.
+"""
+import email.message
+import email.utils
+import ftplib
+import logging
+import os
+import time
+import urllib
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+from ogr2vrt_simple.utils import access_cost, ftp_utils, tracing
+from ogr2vrt_simple.vrt_data_sources import archive_extension_list
+from ogr2vrt_simple.vrt_data_sources.http_source import HttpSource
+
+
+class FtpSource(HttpSource):
+    type: str = "ftp"
+
+    def _request_headers(self) -> email.message.Message:
+        """
+        HTTP-like headers built from what the FTP server tells about the file, for the code shared with HTTP sources
+        """
+        headers = email.message.Message()
+        size = ftp_utils.get_size(self.url)
+        if size is not None:
+            headers["Content-Length"] = str(size)
+        modified = ftp_utils.get_modification_time(self.url)
+        if modified:
+            try:
+                date = datetime.strptime(modified[:14], "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
+                headers["Last-Modified"] = email.utils.format_datetime(date, usegmt=True)
+            except ValueError:
+                logging.debug(f"Unexpected modification time for {self.url}: {modified}")
+        return headers
+
+    def _find_file_extension(self) -> str:
+        path = urllib.parse.urlparse(self.url).path.lower()
+        for ext in archive_extension_list:
+            if path.endswith(ext):
+                return ext
+        return os.path.splitext(path)[1]
+
+    def is_streaming(self):
+        return False
+
+    def _find_data_full_size(self) -> Tuple[int, str]:
+        import humanize
+
+        size = ftp_utils.get_size(self.url)
+        if size is None:
+            return None
+        return size, humanize.naturalsize(size, binary=True)
+
+    def _find_charset(self, thorough=False):
+        import charset_normalizer
+
+        if self.is_archive():
+            return None
+        sample = ftp_utils.read_range(self.url, 0, ftp_utils.sample_size)
+        with tracing.span("get_charset", path=self.url):
+            cn = charset_normalizer.from_bytes(sample).best()
+        return cn.encoding if cn else None
+
+    def _find_fingerprint(self) -> str:
+        validators = [str(v) for v in (ftp_utils.get_size(self.url), ftp_utils.get_modification_time(self.url)) if v]
+        if not validators:
+            return None
+        return "|".join([self.url] + validators)
+
+    def _measure_network(self) -> Optional[access_cost.NetworkMeasures]:
+        """
+        Round-trip time of a NOOP on the pooled control connection, throughput of a partial read (REST)
+        """
+        with tracing.span("measure_network", url=self.url):
+            try:
+                start = time.perf_counter()
+                ftp_utils.pool.run(self.url, lambda ftp, path: ftp.voidcmd("NOOP"))
+                rtt = time.perf_counter() - start
+                start = time.perf_counter()
+                data = ftp_utils.read_range(self.url, 0, access_cost.default_probe_size)
+                # Opening the data connection (PASV) and the transfer (RETR) take a round trip each
+                elapsed = time.perf_counter() - start - 2 * rtt
+            except ftplib.all_errors as e:
+                logging.debug(f"Could not measure the network for {self.url}: {e}")
+                return None
+        return access_cost.NetworkMeasures(
+            rtt=rtt,
+            throughput=len(data) / max(elapsed, access_cost.min_transfer_time),
+            range_support=True,
+        )
+
+    def _read_head(self, size: int) -> bytes:
+        return ftp_utils.read_range(self.url, 0, size)
+
+    def _download(self, filename: str) -> str:
+        return ftp_utils.download(self.url, filename)
+
+    def _download_to_buffer(self, max_size: int, spill_path: str) -> Tuple[bytearray, str]:
+        return ftp_utils.download_to_buffer(self.url, max_size, spill_path)
+
+    def _open_path(self, path: str) -> str:
+        if self.use_local_file_source():
+            return self.get_local_file_source()._open_path(path)
+        local_path = self._get_introspection_path(path)
+        if local_path:
+            return local_path
+        if self.config.get("cache_proxy", None):
+            logging.debug("The caching proxy only handles HTTP sources")
+        return path
@@ -9,56 +9,93 @@ import mimetypes
 import os
 import re
 import tempfile
-from typing import Tuple, List, Dict
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Tuple, List, Dict, Optional
 import urllib
 from uuid import uuid4
 
-import humanize
-
-from ogr2vrt_simple.utils import ogr_utils, io_utils
+from ogr2vrt_simple.utils import access_cost, ogr_utils, io_utils, tracing, transcode
+from ogr2vrt_simple.utils.data_structures import SourceProfile
 from ogr2vrt_simple.vrt_data_sources import archive_extension_list, common_dataset_extensions
 from ogr2vrt_simple.vrt_data_sources.abstract_source import AbstractSource
 from ogr2vrt_simple.vrt_data_sources.file_source import FileSource
 
 
+# Archive members probing: number of concurrent probes, and number of members probed before assuming that the others
+# behave the same way
+default_probe_workers = 4
+default_max_probed_members = 8
+# Downloads up to this size are kept in memory (/vsimem/) rather than written to a temporary file
+default_vsimem_max_size = 8 * 1024 ** 2
+
+_mimetypes_lock = threading.Lock()
+_mimetypes_registered = False
+
+
+def _register_mimetypes():
+    """
+    Enrich the mimetype DB with some non-standard types. The DB is global to the process: done once, and loaded
+    under a lock (mimetypes loads it lazily, without locking)
+    """
+    global _mimetypes_registered
+    with _mimetypes_lock:
+        if not _mimetypes_registered:
+            mimetypes.add_type("application/csv", ".csv", strict=False)
+            _mimetypes_registered = True
+
+
 class HttpSource(AbstractSource):
-    url: str = ""  # can actually be URL or file path
+    url: str  # can actually be URL or file path
     type: str = "http"  # one of http, ftp, file
-    config: Dict = {}
-    http_headers = None
-    file_extension: str = None
+    http_headers: Dict
 
     # In some cases we can't use remote access and we will fall back on local, hence use those
-    vrt_file_source: FileSource = None
-    use_vrt_file_source: bool = False
-    local_tmp_dir = None
+    vrt_file_source: FileSource
+    use_vrt_file_source: bool
+    local_tmp_dir: str
 
-    def __init__(self, url: str, config: Dict = None):
+    def __init__(self, url: str, config: Dict = None, profile: SourceProfile = None):
+        super().__init__(config, profile)
         self.url = url
         self._set_type(url)
-        if config:
-            self.config = config
-            if config.get("no_vsicurl", False):
-                self.use_vrt_file_source = True
+        self.http_headers = None
+        self.vrt_file_source = None
+        self.use_vrt_file_source = self.config.get("no_vsicurl", False)
+        self.local_tmp_dir = None
+        self._head_rtt = None
 
     def collect_information(self):
-        # start with HTTP headers
-        self.http_headers = self._get_headers()
-        self.file_extension = self.get_file_extension()
-        can_be, comments = self.can_be_remotely_accessed()
+        profile = self.get_profile()
+        can_be, comments = profile.remote_access
         return {
-            "url": self.url,
-            "type": self.type,
-            "file_extension": self.get_file_extension(),
-            "is_archive": self.is_archive(),
-            "is_streaming": self.is_streaming(),
-            "file_size": self.get_data_full_size(),
-            "charset": self.get_charset(),
+            "url": profile.url,
+            "type": profile.type,
+            "file_extension": profile.file_extension,
+            "is_archive": profile.is_archive,
+            "is_streaming": profile.is_streaming,
+            "file_size": profile.file_size,
+            "charset": profile.charset,
             "can_be_remotely_accessed": can_be,
             "can_be_remotely_accessed_comments": comments,
-
+            "access_plan": self.get_access_plan().describe(),
         }
 
+    def _build_profile(self) -> SourceProfile:
+        # All the facts come from the same HEAD request
+        return SourceProfile(
+            url=self.url,
+            type=self.type,
+            file_extension=self.get_file_extension(),
+            is_archive=self.is_archive(),
+            is_streaming=self.is_streaming(),
+            file_size=self.get_data_full_size(),
+            charset=self.get_charset(),
+            fingerprint=self.get_fingerprint(),
+            remote_access=self.can_be_remotely_accessed(),
+        )
+
     def _set_type(self, url: str):
         if url.startswith("http"):
             self.type = "http"
@@ -77,26 +114,44 @@ class HttpSource(AbstractSource):
         :return:
         """
         if not self.http_headers:
-            req = urllib.request.Request(self.url, method="HEAD")
-            head = urllib.request.urlopen(req)
-            self.http_headers = head.headers
+            with self._lock:
+                if not self.http_headers:
+                    self.http_headers = self._request_headers()
         return self.http_headers
 
+    def _request_headers(self):
+        # No Accept-Encoding: the Content-Length must be the size of the data, not of a compressed transfer
+        with tracing.span("http_head", url=self.url):
+            tracing.count("http_requests")
+            req = urllib.request.Request(self.url, method="HEAD")
+            start = time.perf_counter()
+            try:
+                head = urllib.request.urlopen(req)
+            except urllib.error.HTTPError as e:
+                if e.code not in (405, 501):
+                    raise
+                # Some servers don't allow HEAD requests: use GET, but only read the headers
+                tracing.count("http_requests")
+                head = urllib.request.urlopen(self.url)
+                head.close()
+            # Round-trip time, for the access cost estimates
+            self._head_rtt = time.perf_counter() - start
+            return head.headers
+
     def get_file_extension(self) -> str:
         """
         Try to figure out the file extension (file type)
         :return: file extension string
         """
-        if not self.file_extension:
-            ext = self._get_extension_from_headers()
-            if not ext:
-                ext = self._get_extension_from_url()
-            self.file_extension = ext
-
-        if not self.file_extension.startswith("."):
-            self.file_extension = "." + self.file_extension
+        return self._memoized("file_extension", self._find_file_extension)
 
-        return self.file_extension
+    def _find_file_extension(self) -> str:
+        ext = self._get_extension_from_headers()
+        if not ext:
+            ext = self._get_extension_from_url()
+        if not ext.startswith("."):
+            ext = "." + ext
+        return ext
 
     def _get_extension_from_content_type_header(self):
         """
@@ -108,9 +163,7 @@ class HttpSource(AbstractSource):
         if not ct:
             return None
 
-        # Enrich the mimetype DB with some non-standard types
-        mimetypes.add_type("application/csv", ".csv", strict=False)
-
+        _register_mimetypes()
         extension = mimetypes.guess_extension(ct.split(";")[0], strict=False)
         return extension
 
@@ -157,13 +210,16 @@ class HttpSource(AbstractSource):
         Check a file extension and determine if it is an archive.
         :return:
         """
-        return self.get_file_extension() in archive_extension_list
+        return self._memoized("is_archive", lambda: self.get_file_extension() in archive_extension_list)
 
     def get_charset(self, thorough=False):
         """
         Try to get the charset information from the headers
         :return:
         """
+        return self._memoized("charset", lambda: self._find_charset(thorough))
+
+    def _find_charset(self, thorough=False):
         if not self.http_headers:
             self._get_headers()
         try:
@@ -183,14 +239,7 @@ class HttpSource(AbstractSource):
         If headers are provided, it will not have to make a request to get them
         :return:
         """
-        if not self.http_headers:
-            self._get_headers()
-        ct = self.http_headers["Transfer-Encoding"]
-        # print(ct)
-        if ct == "chunked":
-            return True
-        else:
-            return False
+        return self._memoized("is_streaming", lambda: self._get_headers()["Transfer-Encoding"] == "chunked")
 
     def get_data_full_size(self) -> Tuple[int, str]:
         """
@@ -199,20 +248,49 @@ class HttpSource(AbstractSource):
         If headers are provided, it will not have to make a request to get them
         :return: tuple : (byte size, human-friendly file size (str))
         """
+        return self._memoized("file_size", self._find_data_full_size)
+
+    def _find_data_full_size(self) -> Tuple[int, str]:
         if not self.http_headers:
             self._get_headers()
         # If it's a streaming service, the full size is not advertised AFAIK
         if self.is_streaming():
             return None
 
+        content_encoding = (self.http_headers["Content-Encoding"] or "identity").strip().lower()
+        if content_encoding != "identity":
+            # The server compresses anyway: Content-Length is the size of the transfer, not of the data
+            logging.debug(f"{self.url} is served with Content-Encoding {content_encoding}, size unknown")
+            return None
+
         size = self.http_headers["content-length"]
         if size:
+            import humanize
+
             binary_size = humanize.naturalsize(size, binary=True)
             # print(ct)
             return size, binary_size
         else:
             return None
 
+    def get_url(self) -> str:
+        return self.url
+
+    def get_fingerprint(self) -> str:
+        """
+        Use the HTTP validators advertised by the server. Streaming services usually don't provide any, in which
+        case we can't tell whether the data changed
+        :return:
+        """
+        return self._memoized("fingerprint", self._find_fingerprint)
+
+    def _find_fingerprint(self) -> str:
+        headers = self._get_headers()
+        validators = [headers[h] for h in ("ETag", "Last-Modified", "Content-Length") if headers[h]]
+        if not validators:
+            return None
+        return "|".join([self.url] + validators)
+
     def url_params(self):
         return urllib.parse.urlparse(self.url).query.split("&")
 
@@ -221,6 +299,9 @@ class HttpSource(AbstractSource):
         Determines if the dataset can be accessed using remote vsicurl syntax
         :return: tuple[level of confidence 0-10, comment]
         """
+        return self._memoized("remote_access", self._diagnose_remote_access)
+
+    def _diagnose_remote_access(self) -> Tuple[int, str]:
         diagnostics = []  # will contain a list of tuples[level of confidence 0-10, comment]
 
         if len(self.url_params()) > 1:
@@ -230,6 +311,9 @@ class HttpSource(AbstractSource):
         if self.get_file_extension() == ".csv":
             if self.get_charset() == "utf-8":
                 diagnostics.append((10, "The CSV dataset seems to be utf-8 encoded"))
+            elif self.config.get("transcode", True) and transcode.needs_transcoding(self.get_charset()):
+                diagnostics.append((0, f"The CSV dataset is {self.get_charset()} encoded. OGR only supports UTF-8: "
+                                       "it will be downloaded and transcoded to UTF-8"))
             else:
                 diagnostics.append((5, "Unsure: OGR will only support CSV in UTF-8 encoding. Detected "
                                        f"encoding is {self.get_charset()}"))
@@ -259,6 +343,81 @@ class HttpSource(AbstractSource):
             "(confidence level, range 0-10)\n" + "\n".join(comments)
         )
 
+    def get_access_plan(self) -> access_cost.AccessPlan:
+        """
+        Choose how the dataset is read: /vsicurl/, /vsicurl_streaming/, a download, or sample-only introspection.
+        The cost of each mode is estimated from the HEAD round trip, a small ranged read and the format, see
+        access_cost. The remote access diagnostics above tell whether OGR can read the data remotely at all
+        :return:
+        """
+        return self._memoized("access_plan", self._plan_access)
+
+    def _plan_access(self) -> access_cost.AccessPlan:
+        if self.config.get("no_vsicurl", False):
+            return access_cost.fixed_plan(access_cost.DOWNLOAD, "The no_vsicurl option is set")
+        if self.can_be_remotely_accessed()[0] == 0:
+            return access_cost.fixed_plan(access_cost.DOWNLOAD, "Remote access is not possible, see the diagnostics")
+        # Without measurements, streaming services are tried with the streaming protocol first
+        if self.is_streaming() or not self.get_data_full_size():
+            remote_modes = [access_cost.VSICURL_STREAMING, access_cost.VSICURL]
+        else:
+            remote_modes = [access_cost.VSICURL, access_cost.VSICURL_STREAMING]
+        forced = self.config.get("access_mode", None)
+        if forced == access_cost.SAMPLE and not access_cost.get_format_reads(self.get_file_extension()).sample:
+            logging.warning(f"Sample-only introspection is not possible for {self.get_file_extension()} files")
+        elif forced:
+            return access_cost.fixed_plan(
+                forced, "Set by the access_mode option", [forced] + remote_modes + [access_cost.DOWNLOAD]
+            )
+        measures = self._measure_network()
+        if measures is None:
+            return access_cost.fixed_plan(
+                remote_modes[0], "The network could not be measured", remote_modes + [access_cost.DOWNLOAD]
+            )
+        size = self.get_data_full_size()
+        plan = access_cost.plan(
+            measures, int(size[0]) if size else None, self.get_file_extension(), True, self.config
+        )
+        logging.info(f"Access mode for {self.url}: {plan.mode}. {plan.comment}")
+        return plan
+
+    def _measure_network(self) -> Optional[access_cost.NetworkMeasures]:
+        """
+        :return: the network measures, None if they could not be made
+        """
+        self._get_headers()
+        try:
+            return access_cost.measure_http(self.url, self._head_rtt)
+        except OSError as e:
+            logging.debug(f"Could not measure the network for {self.url}: {e}")
+            return None
+
+    def _get_sample_path(self) -> str:
+        """
+        Sample-only introspection: the first bytes of the dataset, up to the last complete line, in a local file
+        named like the remote one so that the layer names are the same
+        :return: local file path
+        """
+        return self._memoized("sample_path", self._download_sample)
+
+    def _download_sample(self) -> str:
+        sample_size = self.config.get("access_sample_size", None) or access_cost.default_sample_size
+        data = self._read_head(sample_size)
+        if len(data) >= sample_size and b"\n" in data:
+            data = data[:data.rindex(b"\n") + 1]
+        if not self.local_tmp_dir:
+            self.local_tmp_dir = tempfile.mkdtemp()
+        sample_path = os.path.join(self.local_tmp_dir, self._get_file_name())
+        with open(sample_path, "wb") as f:
+            f.write(data)
+        return sample_path
+
+    def _read_head(self, size: int) -> bytes:
+        """
+        :return: the first size bytes of the dataset
+        """
+        return io_utils.read_head(self.url, size)
+
     def get_local_file_source(self, use: bool = False) -> FileSource:
         """
         In some cases we won't be able to use a remote source. In those cases, we will link a FileSource Object
@@ -267,22 +426,70 @@ class HttpSource(AbstractSource):
         :return:
         """
         if not self.vrt_file_source:
-            filename = self.config.get("filename", None)
-            if filename:
-                # Add the extension if needed
-                if not os.path.splitext(filename)[1]:  # no extension
-                    filename = filename + self.get_file_extension()
-            else:
-                if not self.local_tmp_dir:
-                    self.local_tmp_dir = tempfile.mkdtemp()
-                filename = os.path.join(self.local_tmp_dir, f"{uuid4()}{self.get_file_extension()}")
-            file_path = io_utils.download_dataset(self.url, filename)
-            self.vrt_file_source = FileSource(file_path, self.config)
+            with self._lock:
+                # Downloaded once, even if several threads need it
+                if not self.vrt_file_source:
+                    self.vrt_file_source = self._download_local_file_source()
         if use:
             self.use_vrt_file_source = True
 
         return self.vrt_file_source
 
+    def _download_local_file_source(self) -> FileSource:
+        filename = self.config.get("filename", None)
+        if filename:
+            # Add the extension if needed
+            if not os.path.splitext(filename)[1]:  # no extension
+                filename = filename + self.get_file_extension()
+        else:
+            if not self.local_tmp_dir:
+                self.local_tmp_dir = tempfile.mkdtemp()
+            filename = os.path.join(self.local_tmp_dir, f"{uuid4()}{self.get_file_extension()}")
+        if self._use_vsimem():
+            data, file_path = self._download_to_buffer(self._get_vsimem_max_size(), filename)
+            if data is not None:
+                from ogr2vrt_simple.vrt_data_sources.memory_source import MemoryFileSource
+                return MemoryFileSource(self._get_file_name(), data, self.config)
+        else:
+            file_path = self._download(filename)
+        return FileSource(file_path, self.config)
+
+    def _download(self, filename: str) -> str:
+        """
+        :return: path of the downloaded file
+        """
+        return io_utils.download_dataset(self.url, filename)
+
+    def _download_to_buffer(self, max_size: int, spill_path: str) -> Tuple[bytearray, str]:
+        """
+        See io_utils.download_to_buffer
+        """
+        return io_utils.download_to_buffer(self.url, max_size, spill_path)
+
+    def _get_vsimem_max_size(self) -> int:
+        max_size = self.config.get("vsimem_max_size", None)
+        return default_vsimem_max_size if max_size is None else max_size
+
+    def _use_vsimem(self) -> bool:
+        """
+        Small datasets are downloaded in memory, unless the user asked for a file (filename config key). Archives
+        are always written to disk, their content is listed from the file
+        """
+        if self.config.get("filename", None) or self.is_archive() or not self._get_vsimem_max_size():
+            return False
+        size = self.get_data_full_size()
+        # Unknown size (streaming services): try, the download spills to disk if it's too large
+        return not size or int(size[0]) <= self._get_vsimem_max_size()
+
+    def _get_file_name(self) -> str:
+        stem = os.path.splitext(os.path.basename(urllib.parse.urlparse(self.url).path))[0]
+        return f"{stem or 'data'}{self.get_file_extension()}"
+
+    def close(self):
+        with self._lock:
+            if self.vrt_file_source:
+                self.vrt_file_source.close()
+
     def use_local_file_source(self) -> bool:
         return self.use_vrt_file_source
 
@@ -300,14 +507,20 @@ class HttpSource(AbstractSource):
             # We will have to download it for some introspection
             file_source = self.get_local_file_source()
             dataset_paths = file_source.find_paths_in_archive()
-            vsistrings = []
-            # Lookup diagnostics above. If not sure that it's impossible, then we try
-            if self.can_be_remotely_accessed()[0] > 0:
-                vsizip = ogr_utils.vsiprefix_from_archive_extension(self.get_file_extension())
-                for d in dataset_paths:
-                    vsicurl = self._check_remote_access_archive(vsizip, d)
-                    if vsicurl:
-                        vsistrings.append(vsizip + vsicurl + self.url + "/" + d)
+            # Non-UTF-8 CSV members are read from their local UTF-8 copy, see FileSource.get_member_source_path
+            remote_paths = [d for d in dataset_paths if not file_source._get_transcoded_member(d)]
+            vsistrings = [file_source.get_member_source_path(d) for d in dataset_paths if d not in remote_paths]
+            plan = self.get_access_plan()
+            vsizip = ogr_utils.vsiprefix_from_archive_extension(self.get_file_extension())
+            if plan.mode == access_cost.DOWNLOAD and plan.remote_modes and remote_paths:
+                # The VRT reads the members remotely, but they are introspected from the local copy (see _open_path)
+                vsi = f"/{plan.remote_modes[0]}/"
+                member_paths = [f"{vsizip}{vsi}{self.url}/{d}" for d in remote_paths]
+                if not self._validate_remote_path(member_paths[0]):
+                    return self.get_local_file_source(use=True).get_source_paths()
+                vsistrings = member_paths + vsistrings
+            elif plan.remote_modes and remote_paths:
+                vsistrings = self._probe_archive_members(vsizip, remote_paths) + vsistrings
             if len(vsistrings) > 0:
                 # Then some datasets are accessible through remote protocols => it works
                 return vsistrings
@@ -319,8 +532,13 @@ class HttpSource(AbstractSource):
                 return self.get_local_file_source(use=True).get_source_paths()
         else:  # not an archive
             vsi = None
-            # Lookup diagnostics above. If not sure that it's impossible, then we try
-            if self.can_be_remotely_accessed()[0] > 0:
+            plan = self.get_access_plan()
+            if plan.mode in (access_cost.SAMPLE, access_cost.DOWNLOAD) and plan.remote_modes:
+                # The VRT reads the remote data, but it is introspected from a local sample or copy (see _open_path)
+                vsi = f"/{plan.remote_modes[0]}/"
+                if not self._validate_remote_path(preprefix + vsi + self.url):
+                    vsi = None
+            elif plan.remote_modes:
                 vsi = self._check_remote_access()
             if vsi:
                 return [preprefix + vsi + self.url]
@@ -330,29 +548,147 @@ class HttpSource(AbstractSource):
                                 "have to download it first. We are giving you here a random path, please adjust")
                 return self.get_local_file_source(use=True).get_source_paths()
 
+    def collect_layers(self, path: str = None, db_friendly: bool = False) -> List[Dict]:
+        """
+        Layers of archive members also get the members charsets, see FileSource.annotate_members
+        """
+        layers_collection = super().collect_layers(path, db_friendly)
+        if path or not self.is_archive():
+            return layers_collection
+        file_source = self.get_local_file_source()
+        vsizip = ogr_utils.vsiprefix_from_archive_extension(self.get_file_extension())
+        remote_prefixes = [f"{vsizip}{protocol}{self.url}/" for protocol in ("/vsicurl/", "/vsicurl_streaming/")]
+        return file_source.annotate_members(
+            layers_collection, remote_prefixes + [file_source._get_archive_prefix()], remote_prefixes[0]
+        )
+
+    def _open_path(self, path: str) -> str:
+        """
+        Remote paths are introspected from a local sample or copy when the access plan says it is cheaper (see
+        get_access_plan). Otherwise, go through the caching proxy, if one is configured (cache_proxy config key):
+        repeated runs against the same source read the byte ranges from its disk cache instead of the network
+        """
+        if self.use_local_file_source():
+            # e.g. in-memory downloads, opened through their /vsimem/ path
+            return self.get_local_file_source()._open_path(path)
+        local_path = self._get_introspection_path(path)
+        if local_path:
+            return local_path
+        return self._get_remote_open_path(path)
+
+    def _get_remote_open_path(self, path: str) -> str:
+        """
+        :param path: remote path
+        :return: the path to open to read it over the network, through the caching proxy if one is configured
+        """
+        proxy_url = self.config.get("cache_proxy", None)
+        if not proxy_url:
+            return path
+        from ogr2vrt_simple import caching_proxy
+        return caching_proxy.rewrite_vsi_path(path, proxy_url)
+
+    def _validate_remote_path(self, path: str) -> bool:
+        """
+        In sample and download modes, the data is introspected from a local sample or copy: the remote path the VRT
+        points at is never opened. Open it once, so that the VRT does not point at a path OGR can't read (e.g. a
+        server that ignores Range requests)
+        :param path: remote vsi path of the dataset, or of an archive member
+        :return: whether OGR could open it. If not, the caller falls back on the local copy
+        """
+        def _validate() -> bool:
+            with tracing.span("validate_remote_path", path=path):
+                valid = ogr_utils.is_valid_ogr_path(self._get_remote_open_path(path))
+            if not valid:
+                logging.info(f"Could not open {path}, the VRT will point at a local copy of the data instead")
+            return valid
+
+        return self._memoized(f"remote_path_valid:{path}", _validate)
+
+    def _get_introspection_path(self, path: str) -> Optional[str]:
+        """
+        :param path: remote path of the dataset, or of an archive member
+        :return: the local path introspected in its place (sample or download access modes), None to read it remotely
+        """
+        plan = self.get_access_plan()
+        if plan.mode == access_cost.SAMPLE and path.endswith("/" + self.url):
+            return ("CSV:" if path.startswith("CSV:") else "") + self._get_sample_path()
+        if plan.mode != access_cost.DOWNLOAD:
+            return None
+        file_source = self.get_local_file_source()
+        if self.is_archive():
+            vsizip = ogr_utils.vsiprefix_from_archive_extension(self.get_file_extension())
+            for mode in plan.remote_modes:
+                prefix = f"{vsizip}/{mode}/{self.url}/"
+                if path.startswith(prefix):
+                    return file_source._open_path(file_source._get_archive_prefix() + path[len(prefix):])
+        elif path.endswith("/" + self.url):
+            return file_source._open_path(file_source.get_source_paths()[0])
+        return None
+
     def _check_remote_access(self):
+        # Each protocol check is an ogr.Open probe over the network: only run them once
+        return self._memoized("remote_protocol", self._probe_remote_access)
+
+    def _probe_remote_access(self):
+        with tracing.span("check_remote_access", url=self.url):
+            return self._check_remote_access_protocols()
+
+    def _check_remote_access_protocols(self):
         if self.is_archive():
             logging.warning("Does not support archive files. Please use check_remote_access_archive instead")
             return None
         else:
-            if self.is_streaming() or not self.get_data_full_size():
-                # We can have a go at streaming protocol
-                vsistring = "/vsicurl_streaming/" + self.url
+            # Cheapest protocol first, see get_access_plan
+            for mode in self.get_access_plan().remote_modes:
+                vsistring = f"/{mode}/" + self.url
                 if self.get_file_extension() == ".csv":
                     vsistring = "CSV:" + vsistring
-                if ogr_utils.is_valid_ogr_path(vsistring):
-                    return "/vsicurl_streaming/"
-
-            # in case it didn't work or isn't streaming protocol, we try with vsicurl classic
-            vsistring = "/vsicurl/" + self.url
-            if self.get_file_extension() == ".csv":
-                vsistring = "CSV:" + vsistring
-            if ogr_utils.is_valid_ogr_path(vsistring):
-                return "/vsicurl/"
+                if ogr_utils.is_valid_ogr_path(self._open_path(vsistring)):
+                    return f"/{mode}/"
 
             # If we reached here, none of them work
             return None
 
+    def _probe_archive_members(self, vsizip: str, dataset_paths: List[str]) -> List[str]:
+        """
+        Find the archive members that can be read remotely. Members are probed concurrently (GDAL releases the GIL
+        during I/O), on a bounded thread pool. Once a member opens with a protocol, the others are only checked for
+        existence through that same protocol, which does not open them with OGR.
+        At most max_probed_members members are probed: if none of them works, the others are assumed not to work either
+        :param vsizip: will be one of the values provided by ogr_utils.vsimappings
+        :param dataset_paths: paths to the data in the archive
+        :return: list of vsi paths of the readable members
+        """
+        workers = self.config.get("probe_workers", None) or default_probe_workers
+        max_probed = self.config.get("max_probed_members", None) or default_max_probed_members
+        # The probes need those: compute them once, before the threads start
+        self.is_streaming()
+        self.get_data_full_size()
+
+        def _probe(d: str) -> str:
+            with tracing.span("check_remote_access_archive", path=d):
+                return self._check_remote_access_archive(vsizip, d)
+
+        protocol = None
+        failed = set()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_probe, d): d for d in dataset_paths[:max_probed]}
+            for future in as_completed(futures):
+                protocol = future.result()
+                if protocol:
+                    # Don't start the remaining probes, the running ones finish on their own
+                    for f in futures:
+                        f.cancel()
+                    break
+                failed.add(futures[future])
+            if not protocol:
+                return []
+            prefix = vsizip + protocol + self.url + "/"
+            candidates = [d for d in dataset_paths if d not in failed]
+            with tracing.span("check_archive_members", count=len(candidates)):
+                exist = list(executor.map(lambda d: ogr_utils.vsi_path_exists(self._open_path(prefix + d)), candidates))
+        return [prefix + d for d, e in zip(candidates, exist) if e]
+
     def _check_remote_access_archive(self, vsizip: str, path: str):
         """
         Find with vsicurl protocol is functional if any. For archive datasets, we have to provide also the
@@ -365,64 +701,13 @@ class HttpSource(AbstractSource):
         if self.is_streaming() or not self.get_data_full_size():
             # We can have a go at streaming protocol
             vsistring = vsizip + "/vsicurl_streaming/" + self.url + "/" + path
-            if ogr_utils.is_valid_ogr_path(vsistring):
+            if ogr_utils.is_valid_ogr_path(self._open_path(vsistring)):
                 return "/vsicurl_streaming/"
 
         # in case it didn't work or isn't streaming protocol, we try with vsicurl classic
         vsistring = vsizip + "/vsicurl/" + self.url + "/" + path
-        if ogr_utils.is_valid_ogr_path(vsistring):
+        if ogr_utils.is_valid_ogr_path(self._open_path(vsistring)):
             return "/vsicurl/"
 
         # If we reached here, none of them work
         return None
-
-    def collect_layers(self, path: str = None, db_friendly: bool = False) -> List[Dict]:
-        """
-        Collect layers definition for the data pointed by path (path is a vsi-enabled OGR path).
-        If path is not provided, it will look at all the paths returned by get_source_paths
-        :param path:
-        :param db_friendly:
-        :return:
-        """
-        # If param's not set in the function, look in the global config
-        if not db_friendly:
-            db_friendly = self.config.get("db_friendly", False)
-
-        if path:
-            source_paths = [path]
-        else:
-            source_paths = self.get_source_paths()
-        layers_collection = []
-        for s in source_paths:
-            try:
-                layer = ogr_utils.collect_layers(s, db_friendly)
-                if layer:
-                    layers_collection.append({
-                        "source_path": s,
-                        "layers": layer
-                    })
-            except Exception as e:
-                if path:
-                    # path was explicitly provided => it is expected to work
-                    logging.error(f"Error trying to collect layers for path {s}")
-                else:
-                    # This is probably expected since we might encounter some false-positive files
-                    # when processing all eligible files
-                    logging.debug(f"Error trying to collect layers for path {s}")
-        return layers_collection
-
-    def build_vrt(self, path: str = None, db_friendly: bool = False) -> str:
-        """
-        Build the VRT file for the data pointed by path.
-        If path is not provided, it will look at all the paths returned by get_source_paths
-        :param path:
-        :param db_friendly:
-        :return:
-        """
-        # If param's not set in the function, look in the global config
-        if not db_friendly:
-            db_friendly = self.config.get("db_friendly", False)
-
-        layers_collection = self.collect_layers(path, db_friendly)
-        vrt_content = ogr_utils.layers2vrt(layers_collection)
-        return vrt_content
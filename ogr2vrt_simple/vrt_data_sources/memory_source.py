@@ -0,0 +1,149 @@
+"""
+In-memory file data source.
+Small remote datasets (typically CSV or XLSX API responses) that can't be read through /vsicurl/ are downloaded into
+a /vsimem/ file instead of a temporary file on disk: OGR opens the /vsimem/ path, charset detection reads the
+downloaded buffer directly.
+The buffer is copied into the /vsimem/ file and released right away, only the facts computed from it (size,
+fingerprint, charset sample) are kept. The /vsimem/ file is freed when the source is closed (close(), or use the
+source as a context manager)
+"""
+import codecs
+import hashlib
+import os
+from typing import Dict, List, Tuple
+from uuid import uuid4
+
+from ogr2vrt_simple.utils import tracing, transcode
+from ogr2vrt_simple.utils.data_structures import SourceProfile
+from ogr2vrt_simple.vrt_data_sources.abstract_source import AbstractSource
+from ogr2vrt_simple.vrt_data_sources.file_source import FileSource
+
+vsimem_root = "/vsimem/ogr2vrt_simple"
+
+
+class MemoryFileSource(FileSource):
+    # Only set during __init__: the content then lives in the /vsimem/ file
+    data: bytearray
+
+    def __init__(self, file_name: str, data: bytearray, config: dict = None, profile: SourceProfile = None):
+        """
+        :param file_name: name of the dataset file (e.g. export.csv). Used as source path in the generated VRT, since
+        the /vsimem/ file does not outlive the process
+        :param data: file content
+        :param config:
+        :param profile:
+        """
+        from osgeo import gdal
+
+        # Not FileSource.__init__: there is no file on disk to check
+        AbstractSource.__init__(self, config, profile)
+        self.file_path = f"{vsimem_root}/{uuid4()}/{file_name}"
+        self.transcoded = None
+        self.tar_extract_dir = None
+        self._size = len(data)
+        self._fingerprint = f"{file_name}|{hashlib.sha1(data).hexdigest()}"
+        self._charset_sample = self._get_charset_sample(data)
+        # The GDAL bindings copy the buffer into the /vsimem/ file: don't keep a second copy of the content
+        gdal.FileFromMemBuffer(self.file_path, data)
+        self.data = None
+        self._vsimem_paths = [self.file_path]
+
+    def _get_charset_sample(self, data: bytearray) -> bytes:
+        """
+        Head of the content, the charset is detected on it (see FileSource._detect_charset)
+        """
+        from ogr2vrt_simple.utils import archive_utils
+
+        sample_size = self.config.get("charset_sample_size", None) or archive_utils.default_sample_size
+        sample = bytes(data[:sample_size])
+        if len(sample) == sample_size and b"\n" in sample:
+            sample = sample[:sample.rindex(b"\n") + 1]
+        return sample
+
+    def close(self):
+        """
+        Free the /vsimem/ files
+        """
+        with self._lock:
+            if not self._vsimem_paths:
+                return
+            from osgeo import gdal
+
+            for path in self._vsimem_paths:
+                gdal.Unlink(path)
+            self._vsimem_paths = []
+            self._charset_sample = None
+
+    def _find_data_full_size(self) -> Tuple[int, str]:
+        import humanize
+
+        return self._size, humanize.naturalsize(self._size, binary=True)
+
+    def _find_fingerprint(self) -> str:
+        return self._fingerprint
+
+    def _detect_charset(self):
+        import charset_normalizer
+
+        with tracing.span("get_charset", path=self.file_path):
+            cn = charset_normalizer.from_bytes(self._charset_sample).best()
+        return cn.encoding if cn else None
+
+    def find_paths_in_archive(self) -> List[str]:
+        # Archives are always downloaded to disk
+        return []
+
+    def _get_path(self, file_path: str = None) -> str:
+        """
+        The generated VRT can't point to the /vsimem/ file: it points to the dataset file name instead, that the user
+        is expected to adjust (as for temporary files)
+        """
+        return os.path.basename(file_path or self.file_path)
+
+    def _open_path(self, path: str) -> str:
+        for vsimem_path in self._vsimem_paths:
+            if path == os.path.basename(vsimem_path):
+                return vsimem_path
+        return path
+
+    def _get_transcoded(self) -> Dict:
+        """
+        Same as FileSource, the UTF-8 copy being another /vsimem/ file
+        """
+        if not self.config.get("transcode", True) or self.get_file_extension().lower() != ".csv":
+            return None
+        with self._lock:
+            if self.transcoded is None:
+                encoding = self.get_charset()
+                transcoded = {}
+                if transcode.needs_transcoding(encoding):
+                    from osgeo import gdal
+
+                    path = transcode.sidecar_path(self.file_path)
+                    with tracing.span("transcode", path=self.file_path, encoding=encoding):
+                        self._transcode_vsimem(path, encoding)
+                    self._vsimem_paths.append(path)
+                    transcoded = {"path": path, "encoding": encoding}
+                self.transcoded = transcoded
+        return self.transcoded
+
+    def _transcode_vsimem(self, dest: str, encoding: str):
+        """
+        Transcode the /vsimem/ file into another /vsimem/ file, by chunks (see transcode.transcode_stream)
+        """
+        from osgeo import gdal
+
+        decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        f_in = gdal.VSIFOpenL(self.file_path, "rb")
+        f_out = gdal.VSIFOpenL(dest, "wb")
+        try:
+            while True:
+                chunk = gdal.VSIFReadL(1, transcode.chunk_size, f_in)
+                text = decoder.decode(chunk, final=not chunk).encode("utf-8")
+                if text:
+                    gdal.VSIFWriteL(text, 1, len(text), f_out)
+                if not chunk:
+                    break
+        finally:
+            gdal.VSIFCloseL(f_in)
+            gdal.VSIFCloseL(f_out)
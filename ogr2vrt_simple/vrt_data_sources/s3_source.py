@@ -0,0 +1,203 @@
+"""
+S3-compatible object store data source.
+Defined by an s3://bucket/prefix URL: a single object, or all the objects under a prefix. The objects are listed
+with ListObjectsV2 (no request per object), and read by GDAL through /vsis3/ with ranged requests: nothing is
+downloaded. The endpoint, region and anonymous access are set with the s3_endpoint, s3_region and s3_anonymous
+config keys, or the usual AWS environment variables.
+"""
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+from ogr2vrt_simple.utils import ogr_utils, s3_utils, tracing
+from ogr2vrt_simple.utils.data_structures import SourceProfile
+from ogr2vrt_simple.vrt_data_sources import archive_extension_list, common_dataset_extensions
+from ogr2vrt_simple.vrt_data_sources.abstract_source import AbstractSource
+
+# Number of objects introspected concurrently (GDAL releases the GIL during I/O)
+default_workers = 8
+# Bytes read to detect the charset of a CSV object
+sample_size = 64 * 1024
+
+
+class S3Source(AbstractSource):
+    url: str
+    type: str = "s3"
+
+    def __init__(self, url: str, config: Dict = None, profile: SourceProfile = None):
+        super().__init__(config, profile)
+        self.url = url
+        self.bucket, self.prefix = s3_utils.parse_url(url)
+        self.s3_config = s3_utils.get_config(self.config)
+        self._gdal_configured = False
+
+    def collect_information(self):
+        profile = self.get_profile()
+        can_be, comments = profile.remote_access
+        return {
+            "url": profile.url,
+            "type": profile.type,
+            "file_extension": profile.file_extension,
+            "is_archive": profile.is_archive,
+            "is_streaming": profile.is_streaming,
+            "file_size": profile.file_size,
+            "charset": profile.charset,
+            "objects": len(self.get_objects()),
+            "can_be_remotely_accessed": can_be,
+            "can_be_remotely_accessed_comments": comments,
+        }
+
+    def _build_profile(self) -> SourceProfile:
+        return SourceProfile(
+            url=self.url,
+            type=self.type,
+            file_extension=self.get_file_extension(),
+            is_archive=self.is_archive(),
+            is_streaming=False,
+            file_size=self.get_data_full_size(),
+            charset=self.get_charset(),
+            fingerprint=self.get_fingerprint(),
+            remote_access=(10, "Objects are read in place through /vsis3/, with ranged requests"),
+        )
+
+    def is_remote(self) -> bool:
+        return True
+
+    def get_objects(self) -> List[s3_utils.S3Object]:
+        """
+        The objects OGR might read: the object named by the URL if there is one, otherwise the objects under the
+        prefix with a data or archive extension. Listed once
+        :return:
+        """
+        return self._memoized("objects", self._list_objects)
+
+    def _list_objects(self) -> List[s3_utils.S3Object]:
+        max_keys = self.config.get("s3_max_keys", None) or s3_utils.default_max_keys
+        with tracing.span("s3_list", url=self.url):
+            objects = list(s3_utils.list_objects(self.bucket, self.prefix, self.s3_config, max_keys))
+        exact = [o for o in objects if o.key == self.prefix]
+        if exact:
+            return exact
+        return s3_utils.select_keys(objects, self._get_data_formats() + archive_extension_list)
+
+    def _get_data_formats(self) -> List[str]:
+        data_formats = self.config.get("data_formats", None)
+        return data_formats.split(",") if data_formats else common_dataset_extensions
+
+    def _is_single_object(self) -> bool:
+        objects = self.get_objects()
+        return len(objects) == 1 and objects[0].key == self.prefix
+
+    def get_file_extension(self) -> str:
+        """
+        Extension of the object, for single-object sources. Prefixes have none
+        """
+        return self._memoized("file_extension", self._find_file_extension)
+
+    def _find_file_extension(self) -> str:
+        if not self._is_single_object():
+            return ""
+        return _extension(self.prefix)
+
+    def is_archive(self) -> bool:
+        return self._memoized("is_archive", lambda: self.get_file_extension() in archive_extension_list)
+
+    def get_data_full_size(self) -> Tuple[int, str]:
+        """
+        Total size of the objects, from the listing
+        """
+        return self._memoized("file_size", self._find_data_full_size)
+
+    def _find_data_full_size(self) -> Tuple[int, str]:
+        import humanize
+
+        size = sum(o.size for o in self.get_objects())
+        return size, humanize.naturalsize(size, binary=True)
+
+    def get_charset(self):
+        return self._memoized("charset", self._find_charset)
+
+    def _find_charset(self):
+        import charset_normalizer
+
+        if not self._is_single_object() or self.get_file_extension() != ".csv":
+            return None
+        sample = s3_utils.read_range(self.bucket, self.prefix, self.s3_config, 0, sample_size)
+        with tracing.span("get_charset", path=self.url):
+            cn = charset_normalizer.from_bytes(sample).best()
+        return cn.encoding if cn else None
+
+    def get_url(self) -> str:
+        return self.url
+
+    def get_fingerprint(self) -> str:
+        """
+        The objects' keys, ETags and sizes, from the listing: any object added, removed or modified changes it
+        """
+        return self._memoized("fingerprint", self._find_fingerprint)
+
+    def _find_fingerprint(self) -> str:
+        objects = self.get_objects()
+        if not objects:
+            return None
+        digest = hashlib.sha1("\n".join(f"{o.key}|{o.etag}|{o.size}" for o in objects).encode("utf-8")).hexdigest()
+        return f"{self.url}|{digest}"
+
+    def get_source_paths(self) -> List[str]:
+        """
+        /vsis3/ paths of the objects. Archive members are listed by GDAL from the archive index (ranged reads)
+        :return:
+        """
+        paths = []
+        for o in self.get_objects():
+            ext = _extension(o.key)
+            if ext not in archive_extension_list:
+                paths.append(s3_utils.vsi_path(self.bucket, o.key))
+                continue
+            self._configure_gdal()
+            prefix = ogr_utils.vsiprefix_from_archive_extension(ext) + s3_utils.vsi_path(self.bucket, o.key) + "/"
+            with tracing.span("find_paths_in_archive", path=o.key):
+                members = ogr_utils.list_vsi_dir(prefix)
+            paths += [prefix + m for m in members if os.path.splitext(m)[1] in self._get_data_formats()]
+        return paths
+
+    def collect_layers(self, path: str = None, db_friendly: bool = False) -> List[Dict]:
+        """
+        Same as AbstractSource.collect_layers, the objects being introspected concurrently
+        """
+        if not db_friendly:
+            db_friendly = self.config.get("db_friendly", False)
+        self._configure_gdal()
+        if path:
+            source_paths = [path]
+        else:
+            with tracing.span("get_source_paths"):
+                source_paths = self.get_source_paths()
+        collect = self._get_layers_collector()
+        workers = self.config.get("probe_workers", None) or default_workers
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            collections = list(executor.map(
+                lambda s: self._collect_path(s, collect, db_friendly, path is not None), source_paths
+            ))
+        return [c for c in collections if c]
+
+    def _configure_gdal(self):
+        """
+        GDAL needs the same endpoint configuration to open the /vsis3/ paths, now and when reading the VRT
+        """
+        with self._lock:
+            if self._gdal_configured:
+                return
+            s3_utils.configure_gdal(self.s3_config, self.bucket)
+            options = " ".join(f"{k}={v}" for k, v in s3_utils.gdal_config_options(self.s3_config).items())
+            logging.info(f"Reading the VRT file requires these GDAL configuration options: {options}")
+            self._gdal_configured = True
+
+
+def _extension(key: str) -> str:
+    for ext in archive_extension_list:
+        if key.lower().endswith(ext):
+            return ext
+    return os.path.splitext(key)[1]
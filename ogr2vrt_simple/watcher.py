@@ -0,0 +1,253 @@
+"""
+Watch mode: keep VRT files up-to-date with their sources.
+Uses filesystem events (watchdog library, if installed) or polls the watched files otherwise. Bursts of writes are
+debounced, only the changed sources are introspected again, and the VRT files are replaced atomically.
+Sources state is kept in memory between events, so an update only costs reading the changed source's schema.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from ogr2vrt_simple.vrt_data_sources import (
+    archive_extension_list,
+    common_dataset_extensions,
+    shapefile_sidecar_extensions,
+)
+from ogr2vrt_simple.utils.transcode import sidecar_suffix
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+default_debounce = 1.0
+default_poll_interval = 2.0
+watched_extensions = common_dataset_extensions + archive_extension_list + shapefile_sidecar_extensions
+
+
+def get_extension(path: str) -> str:
+    """
+    Like os.path.splitext, but aware of double extensions like .tar.gz
+    """
+    lower = path.lower()
+    for ext in archive_extension_list:
+        if lower.endswith(ext):
+            return ext
+    return os.path.splitext(lower)[1]
+
+
+def is_candidate(path: str) -> bool:
+    """
+    Whether a file is a potential data source (or part of one)
+    """
+    name = os.path.basename(path)
+    # Hidden files, office lock and temp files
+    if name.startswith((".", "~$")):
+        return False
+    # UTF-8 copies of CSV sources written beside them (see transcode.sidecar_path), and their records
+    if name.lower().endswith((sidecar_suffix + ".csv", sidecar_suffix + ".csv.json")):
+        return False
+    return get_extension(path) in watched_extensions
+
+
+def source_for_path(path: str) -> str:
+    """
+    Map a changed file to the data source it belongs to: a change in a shapefile sidecar is a change of the .shp
+    """
+    ext = get_extension(path)
+    if ext in shapefile_sidecar_extensions:
+        return path[: -len(ext)] + ".shp"
+    return path
+
+
+def scan(paths: Iterable[str]) -> Dict[str, Tuple[int, int]]:
+    """
+    List the candidate files in paths (files or directory trees)
+    :return: dict {file path: (size, modification time in ns)}
+    """
+    snapshot = {}
+    for p in paths:
+        if os.path.isfile(p):
+            files = [p]
+        else:
+            files = (os.path.join(root, f) for root, _, names in os.walk(p) for f in names)
+        for f in files:
+            if not is_candidate(f):
+                continue
+            try:
+                stat = os.stat(f)
+            except FileNotFoundError:
+                continue
+            snapshot[os.path.abspath(f)] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+
+def diff_snapshots(before: Dict, after: Dict) -> List[str]:
+    """
+    :return: the files that were created, modified or deleted between the 2 snapshots
+    """
+    changed = [p for p, state in after.items() if before.get(p, None) != state]
+    deleted = [p for p in before.keys() if p not in after]
+    return changed + deleted
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, events: queue.Queue):
+        super().__init__()
+        self.events = events
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        for p in (getattr(event, "src_path", None), getattr(event, "dest_path", None)):
+            if p and is_candidate(p):
+                self.events.put(os.path.abspath(p))
+
+
+class VrtWatcher:
+    """
+    Watch files and directory trees, regenerate the VRT files when their source changes
+    """
+
+    def __init__(
+            self,
+            paths: List[str],
+            config: Dict = None,
+            out_dir: str = None,
+            debounce: float = default_debounce,
+            poll_interval: float = default_poll_interval,
+            use_polling: bool = False,
+    ):
+        """
+        :param paths: files and/or folders to watch
+        :param config: source config, see FileSource
+        :param out_dir: where to write the VRT files. Default: next to their source
+        :param debounce: seconds without new event on a source before processing it
+        :param poll_interval: seconds between 2 scans, when polling
+        :param use_polling: force polling, even if the watchdog library is available
+        """
+        self.paths = [os.path.abspath(p) for p in paths]
+        self.config = config or {}
+        self.out_dir = out_dir
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.use_polling = use_polling or Observer is None
+        # source path -> (fingerprint, layers collection) of the last processed version
+        self.state: Dict[str, Tuple[str, List]] = {}
+        self._events = queue.Queue()
+        self._stop = threading.Event()
+
+    def vrt_path(self, source_path: str) -> str:
+        ext = get_extension(source_path)
+        stem = os.path.basename(source_path)[: -len(ext)] if ext else os.path.basename(source_path)
+        folder = self.out_dir or os.path.dirname(source_path)
+        return os.path.join(folder, stem + ".vrt")
+
+    def process(self, source_path: str) -> Optional[str]:
+        """
+        Introspect a source again and rewrite its VRT file, if the source changed since last time
+        :return: the VRT file path if it was written, None otherwise
+        """
+        from ogr2vrt_simple.vrt_data_sources.file_source import FileSource
+
+        if not os.path.exists(source_path):
+            if self.state.pop(source_path, None) is not None:
+                logging.warning(f"{source_path} was removed, {self.vrt_path(source_path)} is now stale")
+            return None
+        try:
+            src = FileSource(source_path, self.config)
+            fingerprint = src.get_fingerprint()
+            if source_path in self.state and self.state[source_path][0] == fingerprint:
+                return None
+            layers_collection = src.collect_layers()
+            vrt_xml = src.render_vrt(layers_collection) if layers_collection else None
+        except Exception as e:
+            # Files are often caught in the middle of a write, next event will get them right
+            logging.warning(f"Could not introspect {source_path}: {e}")
+            return None
+        if not vrt_xml:
+            logging.warning(f"No layer found in {source_path}")
+            return None
+        vrt_path = self.vrt_path(source_path)
+        write_atomically(vrt_path, vrt_xml)
+        self.state[source_path] = (fingerprint, layers_collection)
+        logging.info(f"VRT file written to {vrt_path}")
+        return vrt_path
+
+    def initial_run(self):
+        """
+        Generate the VRT files that are missing or older than their source
+        """
+        sources = {source_for_path(p) for p in scan(self.paths).keys()}
+        for s in sorted(sources):
+            vrt_path = self.vrt_path(s)
+            if not os.path.exists(vrt_path) or os.path.getmtime(vrt_path) < os.path.getmtime(s):
+                self.process(s)
+
+    def run(self):
+        """
+        Watch until stop() is called
+        """
+        observer = None
+        if self.use_polling:
+            poller = threading.Thread(target=self._poll, daemon=True)
+            poller.start()
+            logging.info(f"Polling {', '.join(self.paths)} every {self.poll_interval}s")
+        else:
+            observer = Observer()
+            handler = _EventHandler(self._events)
+            for p in self.paths:
+                watched = p if os.path.isdir(p) else os.path.dirname(p)
+                observer.schedule(handler, watched, recursive=os.path.isdir(p))
+            observer.start()
+            logging.info(f"Watching {', '.join(self.paths)}")
+        try:
+            self._debounce_loop()
+        finally:
+            if observer:
+                observer.stop()
+                observer.join()
+
+    def stop(self):
+        self._stop.set()
+
+    def _poll(self):
+        snapshot = scan(self.paths)
+        while not self._stop.wait(self.poll_interval):
+            new_snapshot = scan(self.paths)
+            for p in diff_snapshots(snapshot, new_snapshot):
+                self._events.put(p)
+            snapshot = new_snapshot
+
+    def _is_watched(self, path: str) -> bool:
+        return any(path == p or path.startswith(p + os.sep) for p in self.paths)
+
+    def _debounce_loop(self):
+        pending: Dict[str, float] = {}  # source path -> time of the last event
+        while not self._stop.is_set():
+            try:
+                path = self._events.get(timeout=min(self.debounce, 0.2))
+                source_path = source_for_path(path)
+                if self._is_watched(source_path):
+                    pending[source_path] = time.monotonic()
+            except queue.Empty:
+                pass
+            now = time.monotonic()
+            for source_path in [s for s, t in pending.items() if now - t >= self.debounce]:
+                del pending[source_path]
+                self.process(source_path)
+
+
+def write_atomically(path: str, content: str):
+    """
+    Write to a temporary file in the same folder, then rename it: readers never see a partial file
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
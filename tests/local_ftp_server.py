@@ -0,0 +1,251 @@
+"""
+Local FTP server fixture, to test FtpSource without depending on remote servers.
+Serves files from a folder (passive mode, binary transfers), with configurable support for SIZE, MDTM, MLSD and REST,
+and records the commands it received and the control connections it accepted.
+
+Usage:
+    with LocalFtpServer("../sample_data", size_supported=False) as server:
+        src = FtpSource(server.url("conso-ener.csv"))
+        ...
+        server.command_count("RETR")
+"""
+import os
+import socket
+import socketserver
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+
+@dataclass
+class FtpBehavior:
+    size_supported: bool = True
+    mdtm_supported: bool = True
+    mlsd_supported: bool = True
+    rest_supported: bool = True
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.server.connection_opened()
+        self.rest = 0
+        self.cwd = "/"
+        self.data_listener: Optional[socket.socket] = None
+        self._reply("220 Local FTP fixture")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            command, _, arg = line.decode("utf-8").strip().partition(" ")
+            command = command.upper()
+            self.server.record(command, arg)
+            handler = getattr(self, f"ftp_{command.lower()}", None)
+            if handler is None:
+                self._reply("502 Command not implemented")
+            elif handler(arg) is False:
+                break
+
+    def _reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode("utf-8"))
+
+    def _resolve(self, path: str) -> Optional[str]:
+        path = path if path.startswith("/") else f"{self.cwd.rstrip('/')}/{path}"
+        file_path = os.path.abspath(os.path.join(self.server.root_dir, path.lstrip("/")))
+        if not file_path.startswith(self.server.root_dir) or not os.path.exists(file_path):
+            return None
+        return file_path
+
+    def _accept_data(self) -> socket.socket:
+        conn, _ = self.data_listener.accept()
+        self.data_listener.close()
+        self.data_listener = None
+        return conn
+
+    def ftp_user(self, arg):
+        self._reply("331 Password required")
+
+    def ftp_pass(self, arg):
+        self._reply("230 Logged in")
+
+    def ftp_type(self, arg):
+        self._reply("200 Type set")
+
+    def ftp_pwd(self, arg):
+        self._reply(f'257 "{self.cwd}"')
+
+    def ftp_cwd(self, arg):
+        folder = self._resolve(arg)
+        if folder is None or not os.path.isdir(folder):
+            self._reply("550 Folder not found")
+            return
+        self.cwd = "/" + os.path.relpath(folder, self.server.root_dir).replace(os.sep, "/").lstrip(".")
+        self._reply("250 OK")
+
+    def ftp_abor(self, arg):
+        self._reply("226 Abort successful")
+
+    def ftp_noop(self, arg):
+        self._reply("200 OK")
+
+    def ftp_quit(self, arg):
+        self._reply("221 Bye")
+        return False
+
+    def ftp_pasv(self, arg):
+        self.data_listener = socket.socket()
+        self.data_listener.bind(("127.0.0.1", 0))
+        self.data_listener.listen(1)
+        port = self.data_listener.getsockname()[1]
+        self._reply(f"227 Entering Passive Mode (127,0,0,1,{port >> 8},{port & 0xff})")
+
+    def ftp_size(self, arg):
+        file_path = self._resolve(arg)
+        if not self.server.behavior.size_supported:
+            self._reply("502 Command not implemented")
+        elif file_path is None or not os.path.isfile(file_path):
+            self._reply("550 File not found")
+        else:
+            self._reply(f"213 {os.path.getsize(file_path)}")
+
+    def ftp_mdtm(self, arg):
+        file_path = self._resolve(arg)
+        if not self.server.behavior.mdtm_supported:
+            self._reply("502 Command not implemented")
+        elif file_path is None:
+            self._reply("550 File not found")
+        else:
+            self._reply(f"213 {_modify(file_path)}")
+
+    def ftp_rest(self, arg):
+        if not self.server.behavior.rest_supported:
+            self._reply("502 Command not implemented")
+            return
+        self.rest = int(arg)
+        self._reply(f"350 Restarting at {self.rest}")
+
+    def ftp_mlsd(self, arg):
+        folder = self._resolve(arg or "/")
+        if not self.server.behavior.mlsd_supported:
+            self._reply("502 Command not implemented")
+            return
+        if folder is None or not os.path.isdir(folder):
+            self._reply("550 Folder not found")
+            return
+        self._reply("150 Listing")
+        with self._accept_data() as conn:
+            for name in sorted(os.listdir(folder)):
+                path = os.path.join(folder, name)
+                kind = "dir" if os.path.isdir(path) else "file"
+                conn.sendall(
+                    f"type={kind};size={os.path.getsize(path)};modify={_modify(path)}; {name}\r\n".encode("utf-8")
+                )
+        self._reply("226 Listing complete")
+
+    def ftp_retr(self, arg):
+        file_path = self._resolve(arg)
+        offset, self.rest = self.rest, 0
+        if file_path is None or not os.path.isfile(file_path):
+            self._reply("550 File not found")
+            return
+        self._reply("150 Opening data connection")
+        conn = self._accept_data()
+        sent = 0
+        try:
+            with open(file_path, "rb") as f:
+                f.seek(offset)
+                while True:
+                    block = f.read(16 * 1024)
+                    if not block:
+                        break
+                    conn.sendall(block)
+                    sent += len(block)
+        except (BrokenPipeError, ConnectionResetError):
+            self.server.add_bytes(sent)
+            self._reply("426 Transfer aborted")
+            return
+        finally:
+            conn.close()
+        self.server.add_bytes(sent)
+        self._reply("226 Transfer complete")
+
+
+def _modify(path: str) -> str:
+    return time.strftime("%Y%m%d%H%M%S", time.gmtime(os.path.getmtime(path)))
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, root_dir: str, behavior: FtpBehavior):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.root_dir = os.path.abspath(root_dir)
+        self.behavior = behavior
+        self.commands: List[Tuple[str, str]] = []
+        self.connections = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+
+    def connection_opened(self):
+        with self._lock:
+            self.connections += 1
+
+    def record(self, command: str, arg: str):
+        with self._lock:
+            self.commands.append((command, arg))
+
+    def add_bytes(self, n: int):
+        with self._lock:
+            self.bytes_sent += n
+
+
+class LocalFtpServer:
+    def __init__(self, root_dir: str, **behavior):
+        self.behavior = FtpBehavior(**behavior)
+        self._server = _Server(root_dir, self.behavior)
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def url(self, path: str) -> str:
+        return f"ftp://127.0.0.1:{self.port}/{path.lstrip('/')}"
+
+    def set_behavior(self, **behavior):
+        for k, v in behavior.items():
+            setattr(self.behavior, k, v)
+
+    @property
+    def connections(self) -> int:
+        return self._server.connections
+
+    @property
+    def bytes_sent(self) -> int:
+        return self._server.bytes_sent
+
+    def command_count(self, command: str) -> int:
+        with self._server._lock:
+            return len([c for c, _ in self._server.commands if c == command])
+
+    def reset_stats(self):
+        with self._server._lock:
+            self._server.commands.clear()
+            self._server.connections = 0
+            self._server.bytes_sent = 0
@@ -0,0 +1,265 @@
+"""
+Local HTTP server fixture, to test and benchmark HttpSource without depending on remote portals.
+Serves files from a folder, with configurable behavior (latency, bandwidth cap, Range support, chunked transfer,
+missing Content-Length, Content-Type and Content-Disposition variants, HEAD not allowed, compressed transfers), and
+records the requests
+it received so that tests can assert request counts and bytes transferred.
+
+Usage:
+    with LocalHttpServer("../sample_data", range_support=False) as server:
+        src = HttpSource(server.url("conso-ener.csv"))
+        ...
+        server.request_count("HEAD")
+"""
+import gzip
+import io
+import mimetypes
+import os
+import re
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import urlparse, unquote
+
+
+@dataclass
+class ServerBehavior:
+    latency: float = 0  # seconds, added before each response
+    bandwidth: Optional[int] = None  # bytes per second, None for no cap
+    range_support: bool = True
+    chunked: bool = False  # use chunked transfer encoding (streaming services)
+    content_length: bool = True  # advertise Content-Length (ignored if chunked)
+    content_type: Optional[str] = None  # None: guess from the file extension. "" to send no Content-Type at all
+    content_disposition: Optional[str] = None  # file name to advertise in a Content-Disposition header
+    head_allowed: bool = True
+    # URL path -> file path relative to the root folder, e.g. to serve a file on an extension-less, API-like URL
+    routes: Dict[str, str] = field(default_factory=dict)
+    # Content codings applied to full GET responses when the client accepts them, by order of preference:
+    # "gzip", "deflate" (zlib), "deflate-raw" (raw deflate, sent as "deflate", as some servers do)
+    content_encodings: List[str] = field(default_factory=list)
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.compress(data)
+    if encoding == "deflate":
+        return zlib.compress(data)
+    compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _accepted(accept_encoding: str) -> List[str]:
+    encodings = []
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name and params.replace(" ", "") not in ("q=0", "q=0.0"):
+            encodings.append(name.lower())
+    return encodings
+
+
+@dataclass
+class RecordedRequest:
+    method: str
+    path: str
+    headers: Dict[str, str]
+    status: int = 0
+    bytes_sent: int = 0
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, send_body: bool):
+        behavior: ServerBehavior = self.server.behavior
+        record = RecordedRequest(self.command, self.path, dict(self.headers.items()))
+        self.server.record(record)
+        if behavior.latency:
+            time.sleep(behavior.latency)
+
+        if self.command == "HEAD" and not behavior.head_allowed:
+            return self._send_status(record, 405)
+        file_path = self._resolve(behavior)
+        if file_path is None:
+            return self._send_status(record, 404)
+
+        size = os.path.getsize(file_path)
+        start, end = 0, size - 1
+        status = 200
+        range_header = self.headers.get("Range", None)
+        if range_header and behavior.range_support:
+            m = re.match(r"bytes=(\d*)-(\d*)$", range_header.strip())
+            if m:
+                if m[1]:
+                    start = int(m[1])
+                    end = min(int(m[2]), size - 1) if m[2] else size - 1
+                else:  # suffix range: last N bytes
+                    start = max(size - int(m[2]), 0)
+                if start >= size:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{size}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    record.status = 416
+                    return
+                status = 206
+        length = end - start + 1
+        data, content_encoding = None, None
+        if status == 200 and self.command == "GET":
+            accepted = _accepted(self.headers.get("Accept-Encoding", None))
+            for encoding in behavior.content_encodings:
+                if encoding.replace("-raw", "") in accepted:
+                    with open(file_path, "rb") as f:
+                        data = _compress(f.read(), encoding)
+                    content_encoding, length = encoding.replace("-raw", ""), len(data)
+                    break
+
+        self.send_response(status)
+        record.status = status
+        content_type = behavior.content_type
+        if content_type is None:
+            content_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        if behavior.content_disposition:
+            self.send_header("Content-Disposition", f'attachment; filename="{behavior.content_disposition}"')
+        if content_encoding:
+            self.send_header("Content-Encoding", content_encoding)
+        if behavior.range_support:
+            self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        if behavior.chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        elif behavior.content_length:
+            self.send_header("Content-Length", str(length))
+        else:
+            # Without length nor chunks, the end of the body is the end of the connection
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        if send_body:
+            self._send_body(record, file_path, start, length, behavior, data)
+
+    def _send_body(
+            self, record: RecordedRequest, file_path: str, start: int, length: int, behavior: ServerBehavior,
+            data: bytes = None,
+    ):
+        block_size = 16 * 1024
+        with (open(file_path, "rb") if data is None else io.BytesIO(data)) as f:
+            f.seek(start)
+            remaining = length
+            while remaining > 0:
+                block = f.read(min(block_size, remaining))
+                if not block:
+                    break
+                remaining -= len(block)
+                # Counted before the write: the client may read the last block, and the test check the stats, before
+                # this thread resumes
+                self.server.add_bytes(record, len(block))
+                try:
+                    if behavior.chunked:
+                        self.wfile.write(f"{len(block):x}\r\n".encode("ascii") + block + b"\r\n")
+                    else:
+                        self.wfile.write(block)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client got what it needed (e.g. GDAL reading a header) and closed the connection
+                    self.server.add_bytes(record, -len(block))
+                    self.close_connection = True
+                    return
+                if behavior.bandwidth:
+                    time.sleep(len(block) / behavior.bandwidth)
+            if behavior.chunked:
+                self.wfile.write(b"0\r\n\r\n")
+
+    def _send_status(self, record: RecordedRequest, status: int):
+        record.status = status
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _resolve(self, behavior: ServerBehavior) -> Optional[str]:
+        path = unquote(urlparse(self.path).path)
+        relative = behavior.routes.get(path, path).lstrip("/")
+        file_path = os.path.abspath(os.path.join(self.server.root_dir, relative))
+        if not file_path.startswith(self.server.root_dir) or not os.path.isfile(file_path):
+            return None
+        return file_path
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, root_dir: str, behavior: ServerBehavior):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.root_dir = os.path.abspath(root_dir)
+        self.behavior = behavior
+        self.requests: List[RecordedRequest] = []
+        self._lock = threading.Lock()
+
+    def record(self, request: RecordedRequest):
+        with self._lock:
+            self.requests.append(request)
+
+    def add_bytes(self, request: RecordedRequest, n: int):
+        with self._lock:
+            request.bytes_sent += n
+
+
+class LocalHttpServer:
+    def __init__(self, root_dir: str, **behavior):
+        self.behavior = ServerBehavior(**behavior)
+        self._server = _Server(root_dir, self.behavior)
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.port}/{path.lstrip('/')}"
+
+    def set_behavior(self, **behavior):
+        for k, v in behavior.items():
+            setattr(self.behavior, k, v)
+
+    @property
+    def requests(self) -> List[RecordedRequest]:
+        with self._server._lock:
+            return list(self._server.requests)
+
+    def request_count(self, method: str = None) -> int:
+        return len([r for r in self.requests if method is None or r.method == method])
+
+    def bytes_sent(self) -> int:
+        return sum(r.bytes_sent for r in self.requests)
+
+    def reset_stats(self):
+        with self._server._lock:
+            self._server.requests.clear()
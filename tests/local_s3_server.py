@@ -0,0 +1,82 @@
+"""
+Local S3-compatible server fixture, to test S3Source without depending on an object store.
+The sub-folders of the root folder are the buckets. Objects are served by the LocalHttpServer handler (Range
+support, request recording), bucket listings follow ListObjectsV2 (list-type=2, prefix, max-keys,
+continuation-token).
+
+Usage:
+    with LocalS3Server(root_dir) as server:
+        src = S3Source("s3://bucket/prefix", {"s3_endpoint": server.endpoint, "s3_anonymous": True})
+        ...
+        server.request_count("GET")
+"""
+import os
+from typing import List
+from urllib.parse import parse_qs, unquote, urlparse
+from xml.sax.saxutils import escape
+
+from local_http_server import LocalHttpServer, RecordedRequest, _Handler
+
+
+class _S3Handler(_Handler):
+    def do_GET(self):
+        u = urlparse(self.path)
+        query = parse_qs(u.query)
+        if query.get("list-type", None) == ["2"] and "/" not in unquote(u.path).strip("/"):
+            return self._list_objects(unquote(u.path).strip("/"), query)
+        self._respond(send_body=True)
+
+    def _list_objects(self, bucket: str, query: dict):
+        record = RecordedRequest(self.command, self.path, dict(self.headers.items()))
+        self.server.record(record)
+        bucket_dir = os.path.join(self.server.root_dir, bucket)
+        if not os.path.isdir(bucket_dir):
+            return self._send_status(record, 404)
+        prefix = query.get("prefix", [""])[0]
+        max_keys = int(query.get("max-keys", ["1000"])[0])
+        start = query.get("continuation-token", [""])[0]
+        keys = [k for k in _walk(bucket_dir) if k.startswith(prefix) and k > start]
+        page, truncated = keys[:max_keys], len(keys) > max_keys
+        contents = ""
+        for key in page:
+            stat = os.stat(os.path.join(bucket_dir, key))
+            contents += (
+                f"<Contents><Key>{escape(key)}</Key><Size>{stat.st_size}</Size>"
+                f"<ETag>&quot;{int(stat.st_mtime_ns):x}-{stat.st_size:x}&quot;</ETag>"
+                f"<LastModified>2023-01-01T00:00:00.000Z</LastModified></Contents>"
+            )
+        body = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+            f"<Name>{escape(bucket)}</Name><Prefix>{escape(prefix)}</Prefix><KeyCount>{len(page)}</KeyCount>"
+            f"<MaxKeys>{max_keys}</MaxKeys><IsTruncated>{str(truncated).lower()}</IsTruncated>"
+            + (f"<NextContinuationToken>{escape(page[-1])}</NextContinuationToken>" if truncated else "")
+            + contents + "</ListBucketResult>"
+        ).encode("utf-8")
+        record.status = 200
+        self.send_response(200)
+        self.send_header("Content-Type", "application/xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _walk(folder: str) -> List[str]:
+    keys = []
+    for root, _, files in os.walk(folder):
+        for name in files:
+            keys.append(os.path.relpath(os.path.join(root, name), folder).replace(os.sep, "/"))
+    return sorted(keys)
+
+
+class LocalS3Server(LocalHttpServer):
+    def __init__(self, root_dir: str, **behavior):
+        super().__init__(root_dir, **behavior)
+        self._server.RequestHandlerClass = _S3Handler
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def list_requests(self) -> List[RecordedRequest]:
+        return [r for r in self.requests if "list-type=2" in r.path]
@@ -0,0 +1,86 @@
+"""
+Access mode selection from network measures, size and format (access_cost)
+"""
+import unittest
+
+from ogr2vrt_simple.utils import access_cost
+
+MB = 1024 ** 2
+# Distant server, 10 MB/s
+slow = access_cost.NetworkMeasures(rtt=0.05, throughput=10 * MB, range_support=True)
+# Local server
+fast = access_cost.NetworkMeasures(rtt=0.0005, throughput=500 * MB, range_support=True)
+no_range = access_cost.NetworkMeasures(rtt=0.05, throughput=10 * MB, range_support=False)
+
+
+class TestAccessCost(unittest.TestCase):
+    def test_plan(self):
+        cases = [
+            # Random reads: a large GeoPackage is read in place, a small one is downloaded
+            (slow, 500 * MB, ".gpkg", access_cost.VSICURL),
+            (slow, 5 * MB, ".gpkg", access_cost.DOWNLOAD),
+            # Costs are close: remote access is preferred
+            (fast, 1 * MB, ".gpkg", access_cost.VSICURL),
+            (slow, 200 * MB, ".csv", access_cost.VSICURL),
+            # Without Range support, CSV files can still be streamed, GeoPackages have to be downloaded
+            (no_range, 200 * MB, ".csv", access_cost.VSICURL_STREAMING),
+            (no_range, 200 * MB, ".gpkg", access_cost.DOWNLOAD),
+            # Unknown size (streaming service)
+            (slow, None, ".csv", access_cost.VSICURL_STREAMING),
+            # GeoJSON is read to the end: too expensive, but it can't be sampled
+            (slow, 5000 * MB, ".geojson", access_cost.VSICURL),
+            # GeoJSONSeq can
+            (slow, 5000 * MB, ".geojsonl", access_cost.SAMPLE),
+            (slow, 5000 * MB, ".zip", access_cost.VSICURL),
+        ]
+        for measures, size, extension, expected in cases:
+            with self.subTest(measures=measures, size=size, extension=extension):
+                self.assertEqual(access_cost.plan(measures, size, extension).mode, expected)
+
+    def test_not_remote(self):
+        plan = access_cost.plan(slow, 500 * MB, ".gpkg", remote=False)
+        with self.subTest():
+            self.assertEqual(plan.mode, access_cost.DOWNLOAD)
+        with self.subTest():
+            self.assertEqual(plan.ranking, [access_cost.DOWNLOAD])
+
+    def test_config(self):
+        with self.subTest(key="max_access_cost"):
+            plan = access_cost.plan(slow, 200 * MB, ".csv", config={"max_access_cost": 0})
+            self.assertEqual((plan.mode, plan.remote_modes[0]), (access_cost.SAMPLE, access_cost.VSICURL))
+        with self.subTest(key="access_min_saving"):
+            plan = access_cost.plan(fast, 1 * MB, ".gpkg", config={"access_min_saving": 0})
+            self.assertEqual(plan.mode, access_cost.DOWNLOAD)
+
+    def test_estimates(self):
+        costs = access_cost.estimate_costs(slow, 100 * MB, access_cost.get_format_reads(".csv"))
+        with self.subTest():
+            self.assertAlmostEqual(costs[access_cost.DOWNLOAD], 0.05 + 10)
+        with self.subTest():
+            # HEAD, then the header line
+            self.assertAlmostEqual(costs[access_cost.VSICURL], 2 * 0.05 + 16 * 1024 / (10 * MB))
+        with self.subTest():
+            self.assertAlmostEqual(costs[access_cost.SAMPLE], 0.05 + 0.1)
+
+    def test_describe(self):
+        plan = access_cost.plan(slow, 100 * MB, ".gpkg")
+        description = plan.describe()
+        with self.subTest():
+            self.assertEqual(description["mode"], plan.mode)
+        with self.subTest():
+            self.assertIsNone(description["estimates"][access_cost.SAMPLE])
+        with self.subTest():
+            self.assertTrue(description["range_support"])
+
+    def test_fixed_plan(self):
+        plan = access_cost.fixed_plan(
+            access_cost.SAMPLE, "forced", [access_cost.SAMPLE, access_cost.VSICURL, access_cost.DOWNLOAD]
+        )
+        with self.subTest():
+            self.assertEqual(plan.remote_modes, [access_cost.VSICURL])
+        with self.subTest():
+            self.assertIsNone(plan.describe()["rtt"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+
+import py7zr
+import rarfile
+
+from ogr2vrt_simple.utils import archive_utils, transcode
+
+sample_data = "../sample_data"
+members = {
+    "data/conso-ener.csv": "conso-ener.csv",
+    "data/conso-ener-windows1252.csv": "conso-ener-windows1252.csv",
+}
+
+
+class TestArchiveUtils(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.archives = {
+            ".zip": os.path.join(cls.tmp_dir, "data.zip"),
+            ".tar.gz": os.path.join(cls.tmp_dir, "data.tar.gz"),
+            ".7z": os.path.join(cls.tmp_dir, "data.7z"),
+        }
+        with zipfile.ZipFile(cls.archives[".zip"], "w", zipfile.ZIP_DEFLATED) as z:
+            for member, name in members.items():
+                z.write(os.path.join(sample_data, name), member)
+        with tarfile.open(cls.archives[".tar.gz"], "w:gz") as t:
+            for member, name in members.items():
+                t.add(os.path.join(sample_data, name), member)
+        with py7zr.SevenZipFile(cls.archives[".7z"], "w") as z:
+            for member, name in members.items():
+                z.write(os.path.join(sample_data, name), member)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir)
+
+    def test_read_member_sample(self):
+        with open(os.path.join(sample_data, "conso-ener.csv"), "rb") as f:
+            content = f.read()
+        for ext, archive in self.archives.items():
+            with self.subTest(ext=ext):
+                self.assertEqual(archive_utils.read_member_sample(archive, ext, "data/conso-ener.csv", 100), content[:100])
+            with self.subTest(ext=ext, whole=True):
+                self.assertEqual(
+                    archive_utils.read_member_sample(archive, ext, "data/conso-ener.csv", len(content) * 2), content
+                )
+
+    def test_detect_members_charsets(self):
+        for ext, archive in self.archives.items():
+            with self.subTest(ext=ext):
+                charsets = archive_utils.detect_members_charsets(archive, ext, list(members) + ["missing.csv"])
+                self.assertEqual(
+                    {m: transcode.needs_transcoding(c) for m, c in charsets.items()},
+                    {"data/conso-ener.csv": False, "data/conso-ener-windows1252.csv": True, "missing.csv": False},
+                )
+
+    def test_detect_members_charsets_unreadable(self):
+        # No unrar/unar/bsdtar tool: RAR headers can be listed, members can't be read
+        member = "world/locations/locations.csv"
+        no_tool = rarfile.RarCannotExec("No working tool")
+        with mock.patch.object(rarfile.RarFile, "open", side_effect=no_tool):
+            charsets = archive_utils.detect_members_charsets(
+                os.path.join(sample_data, "locations.rar"), ".rar", [member]
+            )
+        self.assertEqual(charsets, {member: None})
+
+    def test_is_text_member(self):
+        cases = [("data/a.csv", True), ("data/A.CSV", True), ("data/a.gpkg", False)]
+        for member, expected in cases:
+            with self.subTest(member=member):
+                self.assertEqual(archive_utils.is_text_member(member), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
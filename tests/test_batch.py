@@ -0,0 +1,111 @@
+import json
+import os
+import tempfile
+import unittest
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
+from ogr2vrt_simple import batch
+
+sources = [
+    "../sample_data/conso-ener.csv",
+    "../sample_data/locations.zip",
+]
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def _write_manifest(self, name: str, content: str) -> str:
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def test_read_manifest_jsonl(self):
+        path = self._write_manifest("manifest.jsonl", "\n".join([
+            json.dumps({"source": sources[0], "db_friendly": True}),
+            "",
+            json.dumps({"source": sources[1], "data_formats": "csv"}),
+        ]))
+        entries = batch.read_manifest(path)
+        self.assertEqual(entries, [
+            {"source": sources[0], "db_friendly": True},
+            {"source": sources[1], "data_formats": "csv"},
+        ])
+
+    def test_read_manifest_csv(self):
+        path = self._write_manifest("manifest.csv", f"source,db_friendly,out_file\n{sources[0]},true,\n")
+        entries = batch.read_manifest(path)
+        self.assertEqual(entries, [{"source": sources[0], "db_friendly": True}])
+
+    def test_read_manifest_missing_source(self):
+        path = self._write_manifest("manifest.jsonl", json.dumps({"out_file": "a.vrt"}))
+        with self.assertRaises(ValueError):
+            batch.read_manifest(path)
+
+    def test_entry_config(self):
+        config = batch.entry_config({"source": sources[1], "out_file": "out/loc.vrt", "data_formats": "csv"},
+                                    {"db_friendly": True, "data_formats": "xlsx"})
+        with self.subTest():
+            self.assertEqual(config["filename"], "out/loc")
+        with self.subTest():
+            self.assertEqual(config["data_formats"], ".csv")
+        with self.subTest():
+            self.assertTrue(config["db_friendly"])
+
+    def test_default_out_file(self):
+        out = batch.default_out_file("https://example.org/data/Conso Ener.csv?x=1", "vrt", 3)
+        self.assertEqual(out, os.path.join("vrt", "conso_ener.vrt"))
+
+    def test_assign_out_files(self):
+        entries = batch.assign_out_files([
+            {"source": "/data/a/data.csv"},
+            {"source": "/data/b/data.csv"},
+            {"source": "https://example.org/1/download"},
+            {"source": "https://example.org/2/download"},
+            {"source": "/data/c/download.csv", "out_file": "vrt/download_3.vrt"},
+        ], "vrt")
+        self.assertEqual([e["out_file"] for e in entries], [
+            os.path.join("vrt", "data.vrt"),
+            os.path.join("vrt", "data_1.vrt"),
+            os.path.join("vrt", "download.vrt"),
+            # download_3.vrt is taken by the last entry
+            os.path.join("vrt", "download_4.vrt"),
+            "vrt/download_3.vrt",
+        ])
+
+    def test_run_batch(self):
+        entries = [{"source": s} for s in sources] + [{"source": "../sample_data/missing.csv"}]
+        results = list(batch.run_batch(entries, {"db_friendly": True}, self.tmp_dir, workers=2))
+        by_source = {r["source"]: r for r in results}
+        with self.subTest():
+            self.assertEqual(by_source[sources[0]]["status"], "ok")
+        with self.subTest():
+            self.assertEqual(by_source[sources[1]]["layers_count"], 1)
+        with self.subTest():
+            self.assertEqual(by_source["../sample_data/missing.csv"]["status"], "error")
+        with self.subTest():
+            self.assertTrue(os.path.exists(by_source[sources[0]]["out_file"]))
+
+    def test_run_batch_broken_pool(self):
+        def process_entry(entry, config):
+            if entry["source"] == sources[1]:
+                raise BrokenProcessPool("A process in the process pool was terminated abruptly")
+            return {"source": entry["source"], "out_file": entry["out_file"], "status": "ok"}
+
+        entries = [{"source": s} for s in sources]
+        with mock.patch.object(batch, "init_worker"), mock.patch.object(batch, "process_entry", process_entry):
+            results = list(batch.run_batch(entries, {}, self.tmp_dir, threads=True))
+        by_source = {r["source"]: r for r in results}
+        with self.subTest():
+            self.assertEqual(by_source[sources[0]]["status"], "ok")
+        with self.subTest():
+            self.assertEqual(by_source[sources[1]]["status"], "error")
+        with self.subTest():
+            self.assertTrue(by_source[sources[1]]["error"].startswith("BrokenProcessPool"))
+
+
+if __name__ == '__main__':
+    unittest.main()
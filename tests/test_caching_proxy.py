@@ -0,0 +1,163 @@
+"""
+Caching proxy tests, against the local HTTP server (see local_http_server.py)
+"""
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import urllib.request
+from unittest import mock
+
+from local_http_server import LocalHttpServer
+from ogr2vrt_simple import caching_proxy
+from ogr2vrt_simple.caching_proxy import block_size
+from ogr2vrt_simple.vrt_data_sources.http_source import HttpSource
+
+data_file = "data.bin"
+
+
+class TestCachingProxyHelpers(unittest.TestCase):
+    def test_rewrite_vsi_path(self):
+        proxy = "http://127.0.0.1:8766/"
+        cases = [
+            ("/vsicurl/https://example.org/a.csv", "/vsicurl/http://127.0.0.1:8766/https/example.org/a.csv"),
+            ("CSV:/vsicurl/http://example.org/a.csv", "CSV:/vsicurl/http://127.0.0.1:8766/http/example.org/a.csv"),
+            (
+                "/vsizip//vsicurl_streaming/https://example.org/a.zip/b/c.shp",
+                "/vsizip//vsicurl_streaming/http://127.0.0.1:8766/https/example.org/a.zip/b/c.shp",
+            ),
+            ("/tmp/a.csv", "/tmp/a.csv"),
+        ]
+        for path, expected in cases:
+            with self.subTest(path=path):
+                self.assertEqual(caching_proxy.rewrite_vsi_path(path, proxy), expected)
+
+    def test_from_proxy_path(self):
+        cases = [
+            ("/https/example.org/a.csv?x=1", "https://example.org/a.csv?x=1"),
+            ("http://example.org/a.csv", "http://example.org/a.csv"),
+            ("/_stats", None),
+        ]
+        for path, expected in cases:
+            with self.subTest(path=path):
+                self.assertEqual(caching_proxy.from_proxy_path(path), expected)
+
+    def test_parse_range(self):
+        cases = [
+            ("bytes=0-99", (0, 99)),
+            ("bytes=100-", (100, 999)),
+            ("bytes=900-2000", (900, 999)),
+            ("bytes=-10", (990, 999)),
+            ("bytes=0-1,5-6", None),
+            (None, None),
+        ]
+        for header, expected in cases:
+            with self.subTest(header=header):
+                self.assertEqual(caching_proxy.parse_range(header, 1000), expected)
+
+    def test_missing_runs(self):
+        self.assertEqual(caching_proxy.missing_runs([0, 1, 2, 5, 7, 8]), [(0, 2), (5, 5), (7, 8)])
+        self.assertEqual(caching_proxy.missing_runs([0, 1, 2, 3], max_len=3), [(0, 2), (3, 3)])
+
+
+class TestCachingProxy(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.data = os.urandom(3 * block_size + 1000)
+        with open(os.path.join(self.data_dir, data_file), "wb") as f:
+            f.write(self.data)
+        self.upstream = LocalHttpServer(self.data_dir).start()
+        self.start_proxy()
+
+    def tearDown(self):
+        self.stop_proxy()
+        self.upstream.stop()
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def start_proxy(self, **kwargs):
+        self.proxy = caching_proxy.create_proxy(port=0, cache_dir=self.cache_dir, **kwargs)
+        threading.Thread(target=self.proxy.serve_forever, daemon=True).start()
+        self.proxy_url = f"http://127.0.0.1:{self.proxy.server_address[1]}"
+
+    def stop_proxy(self):
+        self.proxy.shutdown()
+        self.proxy.server_close()
+
+    def get(self, byte_range: str = None) -> bytes:
+        url = caching_proxy.to_proxy_url(self.upstream.url(data_file), self.proxy_url)
+        headers = {"Range": byte_range} if byte_range else {}
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers)) as resp:
+            return resp.read()
+
+    def upstream_gets(self) -> int:
+        return self.upstream.request_count("GET")
+
+    def test_range_served_from_cache(self):
+        self.assertEqual(self.get("bytes=10-99"), self.data[10:100])
+        self.assertEqual(self.upstream_gets(), 1)
+        self.assertEqual(self.get("bytes=50-149"), self.data[50:150])
+        self.assertEqual(self.get("bytes=-10"), self.data[-10:])
+        # The last block was fetched for the suffix range
+        self.assertEqual(self.upstream_gets(), 2)
+
+    def test_cache_persists_across_restarts(self):
+        self.get("bytes=0-99")
+        self.stop_proxy()
+        self.start_proxy()
+        self.upstream.reset_stats()
+        self.assertEqual(self.get("bytes=0-99"), self.data[:100])
+        self.assertEqual(self.upstream.request_count(), 0)
+
+    def test_missing_blocks_coalesced(self):
+        self.assertEqual(self.get(f"bytes=100-{2 * block_size + 10}"), self.data[100:2 * block_size + 11])
+        self.assertEqual(self.upstream_gets(), 1)
+        self.assertEqual(self.get(f"bytes=0-{len(self.data) - 1}"), self.data)
+        self.assertEqual(self.upstream_gets(), 2)  # only the last block was missing
+
+    def test_large_range_fetched_by_windows(self):
+        with mock.patch.object(caching_proxy, "max_blocks_per_fetch", 2):
+            self.assertEqual(self.get(f"bytes=0-{len(self.data) - 1}"), self.data)
+        self.assertEqual(self.upstream_gets(), 2)
+
+    def test_full_get_passed_through(self):
+        self.assertEqual(self.get(), self.data)
+        with self.subTest():
+            self.assertNotIn("Range", self.upstream.requests[-1].headers)
+        with self.subTest():
+            self.assertEqual(self.proxy.cache.size, 0)
+
+    def test_revalidation(self):
+        self.stop_proxy()
+        self.start_proxy(max_age=0)
+        self.get("bytes=0-9")
+        changed = os.urandom(block_size)
+        with open(os.path.join(self.data_dir, data_file), "wb") as f:
+            f.write(changed)
+        self.assertEqual(self.get("bytes=0-9"), changed[:10])
+
+    def test_size_cap(self):
+        self.stop_proxy()
+        self.start_proxy(max_size=2 * block_size)
+        self.assertEqual(self.get(f"bytes=0-{len(self.data) - 1}"), self.data)
+        self.assertLessEqual(self.proxy.cache.size, 2 * block_size)
+
+    def test_pass_through_without_range_support(self):
+        self.upstream.set_behavior(range_support=False)
+        self.assertEqual(self.get(), self.data)
+        self.assertEqual(self.get("bytes=0-9"), self.data)  # the upstream server ignores ranges
+        self.assertEqual(os.listdir(self.cache_dir), [f for f in os.listdir(self.cache_dir) if f.endswith(".json")])
+
+    def test_http_source_open_path(self):
+        url = self.upstream.url(data_file)
+        self.assertEqual(HttpSource(url)._open_path("/vsicurl/" + url), "/vsicurl/" + url)
+        src = HttpSource(url, {"cache_proxy": self.proxy_url})
+        self.assertEqual(
+            src._open_path("/vsicurl/" + url), "/vsicurl/" + caching_proxy.to_proxy_url(url, self.proxy_url)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
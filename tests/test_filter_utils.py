@@ -0,0 +1,62 @@
+import unittest
+from types import SimpleNamespace
+
+from ogr2vrt_simple.utils import filter_utils
+from ogr2vrt_simple.utils.data_structures import FieldDefinition, GeometryFieldDefinition
+
+
+def _layer():
+    fields = [
+        FieldDefinition("code_commune", "code_commune", "String", 5),
+        FieldDefinition("code_dep", "code_dep", "String", 3),
+        FieldDefinition("Nom", "nom", "String", 0),
+        FieldDefinition("conso", "conso", "Real", 0),
+        FieldDefinition("lon", "lon", "Real", 0),
+        FieldDefinition("lat", "lat", "Real", 0),
+    ]
+    geom = GeometryFieldDefinition("geometry", "geometry", "wkbPoint", "EPSG:4326", "PointFromColumns", "lon", "lat")
+    return SimpleNamespace(layer_name="conso ener", fields_definition=fields, geometry_fields=[geom], src_sql=None)
+
+
+class TestFilterUtils(unittest.TestCase):
+    def test_parse_patterns(self):
+        self.assertEqual(filter_utils.parse_patterns(" code_*, nom ,"), ["code_*", "nom"])
+
+    def test_select_fields(self):
+        fields = _layer().fields_definition
+        with self.subTest():
+            selected = filter_utils.select_fields(fields, ["code_*", "nom"], [])
+            self.assertEqual([f.name for f in selected], ["code_commune", "code_dep", "Nom"])
+        with self.subTest():
+            selected = filter_utils.select_fields(fields, [], ["code_*", "l??"])
+            self.assertEqual([f.name for f in selected], ["Nom", "conso"])
+
+    def test_build_src_sql(self):
+        layer = _layer()
+        sql = filter_utils.build_src_sql(layer, layer.fields_definition[:1], "conso > 10")
+        self.assertEqual(sql, 'SELECT "code_commune", "lon", "lat" FROM "conso ener" WHERE conso > 10')
+
+    def test_apply_filters_unmatched_pattern(self):
+        layers_collection = [{"source_path": "conso.csv", "layers": [_layer()]}]
+        with self.assertRaises(ValueError):
+            filter_utils.apply_filters(layers_collection, {"fields_include": "code_*,cnoso"})
+
+    def test_apply_filters_projection(self):
+        layer = _layer()
+        filter_utils.apply_filters([{"source_path": "conso.csv", "layers": [layer]}], {"fields_exclude": "code_*"})
+        with self.subTest():
+            self.assertEqual([f.name for f in layer.fields_definition], ["Nom", "conso", "lon", "lat"])
+        with self.subTest():
+            self.assertIsNone(layer.src_sql)
+
+    def test_validate_where(self):
+        layer = _layer()
+        with self.subTest():
+            filter_utils.validate_where(layer, "conso > 10 AND code_dep = '59'")
+        with self.subTest():
+            with self.assertRaises(ValueError):
+                filter_utils.validate_where(layer, "cnoso > 10")
+
+
+if __name__ == '__main__':
+    unittest.main()
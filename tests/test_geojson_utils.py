@@ -0,0 +1,182 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from ogr2vrt_simple.utils import geojson_utils, ogr_utils
+
+features = [
+    {"type": "Feature", "properties": {"id": 1, "name": "a", "area": 1, "tags": [1, 2], "day": "2023-01-01"},
+     "geometry": {"type": "Polygon", "coordinates": [[[0, 0], [1, 0], [1, 1], [0, 0]]]}},
+    {"type": "Feature", "properties": {"id": 2 ** 40, "name": None, "area": 2.5, "tags": [1.5], "day": "2023-01-02",
+                                       "extra": {"nested": True}},
+     "geometry": {"type": "MultiPolygon", "coordinates": [[[[0, 0], [1, 0], [1, 1], [0, 0]]]]}},
+    {"type": "Feature", "properties": {"id": 3, "name": "c", "area": 3, "tags": [], "day": "2023-01-03T10:00:00"},
+     "geometry": None},
+]
+
+
+class TestGeojsonUtils(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.read_size = geojson_utils.read_size
+        # Small reads, so that values are cut across reads
+        geojson_utils.read_size = 7
+
+    def tearDown(self):
+        geojson_utils.read_size = self.read_size
+        shutil.rmtree(self.tmp_dir)
+
+    def _write(self, name: str, content: str) -> str:
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        return path
+
+    def _collection(self, **members) -> str:
+        return self._write("data.geojson", json.dumps(dict(type="FeatureCollection", **members, features=features)))
+
+    def test_iter_features(self):
+        header = {}
+        path = self._collection(name="parcels", crs={"type": "name", "properties": {"name": "urn:ogc:def:crs:EPSG::2154"}})
+        with self.subTest():
+            self.assertEqual(list(geojson_utils.iter_features(path, header=header)), features)
+        with self.subTest():
+            self.assertEqual((header["name"], header["sequence"]), ("parcels", False))
+        with self.subTest():
+            self.assertEqual(geojson_utils.crs_name(header["crs"]), "EPSG:2154")
+
+    def test_iter_features_sequence(self):
+        cases = [
+            ("data.geojsonl", "\n".join(json.dumps(f) for f in features) + "\n"),
+            ("data.json", "".join("\x1e" + json.dumps(f) + "\n" for f in features)),
+        ]
+        for name, content in cases:
+            with self.subTest(name=name):
+                self.assertEqual(list(geojson_utils.iter_features(self._write(name, content))), features)
+
+    def test_iter_features_strings(self):
+        # Braces, quotes and backslashes inside strings, cut across reads
+        tricky = [dict(features[0], properties={"name": 'a "}]" \\', "path": "c:\\{x}\\"})] + features
+        path = self._write("data.geojson", json.dumps({"type": "FeatureCollection", "features": tricky}))
+        self.assertEqual(list(geojson_utils.iter_features(path)), tricky)
+
+    def test_iter_features_decoded_once(self):
+        # Features spanning many reads are decoded once, not again after every read
+        decode = json.JSONDecoder.decode
+        calls = []
+
+        def _decode(decoder, s):
+            calls.append(s)
+            return decode(decoder, s)
+
+        with mock.patch.object(json.JSONDecoder, "decode", _decode):
+            list(geojson_utils.iter_features(self._collection()))
+        self.assertEqual(len(calls), len(features))
+
+    def test_feature_id_type(self):
+        def _features(*ids, properties=None):
+            return [{"type": "Feature", "id": i, "properties": properties or {}} for i in ids]
+
+        cases = [
+            (_features(1, 2), None),  # FIDs
+            (_features("a", 2), "String"),
+            (_features(-1, 2), "Integer"),
+            (_features("a", properties={"id": 1}), None),
+            (_features(None), None),
+        ]
+        for sample, expected in cases:
+            with self.subTest(ids=[f["id"] for f in sample]):
+                self.assertEqual(geojson_utils.feature_id_type(sample), expected)
+
+    def test_sample_layer_feature_id(self):
+        sample = [dict(f, id=f"parcel-{i}", properties={"name": "a"}) for i, f in enumerate(features)]
+        path = self._write("data.geojson", json.dumps({"type": "FeatureCollection", "features": sample}))
+        layer = geojson_utils.sample_layer(path)
+        self.assertEqual([(f.name, f.type) for f in layer.fields_definition], [("id", "String"), ("name", "String")])
+
+    def test_sample_features(self):
+        with self.subTest():
+            self.assertEqual(geojson_utils.sample_features(iter(range(10)), 3), [0, 1, 2])
+        reservoir = geojson_utils.sample_features(iter(range(1000)), 5, reservoir=True)
+        with self.subTest():
+            self.assertEqual(len(reservoir), 5)
+        with self.subTest():
+            self.assertEqual(reservoir, geojson_utils.sample_features(iter(range(1000)), 5, reservoir=True))
+
+    def test_merge_types(self):
+        cases = [
+            ("Integer", "Integer64", "Integer64"),
+            ("Integer", "Real", "Real"),
+            ("IntegerList", "RealList", "RealList"),
+            ("Integer", "IntegerList", "String"),
+            ("Date", "DateTime", "DateTime"),
+            ("Date", "Integer", "String"),
+            (None, "Real", "Real"),
+            ("Real", None, "Real"),
+        ]
+        for current, new, expected in cases:
+            with self.subTest(current=current, new=new):
+                self.assertEqual(geojson_utils.merge_types(current, new), expected)
+
+    def test_geometry_type(self):
+        point = {"geometry": {"type": "Point", "coordinates": [0, 0]}}
+        cases = [
+            ([point, {"geometry": None}], "wkbPoint"),
+            ([point, {"geometry": {"type": "MultiPoint", "coordinates": [[0, 0]]}}], "wkbMultiPoint"),
+            ([point, {"geometry": {"type": "LineString", "coordinates": [[0, 0], [1, 1]]}}], "wkbUnknown"),
+            ([{"geometry": {"type": "Point", "coordinates": [0, 0, 5]}}], "wkbPoint25D"),
+            ([{"geometry": None}], "wkbUnknown"),
+        ]
+        for sample, expected in cases:
+            with self.subTest(expected=expected):
+                self.assertEqual(geojson_utils.geometry_type(sample), expected)
+
+    def test_sample_layer(self):
+        layer = geojson_utils.sample_layer(self._collection(name="Parcels 2023"))
+        with self.subTest():
+            self.assertEqual(layer.layer_name, "Parcels 2023")
+        with self.subTest():
+            self.assertEqual(
+                [(f.name, f.type) for f in layer.fields_definition],
+                [("id", "Integer64"), ("name", "String"), ("area", "Real"), ("tags", "String"), ("day", "String"),
+                 ("extra", "String")],
+            )
+        with self.subTest():
+            self.assertEqual((layer.geometry_fields[0].type, layer.geometry_fields[0].srs), ("wkbMultiPolygon", "EPSG:4326"))
+        with self.subTest():
+            self.assertEqual(layer.open_options, geojson_utils.feature_collection_open_options)
+
+    def test_sample_layer_sequence(self):
+        path = self._write("data.geojsonl", "\n".join(json.dumps(f) for f in features))
+        layer = geojson_utils.sample_layer(path, sample_size=2)
+        with self.subTest():
+            self.assertEqual(
+                [(f.name, f.type) for f in layer.fields_definition],
+                [("id", "Integer64"), ("name", "String"), ("area", "Real"), ("tags", "RealList"), ("day", "Date"),
+                 ("extra", "String")],
+            )
+        with self.subTest():
+            self.assertIsNone(layer.open_options)
+
+    def test_sample_layer_errors(self):
+        cases = [
+            (self._write("feature.geojson", json.dumps(features[0])), ValueError),
+            (self._write("other.json", json.dumps({"rows": [1, 2]})), ValueError),
+            (self._collection(), geojson_utils.SampleTooLarge),
+        ]
+        for path, error in cases:
+            with self.subTest(path=os.path.basename(path)):
+                with self.assertRaises(error):
+                    geojson_utils.sample_layer(path, max_buffer=64)
+
+    def test_render_open_options(self):
+        layer = geojson_utils.sample_layer(self._collection())
+        vrt_xml = ogr_utils.layers2vrt([{"source_path": "data.geojson", "layers": [layer]}])
+        self.assertIn('<OOI key="DATE_AS_STRING">YES</OOI>', vrt_xml)
+
+
+if __name__ == "__main__":
+    unittest.main()
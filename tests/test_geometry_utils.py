@@ -0,0 +1,36 @@
+import unittest
+
+from osgeo import ogr, osr
+
+from ogr2vrt_simple.utils import geometry_utils
+
+
+class TestGeometryUtils(unittest.TestCase):
+    def test_geometry_type_name(self):
+        self.assertEqual(geometry_utils.geometry_type_name(ogr.wkbPolygon), "wkbPolygon")
+
+    def test_geometry_type_name_25d(self):
+        self.assertEqual(geometry_utils.geometry_type_name(ogr.wkbPoint25D), "wkbPoint25D")
+
+    def test_compact_srs_epsg(self):
+        srs = osr.SpatialReference()
+        srs.ImportFromEPSG(2154)
+        self.assertEqual(geometry_utils.compact_srs(srs), "EPSG:2154")
+
+    def test_compact_srs_none(self):
+        self.assertIsNone(geometry_utils.compact_srs(None))
+
+    def test_find_coordinate_columns_lonlat(self):
+        cols = geometry_utils.find_coordinate_columns(["CITY", "LAT", "LON"])
+        self.assertEqual(cols, ("LON", "LAT", "EPSG:4326"))
+
+    def test_find_coordinate_columns_xy(self):
+        cols = geometry_utils.find_coordinate_columns(["id", "X", "Y"])
+        self.assertEqual(cols, ("X", "Y", None))
+
+    def test_find_coordinate_columns_none(self):
+        self.assertIsNone(geometry_utils.find_coordinate_columns(["id", "name"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,178 @@
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+from unittest import mock
+
+from ogr2vrt_simple.utils import gzip_index
+from ogr2vrt_simple.vrt_data_sources.file_source import FileSource
+
+
+def _add_member(tar: tarfile.TarFile, name: str, content: bytes):
+    info = tarfile.TarInfo(name)
+    info.size = len(content)
+    tar.addfile(info, io.BytesIO(content))
+
+
+class TestGzipIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.archive = os.path.join(self.tmp_dir, "data.tar.gz")
+        with tarfile.open(self.archive, "w:gz") as tar:
+            _add_member(tar, "data/a.csv", b"id,name\n1,a\n")
+            _add_member(tar, "data/readme.txt", b"nothing to see\n")
+            _add_member(tar, "data/roads.shp", b"")
+            _add_member(tar, "data/roads.dbf", b"")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_extract_members(self):
+        out_dir = os.path.join(self.tmp_dir, "out")
+        members = gzip_index.extract_members(self.archive, lambda n: not n.endswith(".txt"), out_dir)
+        with self.subTest():
+            self.assertEqual(members, ["data/a.csv", "data/roads.shp", "data/roads.dbf"])
+        with self.subTest():
+            with open(os.path.join(out_dir, "data", "a.csv"), "rb") as f:
+                self.assertEqual(f.read(), b"id,name\n1,a\n")
+
+    def test_extract_members_bounded(self):
+        lines = b"id,name\n" + b"".join(f"{i},commune {i}\n".encode("utf-8") for i in range(1000))
+        with tarfile.open(self.archive, "w:gz") as tar:
+            _add_member(tar, "data/big.csv", lines)
+            _add_member(tar, "data/big.gpkg", b"\0" * 1000)
+            _add_member(tar, "data/small.gpkg", b"\0" * 10)
+        out_dir = os.path.join(self.tmp_dir, "out")
+        members = gzip_index.extract_members(
+            self.archive, lambda n: True, out_dir, lambda n: 100 if n.endswith(".csv") else None, max_size=100
+        )
+        with self.subTest():
+            self.assertEqual(members, ["data/big.csv", "data/small.gpkg"])
+        with self.subTest():
+            # Cut after the last complete line
+            with open(os.path.join(out_dir, "data", "big.csv"), "rb") as f:
+                self.assertEqual(f.read(), lines[:lines.rindex(b"\n", 0, 100) + 1])
+
+    def test_extract_members_outside(self):
+        with tarfile.open(self.archive, "w:gz") as tar:
+            _add_member(tar, "../evil.csv", b"id\n1\n")
+        out_dir = os.path.join(self.tmp_dir, "out")
+        with self.subTest():
+            self.assertEqual(gzip_index.extract_members(self.archive, lambda n: True, out_dir), [])
+        with self.subTest():
+            self.assertFalse(os.path.exists(os.path.join(self.tmp_dir, "evil.csv")))
+
+    def test_open_tar(self):
+        with gzip_index.open_tar(self.archive) as tar:
+            self.assertIn("data/a.csv", tar.getnames())
+
+    def test_has_fresh_index(self):
+        idx = gzip_index.index_path(self.archive)
+        gz = mock.Mock()
+        gz.export_index.side_effect = lambda path: open(path, "wb").write(b"index")
+        with self.subTest():
+            self.assertFalse(gzip_index.has_fresh_index(self.archive))
+        open(idx, "w").close()
+        with self.subTest(index="empty"):
+            self.assertFalse(gzip_index.has_fresh_index(self.archive))
+        gzip_index.save_index(gz, self.archive, gzip_index._archive_stamp(self.archive))
+        with self.subTest(index="saved"):
+            self.assertTrue(gzip_index.has_fresh_index(self.archive))
+        with self.subTest(index="files"):
+            # No temporary file left behind
+            name = os.path.basename(idx)
+            self.assertEqual(sorted(os.listdir(self.tmp_dir)), ["data.tar.gz", name, name + ".json"])
+        # Archive replaced by an older copy, e.g. cp -p: its mtime is older than the index
+        stat = os.stat(self.archive)
+        os.utime(self.archive, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10 ** 9))
+        with self.subTest(index="stale"):
+            self.assertFalse(gzip_index.has_fresh_index(self.archive))
+
+    def test_open_tar_corrupted_index(self):
+        gz = mock.MagicMock()
+        indexed_gzip = mock.Mock()
+        indexed_gzip.IndexedGzipFile.side_effect = [ValueError("corrupted index"), gz]
+        with mock.patch.object(gzip_index, "indexed_gzip", indexed_gzip), \
+                mock.patch.object(gzip_index, "has_fresh_index", return_value=True), \
+                mock.patch.object(gzip_index, "save_index") as save_index, \
+                mock.patch.object(tarfile, "open"):
+            with gzip_index.open_tar(self.archive):
+                pass
+        with self.subTest():
+            self.assertTrue(gz.build_full_index.called)
+        with self.subTest():
+            self.assertTrue(save_index.called)
+
+    def test_file_source_collect_bounded(self):
+        with tarfile.open(self.archive, "w:gz") as tar:
+            _add_member(tar, "data/a.csv", b"id,name\n1,a\n")
+            _add_member(tar, "data/big.gpkg", b"\0" * 1000)
+        collected = []
+
+        def collect(path, db_friendly):
+            collected.append((path, os.path.exists(path)))
+            return []
+
+        src = FileSource(self.archive, {"max_tar_extract_size": 100})
+        with mock.patch.object(FileSource, "_get_layers_collector", return_value=collect):
+            src.collect_layers()
+        with self.subTest(member="data/a.csv"):
+            self.assertEqual((os.path.basename(collected[0][0]), collected[0][1]), ("a.csv", True))
+        with self.subTest(member="data/big.gpkg"):
+            self.assertEqual(collected[1][0], "/vsitar/" + os.path.abspath(self.archive) + "/data/big.gpkg")
+
+    def test_extract_members_on_extract(self):
+        lines = b"id,name\n" + b"".join(f"{i},commune {i}\n".encode("utf-8") for i in range(1000))
+        with tarfile.open(self.archive, "w:gz") as tar:
+            _add_member(tar, "data/big.csv", lines)
+        out_dir = os.path.join(self.tmp_dir, "out")
+        contents = {}
+
+        def on_extract(name, path, member):
+            contents[name] = member.read()
+
+        gzip_index.extract_members(self.archive, lambda n: True, out_dir, lambda n: 100, on_extract=on_extract)
+        # The whole member, though only its head was extracted
+        self.assertEqual(contents, {"data/big.csv": lines})
+
+    def test_file_source_single_pass(self):
+        content = "id,nom\n1,Orléans\n2,Besançon\n".encode("cp1252") * 50
+        with tarfile.open(self.archive, "w:gz") as tar:
+            _add_member(tar, "data/communes.csv", content)
+            _add_member(tar, "data/a.csv", b"id,name\n1,a\n")
+        src = FileSource(self.archive, {"transcode_dir": self.tmp_dir})
+        with mock.patch.object(gzip_index, "open_tar", wraps=gzip_index.open_tar) as open_tar, \
+                mock.patch.object(gzip_index, "extract_members", wraps=gzip_index.extract_members) as extract:
+            paths = src.get_source_paths()
+            charsets = src.get_members_charsets()
+        with self.subTest():
+            self.assertEqual(extract.call_count, 1)
+        with self.subTest():
+            # Opened by extract_members only, when indexed_gzip is installed
+            self.assertLessEqual(open_tar.call_count, 1)
+        with self.subTest():
+            self.assertEqual(charsets["data/a.csv"], "ascii")
+        with self.subTest():
+            with open(paths[0], encoding="utf-8") as f:
+                self.assertEqual(f.read(), content.decode("cp1252"))
+        with self.subTest():
+            self.assertTrue(os.path.exists(os.path.join(src._get_tar_scan()["dir"], "data", "a.csv")))
+        src.close()
+        with self.subTest():
+            self.assertIsNone(src.tar_extract_dir)
+
+    def test_file_source_extension(self):
+        src = FileSource(self.archive)
+        with self.subTest():
+            self.assertEqual(src.get_file_extension(), ".tar.gz")
+        with self.subTest():
+            self.assertTrue(src.is_archive())
+        with self.subTest():
+            p = os.path.abspath(self.archive)
+            self.assertEqual(src.get_source_paths(), ["/vsitar/" + p + "/data/a.csv", "/vsitar/" + p + "/data/roads.shp"])
+
+
+if __name__ == '__main__':
+    unittest.main()
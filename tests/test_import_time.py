@@ -0,0 +1,62 @@
+"""
+Import-time regression tests, based on python -X importtime.
+Budgets are in milliseconds. They are deliberately loose, to absorb machine variance, but way below what importing
+GDAL (osgeo) costs: going over them means a heavy dependency leaked into the startup path
+"""
+import os
+import subprocess
+import sys
+import unittest
+
+library_import_budget_ms = 100
+cli_help_budget_ms = 250
+heavy_modules = ["osgeo", "jinja2", "charset_normalizer", "humanize", "py7zr", "rarfile"]
+
+package_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def run_importtime(args: list) -> dict:
+    """
+    Run python -X importtime with args
+    :param args: arguments passed to python after -X importtime
+    :return: dict {top-level module name: cumulative import time in microseconds}
+    """
+    env = dict(os.environ, PYTHONPATH=package_dir)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime"] + args,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    timings = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not name.startswith("  "):  # top-level imports only, nested ones are included in their parent's time
+            timings[name.strip()] = int(cumulative)
+    return timings
+
+
+class TestImportTime(unittest.TestCase):
+    def test_library_import(self):
+        timings = run_importtime(["-c", "import ogr2vrt_simple"])
+        self.assertLess(timings["ogr2vrt_simple"] / 1000, library_import_budget_ms)
+
+    def test_library_import_is_lazy(self):
+        timings = run_importtime(["-c", "import ogr2vrt_simple"])
+        self.assertFalse([m for m in timings if m.split(".")[0] in heavy_modules])
+
+    def test_cli_help(self):
+        timings = run_importtime(["-m", "ogr2vrt_simple.cli", "--help"])
+        total_ms = sum(timings.values()) / 1000
+        self.assertLess(total_ms, cli_help_budget_ms)
+
+    def test_cli_help_does_not_load_heavy_modules(self):
+        timings = run_importtime(["-m", "ogr2vrt_simple.cli", "generate-vrt", "--help"])
+        self.assertFalse([m for m in timings if m.split(".")[0] in heavy_modules])
+
+
+if __name__ == '__main__':
+    unittest.main()
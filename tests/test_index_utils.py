@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from ogr2vrt_simple.utils import index_utils
+
+sources = [
+    "../sample_data/conso-ener.csv",
+    "../sample_data/poly.zip",
+]
+
+
+class TestIndexUtils(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_is_indexable(self):
+        with self.subTest():
+            self.assertFalse(index_utils.is_indexable("/vsizip/" + os.path.abspath(sources[1]) + "/poly.shp"))
+        with self.subTest():
+            self.assertFalse(index_utils.is_indexable("CSV:/vsicurl/https://example.com/data"))
+        path = os.path.join(self.tmp_dir, "conso.csv")
+        shutil.copy(sources[0], path)
+        with self.subTest():
+            self.assertTrue(index_utils.is_indexable(path))
+        os.chmod(path, 0o444)
+        if os.access(path, os.W_OK):
+            self.skipTest("running as root, files are always writable")
+        with self.subTest():
+            self.assertFalse(index_utils.is_indexable(path))
+
+    def test_ensure_indexes_gpkg(self):
+        from osgeo import ogr, osr
+        from ogr2vrt_simple.utils import ogr_utils
+
+        path = os.path.join(self.tmp_dir, "points.gpkg")
+        srs = osr.SpatialReference()
+        srs.ImportFromEPSG(4326)
+        ds = ogr.GetDriverByName("GPKG").CreateDataSource(path)
+        layer = ds.CreateLayer("points", srs, ogr.wkbPoint, ["SPATIAL_INDEX=NO"])
+        layer.CreateField(ogr.FieldDefn("code", ogr.OFTString))
+        ds = None
+
+        layers_collection = [{"source_path": path, "layers": ogr_utils.collect_layers(path)}]
+        report = index_utils.ensure_indexes(layers_collection, ["code", "missing"])
+        with self.subTest():
+            self.assertEqual(report[0]["spatial_index"], "created")
+        with self.subTest():
+            self.assertEqual(report[0]["attribute_indexes"], ["code"])
+        report = index_utils.ensure_indexes(layers_collection, ["code"])
+        with self.subTest():
+            self.assertEqual(report[0]["spatial_index"], "exists")
+        with self.subTest():
+            # Already indexed
+            self.assertEqual(report[0]["attribute_indexes"], [])
+
+    def test_shapefile_indexed_fields(self):
+        stem = os.path.join(self.tmp_dir, "poly")
+        open(stem + ".ind", "wb").close()
+        with open(stem + ".idm", "w") as f:
+            f.write("<OGRMILayerAttrIndex><MIIDFilename>poly.ind</MIIDFilename><OGRMIAttrIndex>"
+                    "<FieldIndex>0</FieldIndex><FieldName>AREA</FieldName><IndexIndex>1</IndexIndex>"
+                    "</OGRMIAttrIndex></OGRMILayerAttrIndex>")
+        ds = mock.Mock(**{"GetDescription.return_value": stem + ".shp"})
+        self.assertEqual(index_utils._shapefile_indexed_fields(ds, "poly"), ["area"])
+
+    def test_quote(self):
+        with self.subTest():
+            self.assertEqual(index_utils._quote_identifier('my "layer"'), '"my ""layer"""')
+        with self.subTest():
+            self.assertEqual(index_utils._quote_identifier('my "layer"', ogr_sql=True), '"my \\"layer\\""')
+        with self.subTest():
+            self.assertEqual(index_utils._quote_literal("l'eau"), "'l''eau'")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+"""
+Streaming decompression of HTTP responses (io_utils.DecodingReader), with in-memory responses
+"""
+import gzip
+import io
+import unittest
+import zlib
+
+from ogr2vrt_simple.utils import io_utils
+
+
+class _Response(io.BytesIO):
+    def __init__(self, body: bytes, content_encoding: str = None, url: str = None, content_type: str = None):
+        super().__init__(body)
+        self.url = url
+        self.headers = {"Content-Encoding": content_encoding} if content_encoding else {}
+        if content_type:
+            self.headers["Content-Type"] = content_type
+
+
+def _raw_deflate(data: bytes) -> bytes:
+    compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class TestDecodingReader(unittest.TestCase):
+    content = b"".join(f"{i};commune {i};{i * 1.5}\n".encode("utf-8") for i in range(50000))
+
+    def test_decode(self):
+        bodies = {
+            None: self.content,
+            "identity": self.content,
+            "gzip": gzip.compress(self.content),
+            "deflate": zlib.compress(self.content),
+            "deflate-raw": _raw_deflate(self.content),
+            "gzip-multi": gzip.compress(self.content[:1000]) + gzip.compress(self.content[1000:]),
+        }
+        for name, body in bodies.items():
+            with self.subTest(encoding=name):
+                content_encoding = name.split("-")[0] if name else None
+                reader = io_utils.DecodingReader(_Response(body, content_encoding))
+                chunks = iter(lambda: reader.read(1000), b"")
+                self.assertEqual(b"".join(chunks), self.content)
+                self.assertEqual((reader.bytes_received, reader.bytes_decoded), (len(body), len(self.content)))
+
+    def test_read_all(self):
+        reader = io_utils.DecodingReader(_Response(gzip.compress(self.content), "gzip"))
+        self.assertEqual(reader.read(), self.content)
+
+    def test_unsupported_encoding(self):
+        reader = io_utils.DecodingReader(_Response(self.content, "compress"))
+        with self.subTest():
+            self.assertFalse(reader.is_compressed)
+        with self.subTest():
+            self.assertEqual(reader.read(), self.content)
+
+    def test_gzip_file(self):
+        body = gzip.compress(self.content)
+        responses = {
+            "url": _Response(body, "gzip", url="https://example.com/data/export.tar.gz?version=2"),
+            "content_type": _Response(
+                body, "gzip", url="https://example.com/download", content_type="application/gzip"
+            ),
+        }
+        for name, response in responses.items():
+            with self.subTest(detected_from=name):
+                self.assertEqual(io_utils.DecodingReader(response).read(), body)
+        with self.subTest(detected_from=None):
+            response = _Response(body, "gzip", url="https://example.com/data.csv", content_type="text/csv")
+            self.assertEqual(io_utils.DecodingReader(response).read(), self.content)
+
+    def test_accepted_encodings(self):
+        encodings = io_utils.accepted_encodings()
+        with self.subTest():
+            self.assertEqual(encodings[-2:], ["gzip", "deflate"])
+        with self.subTest():
+            self.assertEqual("br" in encodings, io_utils._import_brotli() is not None)
+
+
+if __name__ == "__main__":
+    unittest.main()
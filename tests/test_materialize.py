@@ -0,0 +1,98 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from ogr2vrt_simple.utils import materialize, ogr_utils
+
+sources = [
+    "../sample_data/conso-ener.csv",
+]
+
+
+class TestMaterialize(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.source = os.path.abspath(sources[0])
+        self.layers_collection = [{"source_path": self.source, "layers": ogr_utils.collect_layers(self.source)}]
+        self.config = {"materialize": "gpkg", "materialize_dir": self.tmp_dir}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_materialize_layers(self):
+        collection = materialize.materialize_layers(self.layers_collection, "fingerprint", self.config)
+        with self.subTest():
+            self.assertEqual(collection[0]["source_path"], os.path.join(self.tmp_dir, "conso_ener.gpkg"))
+        with open(os.path.join(self.tmp_dir, materialize.manifest_filename)) as f:
+            manifest = json.load(f)
+        with self.subTest():
+            self.assertEqual(list(manifest.keys()), ["conso_ener.gpkg"])
+
+    def test_skip_up_to_date(self):
+        materialize.materialize_layers(self.layers_collection, "fingerprint", self.config)
+        with mock.patch.object(materialize, "_convert_layer") as convert:
+            collection = materialize.materialize_layers(self.layers_collection, "fingerprint", self.config)
+        with self.subTest():
+            convert.assert_not_called()
+        with self.subTest():
+            self.assertEqual(collection[0]["source_path"], os.path.join(self.tmp_dir, "conso_ener.gpkg"))
+        with mock.patch.object(materialize, "_convert_layer", return_value=True) as convert:
+            materialize.materialize_layers(self.layers_collection, "changed", self.config)
+        with self.subTest():
+            convert.assert_called_once()
+
+    def test_conversion_failure(self):
+        with mock.patch.object(materialize.gdal, "VectorTranslate", return_value=None):
+            collection = materialize.materialize_layers(self.layers_collection, "fingerprint", self.config)
+        # Falls back on the original data
+        self.assertEqual(collection[0]["source_path"], self.source)
+
+    def test_cleanup_failure(self):
+        materialize.materialize_layers(self.layers_collection, "fingerprint", self.config)
+        with mock.patch.object(materialize.os, "remove", side_effect=PermissionError("file is locked")):
+            collection = materialize.materialize_layers(self.layers_collection, "changed", self.config)
+        self.assertEqual(collection[0]["source_path"], self.source)
+
+    def test_materialize_layers_per_source(self):
+        # Two sources with a layer of the same name don't overwrite each other's files
+        other = os.path.join(self.tmp_dir, "other", "conso-ener.csv")
+        os.makedirs(os.path.dirname(other))
+        shutil.copy(self.source, other)
+        other_collection = [{"source_path": other, "layers": ogr_utils.collect_layers(other)}]
+        out_dir = os.path.join(self.tmp_dir, "out")
+        config = dict(self.config, materialize_dir=out_dir)
+        paths = [
+            materialize.materialize_layers(collection, "fingerprint", config, source)[0]["source_path"]
+            for source, collection in [(self.source, self.layers_collection), (other, other_collection)]
+        ]
+        with self.subTest():
+            self.assertNotEqual(paths[0], paths[1])
+        with self.subTest():
+            self.assertEqual(os.path.dirname(paths[0]), os.path.join(out_dir, materialize.source_dir_name(self.source)))
+        with self.subTest():
+            self.assertEqual(len(os.listdir(out_dir)), 2)
+
+    def test_source_dir_name(self):
+        with self.subTest():
+            name = materialize.source_dir_name("https://example.com/conso-ener.csv?v=1")
+            self.assertTrue(name.startswith("conso_ener_"))
+        with self.subTest():
+            self.assertNotEqual(materialize.source_dir_name("/a/data.csv"), materialize.source_dir_name("/b/data.csv"))
+
+    def test_get_materialize_format(self):
+        get_driver = materialize.ogr.GetDriverByName
+        with self.subTest(name="unknown"):
+            self.assertEqual(materialize.get_materialize_format("shp")[0], "GPKG")
+        with mock.patch.object(materialize.ogr, "GetDriverByName",
+                               side_effect=lambda name: None if name == "Parquet" else get_driver(name)):
+            with self.subTest(name="parquet"):
+                self.assertEqual(materialize.get_materialize_format("parquet")[0], "GPKG")
+            with self.subTest(name="fgb"):
+                self.assertEqual(materialize.get_materialize_format("FGB")[0], "FlatGeobuf")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import threading
+import unittest
+
+from ogr2vrt_simple import server
+
+sources = [
+    "../sample_data/conso-ener.csv",
+]
+
+
+class TestResultCache(unittest.TestCase):
+    def test_get_same_fingerprint(self):
+        cache = server.ResultCache()
+        cache.put("key", "fp1", {"vrt": "<xml/>"})
+        self.assertEqual(cache.get("key", "fp1"), {"vrt": "<xml/>"})
+
+    def test_get_changed_fingerprint(self):
+        cache = server.ResultCache()
+        cache.put("key", "fp1", {"vrt": "<xml/>"})
+        self.assertIsNone(cache.get("key", "fp2"))
+
+    def test_no_fingerprint_no_cache(self):
+        cache = server.ResultCache()
+        cache.put("key", None, {"vrt": "<xml/>"})
+        self.assertIsNone(cache.get("key", None))
+
+    def test_max_size(self):
+        cache = server.ResultCache(max_size=2)
+        for i in range(3):
+            cache.put(f"key{i}", "fp", {"i": i})
+        self.assertIsNone(cache.get("key0", "fp"))
+        self.assertEqual(cache.get("key2", "fp"), {"i": 2})
+
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        self.httpd = server.create_server(port=0, workers=2)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def test_request_vrt(self):
+        status, response = server.request_vrt(self.url, os.path.abspath(sources[0]))
+        with self.subTest():
+            self.assertEqual(status, 200)
+        with self.subTest():
+            self.assertIn("<OGRVRTLayer", response["vrt"])
+        with self.subTest():
+            self.assertEqual(response["information"]["file_extension"], ".csv")
+
+    def test_request_vrt_not_found(self):
+        status, response = server.request_vrt(self.url, "/does/not/exist.csv")
+        self.assertEqual(status, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
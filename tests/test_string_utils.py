@@ -1,6 +1,6 @@
 import unittest
 
-from ogr2vrt_simple.utils.string_utils import db_friendly_name
+from ogr2vrt_simple.utils.string_utils import db_friendly_name, add_dots
 
 
 class TestDbFriendly(unittest.TestCase):
@@ -22,5 +22,16 @@ class TestDbFriendly(unittest.TestCase):
         self.assertEqual(s, "_2023")
 
 
+class TestAddDots(unittest.TestCase):
+    def test_add_dots(self):
+        self.assertEqual(add_dots("csv,xlsx"), ".csv,.xlsx")
+
+    def test_keep_existing_dots(self):
+        self.assertEqual(add_dots(".csv,xlsx"), ".csv,.xlsx")
+
+    def test_empty(self):
+        self.assertEqual(add_dots(None), "")
+
+
 if __name__ == '__main__':
     unittest.main()
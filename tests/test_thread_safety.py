@@ -0,0 +1,102 @@
+"""
+Source objects used concurrently, within one process: many sources on a thread pool, and single sources shared by
+many threads
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from local_http_server import LocalHttpServer
+from ogr2vrt_simple.utils import transcode
+from ogr2vrt_simple.vrt_data_sources.file_source import FileSource
+from ogr2vrt_simple.vrt_data_sources.http_source import HttpSource
+
+sample_data = "../sample_data"
+csv_file = "conso-ener.csv"
+cp1252_file = "conso-ener-windows1252.csv"
+sources_count = 300
+workers = 32
+
+
+class TestThreadSafety(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = LocalHttpServer(sample_data).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.server.set_behavior(content_type=None)
+        self.server.reset_stats()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_many_file_sources(self):
+        config = {"transcode_dir": self.tmp_dir}
+
+        def run(idx: int):
+            src = FileSource(os.path.join(sample_data, (csv_file, cp1252_file)[idx % 2]), config)
+            return src.get_profile(), src.get_source_paths()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(run, range(sources_count)))
+        for idx in (0, 1):
+            with self.subTest(file=(csv_file, cp1252_file)[idx]):
+                # Same facts for all the sources of the same file
+                self.assertEqual(len({(p, tuple(s)) for p, s in results[idx::2]}), 1)
+        with self.subTest():
+            # The UTF-8 copy is complete: concurrent transcodings don't step on each other
+            with open(os.path.join(sample_data, cp1252_file), "rb") as f:
+                expected = f.read().decode(results[1][0].charset).encode("utf-8")
+            with open(transcode.sidecar_path(cp1252_file, self.tmp_dir), "rb") as f:
+                self.assertEqual(f.read(), expected)
+        with self.subTest():
+            # The sidecar and its record, no leftover temporary files
+            self.assertEqual(len(os.listdir(self.tmp_dir)), 2)
+
+    def test_many_http_sources(self):
+        self.server.set_behavior(content_type="text/csv; charset=utf-8")
+
+        def run(idx: int):
+            src = HttpSource(self.server.url(csv_file), {"no_vsicurl": idx % 2 == 0})
+            return src.get_profile(), src.use_local_file_source()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(run, range(sources_count)))
+        with self.subTest():
+            self.assertEqual(len({p for p, _ in results}), 1)
+        with self.subTest():
+            # Per-instance state: the no_vsicurl config of a source does not leak into the others
+            self.assertEqual([u for _, u in results], [idx % 2 == 0 for idx in range(sources_count)])
+        with self.subTest():
+            self.assertEqual(self.server.request_count("HEAD"), sources_count)
+
+    def test_shared_source(self):
+        src = HttpSource(self.server.url(csv_file))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            profiles = list(executor.map(lambda _: src.get_profile(), range(sources_count)))
+        with self.subTest():
+            self.assertTrue(all(p is profiles[0] for p in profiles))
+        with self.subTest():
+            # Facts are computed once, whatever the number of threads asking for them
+            self.assertEqual(self.server.request_count("HEAD"), 1)
+
+    def test_read_only_config(self):
+        config = {"db_friendly": True}
+        src = FileSource(os.path.join(sample_data, csv_file), config)
+        config["db_friendly"] = False
+        with self.subTest():
+            self.assertTrue(src.config["db_friendly"])
+        with self.subTest():
+            with self.assertRaises(TypeError):
+                src.config["db_friendly"] = False
+
+
+if __name__ == "__main__":
+    unittest.main()
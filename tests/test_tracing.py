@@ -0,0 +1,65 @@
+import json
+import os
+import tempfile
+import tracemalloc
+import unittest
+
+from ogr2vrt_simple.utils import tracing
+
+
+class TestTracing(unittest.TestCase):
+    def tearDown(self):
+        tracing.stop_tracing()
+
+    def test_off_by_default(self):
+        with tracing.span("noop"):
+            tracing.count("gdal_opens")
+        self.assertIsNone(tracing.stop_tracing())
+
+    def test_nested_spans(self):
+        tracer = tracing.start_tracing()
+        with tracing.span("outer"):
+            with tracing.span("inner", path="a.csv"):
+                tracing.count("gdal_opens")
+        tracing.stop_tracing()
+        events = {e["name"]: e for e in tracer.to_chrome_trace()["traceEvents"] if e["ph"] == "X"}
+        with self.subTest():
+            self.assertEqual(set(events.keys()), {"outer", "inner"})
+        with self.subTest():
+            self.assertGreaterEqual(events["outer"]["dur"], events["inner"]["dur"])
+        with self.subTest():
+            self.assertEqual(events["inner"]["args"], {"path": "a.csv", "gdal_opens": 1})
+        with self.subTest():
+            self.assertEqual(events["outer"]["args"]["gdal_opens"], 1)
+
+    def test_trace_memory(self):
+        tracer = tracing.start_tracing(trace_memory=True)
+        with tracing.span("allocate"):
+            data = bytearray(10 * 1024 * 1024)
+        del data
+        tracing.stop_tracing()
+        event = tracer.to_summary()["spans"][0]
+        self.assertGreaterEqual(event["args"]["peak_memory"], 10 * 1024 * 1024)
+
+    def test_trace_memory_already_tracing(self):
+        # tracemalloc was started by someone else: leave it running
+        tracemalloc.start()
+        try:
+            tracing.start_tracing(trace_memory=True)
+            tracing.stop_tracing()
+            self.assertTrue(tracemalloc.is_tracing())
+        finally:
+            tracemalloc.stop()
+
+    def test_write_summary(self):
+        tracer = tracing.start_tracing()
+        tracing.count("bytes_downloaded", 1024)
+        tracing.stop_tracing()
+        path = os.path.join(tempfile.mkdtemp(), "trace.json")
+        tracer.write(path, "summary")
+        with open(path) as f:
+            self.assertEqual(json.load(f)["counters"], {"bytes_downloaded": 1024})
+
+
+if __name__ == '__main__':
+    unittest.main()
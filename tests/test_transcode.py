@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from ogr2vrt_simple.utils import transcode
+
+sources = [
+    "../sample_data/conso-ener.csv",
+    "../sample_data/conso-ener-windows1252.csv",
+]
+
+
+class TestTranscode(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_needs_transcoding(self):
+        with self.subTest():
+            self.assertFalse(transcode.needs_transcoding("utf_8"))
+        with self.subTest():
+            self.assertFalse(transcode.needs_transcoding("ascii"))
+        with self.subTest():
+            self.assertFalse(transcode.needs_transcoding(None))
+        with self.subTest():
+            self.assertTrue(transcode.needs_transcoding("cp1252"))
+        with self.subTest():
+            self.assertTrue(transcode.needs_transcoding("ISO-8859-1"))
+
+    def test_sidecar_path(self):
+        self.assertEqual(transcode.sidecar_path("/data/conso.csv"), "/data/conso.utf8.csv")
+
+    def test_sidecar_dir(self):
+        with self.subTest():
+            self.assertEqual(transcode.sidecar_dir("/data/conso.csv", "/out"), "/out")
+        with self.subTest():
+            self.assertEqual(transcode.sidecar_dir("/data/conso.csv", in_place=True), "/data")
+        with self.subTest():
+            # Default: out of the data folder, one folder per source folder
+            d = transcode.sidecar_dir("/data/conso.csv")
+            self.assertEqual(os.path.dirname(d), transcode.default_sidecar_dir)
+        with self.subTest():
+            self.assertNotEqual(transcode.sidecar_dir("/other/conso.csv"), d)
+
+    def test_transcode_to_utf8(self):
+        dest = os.path.join(self.tmp_dir, "conso.csv")
+        # Small chunks, so that multi-byte characters get split between chunks
+        chunk_size, transcode.chunk_size = transcode.chunk_size, 1000
+        try:
+            transcode.transcode_to_utf8(sources[1], dest, "cp1252")
+        finally:
+            transcode.chunk_size = chunk_size
+        with open(dest, "rb") as f, open(sources[0], "rb") as expected:
+            self.assertEqual(f.read(), expected.read())
+
+    def test_ensure_utf8(self):
+        src = os.path.join(self.tmp_dir, "conso.csv")
+        shutil.copy(sources[1], src)
+        calls = []
+
+        def detect():
+            calls.append(1)
+            return "cp1252"
+
+        record = transcode.ensure_utf8(src, "v1", detect)
+        with self.subTest():
+            self.assertEqual(record["path"], os.path.join(self.tmp_dir, "conso.utf8.csv"))
+        with self.subTest():
+            self.assertEqual(transcode.read_record(record["path"])["encoding"], "cp1252")
+        # Same fingerprint: the sidecar is re-used, the encoding is not detected again
+        with self.subTest():
+            self.assertEqual(transcode.ensure_utf8(src, "v1", detect)["encoding"], "cp1252")
+        with self.subTest():
+            self.assertEqual(len(calls), 1)
+        with self.subTest():
+            self.assertIsNone(transcode.ensure_utf8(src, "v2", lambda: "utf_8"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from ogr2vrt_simple.utils import ogr_utils, union_utils
+from ogr2vrt_simple.utils.data_structures import FieldDefinition
+
+
+def _layer(name: str, schema: str):
+    return SimpleNamespace(
+        layer_name=name,
+        src_sql=None,
+        geometry_fields=[],
+        fields_definition=[FieldDefinition(schema, schema, "String", 0)],
+        schema_fingerprint=lambda: schema,
+    )
+
+
+class TestUnionUtils(unittest.TestCase):
+    def setUp(self):
+        self.layers_collection = [
+            {"source_path": "/vsizip/data.zip/conso_2023_01.csv", "layers": [_layer("conso_2023_01", "a")]},
+            {"source_path": "/vsizip/data.zip/readme.csv", "layers": [_layer("readme", "b")]},
+            {"source_path": "/vsizip/data.zip/conso_2023_02.csv", "layers": [_layer("conso_2023_02", "a")]},
+        ]
+
+    def test_union_name(self):
+        with self.subTest():
+            self.assertEqual(union_utils.union_name(["conso_2023_01", "conso_2023_02"], 1), "conso_2023")
+        with self.subTest():
+            self.assertEqual(union_utils.union_name(["jan", "feb"], 2), "union_2")
+
+    def test_group_layers(self):
+        grouped = union_utils.group_layers(self.layers_collection, {"union_source_field": "source"})
+        with self.subTest():
+            self.assertEqual(len(grouped), 2)
+        with self.subTest():
+            self.assertEqual(
+                [m["source_path"] for m in grouped[0]["union"]["members"]],
+                ["/vsizip/data.zip/conso_2023_01.csv", "/vsizip/data.zip/conso_2023_02.csv"],
+            )
+        with self.subTest():
+            self.assertEqual(grouped[1]["layers"][0].layer_name, "readme")
+
+    def test_render_union(self):
+        grouped = union_utils.group_layers(self.layers_collection, {"union_source_field": "source"})
+        vrt_xml = ogr_utils.layers2vrt(grouped)
+        with self.subTest():
+            self.assertIn('<OGRVRTUnionLayer name="conso_2023">', vrt_xml)
+        with self.subTest():
+            self.assertEqual(vrt_xml.count("<OGRVRTLayer "), 3)
+        with self.subTest():
+            self.assertIn("<SourceLayerFieldName>source</SourceLayerFieldName>", vrt_xml)
+
+    def test_header_schema_cache(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            for name in ("jan.csv", "feb.csv"):
+                with open(os.path.join(tmp_dir, name), "w") as f:
+                    f.write("id,value\n1,2\n")
+            cache = union_utils.HeaderSchemaCache()
+            jan = cache.collect_layers(os.path.join(tmp_dir, "jan.csv"))
+            feb = cache.collect_layers(os.path.join(tmp_dir, "feb.csv"))
+            with self.subTest():
+                self.assertEqual(feb[0].layer_name, "feb")
+            with self.subTest():
+                self.assertEqual(feb[0].schema_fingerprint(), jan[0].schema_fingerprint())
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,15 @@
+import dataclasses
 import os.path
+import pickle
+import shutil
+import tempfile
 import unittest
+import zipfile
+from unittest import mock
 
+import rarfile
+
+from ogr2vrt_simple.utils import transcode
 from ogr2vrt_simple.vrt_data_sources.file_source import FileSource
 
 sources = [
@@ -30,10 +39,56 @@ class TestFileSource(unittest.TestCase):
         src = FileSource(sources[0])
         self.assertEqual(src.get_charset(), "utf_8")
 
+    def test_get_profile(self):
+        src = FileSource(sources[1])
+        profile = src.get_profile()
+        with self.subTest():
+            self.assertEqual(profile.file_extension, ".7z")
+        with self.subTest():
+            self.assertTrue(profile.is_archive)
+        with self.subTest():
+            self.assertIs(src.get_profile(), profile)
+        with self.subTest():
+            self.assertEqual(pickle.loads(pickle.dumps(profile)), profile)
+        with self.subTest():
+            with self.assertRaises(dataclasses.FrozenInstanceError):
+                profile.charset = "cp1252"
+
+    def test_get_profile_provided(self):
+        # A source created with a profile reads from it, it does not compute anything again
+        profile = dataclasses.replace(FileSource(sources[0]).get_profile(), charset="cp1252")
+        src = FileSource(sources[0], profile=profile)
+        self.assertEqual(src.get_charset(), "cp1252")
+
     def test_get_charset_latin1(self):
         src = FileSource(sources[3])
         self.assertNotEqual(src.get_charset(), "utf_8")
 
+    def test_get_charset_sample(self):
+        # Only the head of the file is read
+        src = FileSource(sources[3], {"charset_sample_size": 1000})
+        with mock.patch("charset_normalizer.from_path") as from_path:
+            self.assertNotEqual(src.get_charset(), "utf_8")
+        self.assertFalse(from_path.called)
+
+    def test_get_source_paths_transcoded(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            source = os.path.join(tmp_dir, "conso.csv")
+            shutil.copy(sources[3], source)
+            with mock.patch.object(transcode, "default_sidecar_dir", os.path.join(tmp_dir, "transcoded")):
+                path = FileSource(source).get_source_paths()[0]
+            with self.subTest():
+                # The data folder is left untouched
+                self.assertEqual(sorted(os.listdir(tmp_dir)), ["conso.csv", "transcoded"])
+            with self.subTest():
+                self.assertTrue(path.startswith(os.path.join(tmp_dir, "transcoded")))
+            with self.subTest():
+                path = FileSource(source, {"transcode_in_place": True}).get_source_paths()[0]
+                self.assertEqual(path, os.path.join(tmp_dir, "conso.utf8.csv"))
+        finally:
+            shutil.rmtree(tmp_dir)
+
     def test_get_source_paths(self):
         src = FileSource(sources[0])
         p = os.path.abspath(sources[0])
@@ -44,6 +99,17 @@ class TestFileSource(unittest.TestCase):
         p = os.path.abspath(sources[1])
         self.assertEqual(src.get_source_paths(), ["/vsi7z/" + p + "/world/locations/locations.csv"])
 
+    def test_get_source_paths_rar_without_tool(self):
+        # Listing the members only needs the RAR headers: a missing unrar tool must not break it
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            src = FileSource(sources[2], {"transcode_dir": tmp_dir})
+            p = os.path.abspath(sources[2])
+            with mock.patch.object(rarfile.RarFile, "open", side_effect=rarfile.RarCannotExec("No working tool")):
+                self.assertEqual(src.get_source_paths(), ["/vsirar/" + p + "/world/locations/locations.csv"])
+        finally:
+            shutil.rmtree(tmp_dir)
+
     def test_get_source_paths_archive_multiple(self):
         src = FileSource(sources[4])
         p = os.path.abspath(sources[4])
@@ -85,6 +151,9 @@ class TestFileSource(unittest.TestCase):
     <SrcDataSource relativeToVRT="1">/vsizip/{p}/world/locations/locations.csv</SrcDataSource>
     <!--<SrcSql dialect="sqlite">SELECT * FROM 'locations'</SrcSql>-->
     <SrcLayer>locations</SrcLayer>
+    <GeometryType>wkbPoint</GeometryType>
+    <LayerSRS>EPSG:4326</LayerSRS>
+    <GeometryField encoding="PointFromColumns" x="LON" y="LAT"/>
     <Field name="lat" src="LAT" type="String" />
     <Field name="lon" src="LON" type="String" />
     <Field name="city" src="CITY" type="String" />
@@ -0,0 +1,146 @@
+"""
+FtpSource tests against a local FTP server (see local_ftp_server.py)
+"""
+import json
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+
+from local_ftp_server import LocalFtpServer
+from ogr2vrt_simple.utils import ftp_utils, transcode
+from ogr2vrt_simple.vrt_data_sources import get_source
+from ogr2vrt_simple.vrt_data_sources.ftp_source import FtpSource
+
+sample_data = "../sample_data"
+csv_file = "conso-ener.csv"
+cp1252_file = "conso-ener-windows1252.csv"
+
+
+class TestFtpSourceLocal(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = LocalFtpServer(sample_data).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.server.set_behavior(size_supported=True, mdtm_supported=True, mlsd_supported=True, rest_supported=True)
+        self.server.reset_stats()
+        with open(os.path.join(sample_data, csv_file), "rb") as f:
+            self.content = f.read()
+
+    def tearDown(self):
+        ftp_utils.pool.close_all()
+
+    def test_get_source(self):
+        self.assertIsInstance(get_source(self.server.url(csv_file)), FtpSource)
+
+    def test_get_data_full_size(self):
+        for size_supported in (True, False):
+            self.server.set_behavior(size_supported=size_supported)
+            with self.subTest(size_supported=size_supported):
+                src = FtpSource(self.server.url(csv_file))
+                self.assertEqual(src.get_data_full_size()[0], len(self.content))
+        with self.subTest():
+            self.assertEqual(self.server.command_count("MLSD"), 1)
+
+    def test_get_headers(self):
+        headers = FtpSource(self.server.url(csv_file))._get_headers()
+        with self.subTest():
+            self.assertEqual(headers["Content-Length"], str(len(self.content)))
+        with self.subTest():
+            self.assertTrue(headers["Last-Modified"].endswith(" GMT"))
+        with self.subTest():
+            self.assertIsNone(headers["Content-Type"])
+
+    def test_get_fingerprint(self):
+        src = FtpSource(self.server.url(csv_file))
+        fingerprint = src.get_fingerprint()
+        with self.subTest():
+            self.assertTrue(fingerprint.startswith(f"{self.server.url(csv_file)}|{len(self.content)}|"))
+        with self.subTest():
+            self.assertEqual(self.server.command_count("RETR"), 0)
+
+    def test_connection_reuse(self):
+        for name in (csv_file, cp1252_file):
+            src = FtpSource(self.server.url(name))
+            src.get_data_full_size()
+            src.get_fingerprint()
+        self.assertEqual(self.server.connections, 1)
+
+    def test_reconnect(self):
+        ftp_utils.get_size(self.server.url(csv_file))
+        # The server closed the idle connection
+        for ftp in ftp_utils.pool._connections.values():
+            ftp.sock.shutdown(socket.SHUT_RDWR)
+        self.assertEqual(ftp_utils.get_size(self.server.url(csv_file)), len(self.content))
+        self.assertEqual(self.server.connections, 2)
+
+    def test_read_range(self):
+        url = self.server.url(csv_file)
+        with self.subTest():
+            self.assertEqual(ftp_utils.read_range(url, 10, 20), self.content[10:30])
+        with self.subTest():
+            self.assertEqual(ftp_utils.read_range(url, len(self.content) - 5, 100), self.content[-5:])
+        with self.subTest():
+            # The connection is still usable after an aborted transfer
+            self.assertEqual(ftp_utils.get_size(url), len(self.content))
+
+    def test_get_charset(self):
+        with self.subTest():
+            self.assertEqual(FtpSource(self.server.url(csv_file)).get_charset(), "utf_8")
+        with self.subTest():
+            self.assertTrue(transcode.needs_transcoding(FtpSource(self.server.url(cp1252_file)).get_charset()))
+
+    def test_download_resume(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            url = self.server.url(csv_file)
+            filename = os.path.join(tmp_dir, csv_file)
+            part = filename + ftp_utils.part_suffix
+            version = ftp_utils.get_version(url)
+            # The remote file changed since the .part file was written, or its version was not recorded
+            for recorded in (version, dict(version, modified="19700101000000"), None):
+                self.server.reset_stats()
+                with open(part, "wb") as f:
+                    f.write(self.content[:1000])
+                if recorded:
+                    with open(part + ".json", "w") as f:
+                        json.dump(recorded, f)
+                ftp_utils.download(url, filename)
+                resumed = recorded == version
+                with self.subTest(resumed=resumed):
+                    with open(filename, "rb") as f:
+                        self.assertEqual(f.read(), self.content)
+                with self.subTest(resumed=resumed):
+                    self.assertEqual(self.server.bytes_sent, len(self.content) - (1000 if resumed else 0))
+                with self.subTest(resumed=resumed):
+                    self.assertEqual(os.listdir(tmp_dir), [csv_file])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_download_to_buffer(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            spill_path = os.path.join(tmp_dir, csv_file)
+            with self.subTest(spilled=False):
+                data, path = ftp_utils.download_to_buffer(self.server.url(csv_file), len(self.content), spill_path)
+                self.assertEqual((bytes(data), path), (self.content, None))
+            with self.subTest(spilled=True):
+                data, path = ftp_utils.download_to_buffer(self.server.url(csv_file), 1000, spill_path)
+                with open(path, "rb") as f:
+                    self.assertEqual((data, f.read()), (None, self.content))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_get_source_paths_vsicurl(self):
+        src = FtpSource(self.server.url(csv_file))
+        self.assertEqual(src.get_source_paths(), ["CSV:/vsicurl/" + self.server.url(csv_file)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -138,6 +138,8 @@ class TestHttpSource(unittest.TestCase):
     <SrcDataSource relativeToVRT="1">/vsizip//vsicurl/https://raw.githubusercontent.com/OSGeo/gdal/master/autotest/ogr/data/shp/poly.zip/poly.shp</SrcDataSource>
     <!--<SrcSql dialect="sqlite">SELECT * FROM 'poly'</SrcSql>-->
     <SrcLayer>poly</SrcLayer>
+    <GeometryType>wkbPolygon</GeometryType>
+    <LayerSRS>EPSG:27700</LayerSRS>
     <Field name="area" src="AREA" type="Real" width="12"/>
     <Field name="eas_id" src="EAS_ID" type="Integer64" width="11"/>
     <Field name="prfedea" src="PRFEDEA" type="String" width="16"/>
@@ -163,6 +165,8 @@ class TestHttpSource(unittest.TestCase):
     <SrcDataSource relativeToVRT="1">/vsizip/polygon.zip/poly.shp</SrcDataSource>
     <!--<SrcSql dialect="sqlite">SELECT * FROM 'poly'</SrcSql>-->
     <SrcLayer>poly</SrcLayer>
+    <GeometryType>wkbPolygon</GeometryType>
+    <LayerSRS>EPSG:27700</LayerSRS>
     <Field name="area" src="AREA" type="Real" width="12"/>
     <Field name="eas_id" src="EAS_ID" type="Integer64" width="11"/>
     <Field name="prfedea" src="PRFEDEA" type="String" width="16"/>
@@ -0,0 +1,327 @@
+"""
+HttpSource tests against a local HTTP server (see local_http_server.py): no network needed, and we can check how
+many requests each code path costs
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+
+from local_http_server import LocalHttpServer, _compress
+from ogr2vrt_simple.utils import io_utils, ogr_utils, tracing
+from ogr2vrt_simple.vrt_data_sources.http_source import HttpSource
+
+sample_data = "../sample_data"
+csv_file = "conso-ener.csv"
+zip_file = "locations.zip"
+
+
+class TestHttpSourceLocal(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = LocalHttpServer(sample_data).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.server.set_behavior(
+            latency=0, bandwidth=None, range_support=True, chunked=False, content_length=True,
+            content_type=None, content_disposition=None, head_allowed=True, routes={}, content_encodings=[],
+        )
+        self.server.reset_stats()
+
+    def test_get_file_extension_from_content_type(self):
+        self.server.set_behavior(content_type="text/csv; charset=utf-8", routes={"/api/export": csv_file})
+        src = HttpSource(self.server.url("api/export"))
+        self.assertEqual(src.get_file_extension(), ".csv")
+
+    def test_get_file_extension_from_content_disposition(self):
+        self.server.set_behavior(
+            content_type="application/octet-stream", content_disposition="export.csv", routes={"/api/export": csv_file}
+        )
+        src = HttpSource(self.server.url("api/export"))
+        self.assertEqual(src.get_file_extension(), ".csv")
+
+    def test_get_file_extension_from_url(self):
+        self.server.set_behavior(content_type="text/plain")
+        src = HttpSource(self.server.url(csv_file))
+        self.assertEqual(src.get_file_extension(), ".csv")
+
+    def test_get_charset(self):
+        self.server.set_behavior(content_type="text/csv; charset=UTF-8")
+        src = HttpSource(self.server.url(csv_file))
+        self.assertEqual(src.get_charset(), "utf-8")
+
+    def test_is_streaming(self):
+        self.server.set_behavior(chunked=True)
+        src = HttpSource(self.server.url(csv_file))
+        with self.subTest():
+            self.assertTrue(src.is_streaming())
+        with self.subTest():
+            self.assertIsNone(src.get_data_full_size())
+
+    def test_get_data_full_size(self):
+        src = HttpSource(self.server.url(csv_file))
+        size = os.path.getsize(os.path.join(sample_data, csv_file))
+        self.assertEqual(int(src.get_data_full_size()[0]), size)
+
+    def test_get_data_full_size_no_content_length(self):
+        self.server.set_behavior(content_length=False)
+        src = HttpSource(self.server.url(csv_file))
+        self.assertIsNone(src.get_data_full_size())
+
+    def test_collect_information_single_head_request(self):
+        self.server.set_behavior(content_type="text/csv; charset=utf-8")
+        src = HttpSource(self.server.url(csv_file))
+        infos = src.collect_information()
+        with self.subTest():
+            self.assertEqual(infos["can_be_remotely_accessed"], 10)
+        with self.subTest():
+            self.assertEqual(self.server.request_count("HEAD"), 1)
+        with self.subTest():
+            # The HEAD request, and a ranged read measuring the throughput for the access mode choice
+            self.assertEqual(self.server.request_count(), 2)
+        with self.subTest():
+            self.assertEqual(infos["access_plan"]["mode"], "vsicurl")
+
+    def test_access_plan(self):
+        for range_support, expected in ((True, "vsicurl"), (False, "vsicurl_streaming")):
+            self.server.set_behavior(range_support=range_support)
+            src = HttpSource(self.server.url(csv_file))
+            plan = src.get_access_plan()
+            with self.subTest(range_support=range_support):
+                self.assertEqual(plan.mode, expected)
+            with self.subTest(range_support=range_support):
+                self.assertEqual(plan.measures.range_support, range_support)
+            with self.subTest(range_support=range_support):
+                self.assertGreater(plan.measures.throughput, 0)
+        with self.subTest(no_vsicurl=True):
+            self.server.reset_stats()
+            src = HttpSource(self.server.url(csv_file), {"no_vsicurl": True})
+            self.assertEqual(src.get_access_plan().mode, "download")
+            self.assertEqual(self.server.request_count("GET"), 0)
+
+    def test_download_access_keeps_remote_paths(self):
+        # Distant server: a small GeoPackage is cheaper to download than to read with many ranged requests, but the
+        # VRT must still point at the remote data. Only the introspection reads the local copy
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(tmp_dir, "data.gpkg"), "wb") as f:
+                f.write(os.urandom(2 * 1024 ** 2))
+            with LocalHttpServer(tmp_dir, latency=0.3) as server:
+                src = HttpSource(server.url("data.gpkg"), {"vsimem_max_size": 0})
+                with self.subTest():
+                    self.assertEqual(src.get_access_plan().mode, "download")
+                with mock.patch.object(ogr_utils, "is_valid_ogr_path", return_value=True) as is_valid:
+                    paths = src.get_source_paths()
+                with self.subTest():
+                    self.assertEqual(paths, ["/vsicurl/" + server.url("data.gpkg")])
+                with self.subTest():
+                    # The remote path is opened once, over the network
+                    is_valid.assert_called_once_with("/vsicurl/" + server.url("data.gpkg"))
+                with self.subTest():
+                    self.assertFalse(src.use_local_file_source())
+                local_path = src._open_path(paths[0])
+                with self.subTest():
+                    self.assertTrue(os.path.isfile(local_path))
+                    self.assertEqual(os.path.getsize(local_path), 2 * 1024 ** 2)
+                src.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_download_access_keeps_remote_archive_paths(self):
+        src = HttpSource(self.server.url(zip_file), {"access_mode": "download"})
+        with src, mock.patch.object(ogr_utils, "is_valid_ogr_path", return_value=True):
+            paths = src.get_source_paths()
+            prefix = "/vsizip//vsicurl/" + self.server.url(zip_file) + "/"
+            with self.subTest():
+                self.assertTrue(paths and all(p.startswith(prefix) for p in paths))
+            with self.subTest():
+                local_path = src._open_path(paths[0])
+                self.assertEqual(
+                    local_path, src.get_local_file_source()._get_archive_prefix() + paths[0][len(prefix):]
+                )
+
+    def test_sample_access(self):
+        sample_size = 1000
+        src = HttpSource(self.server.url(csv_file), {"access_mode": "sample", "access_sample_size": sample_size})
+        with src, mock.patch.object(ogr_utils, "is_valid_ogr_path", return_value=True):
+            paths = src.get_source_paths()
+            with self.subTest():
+                self.assertEqual(paths, ["CSV:/vsicurl/" + self.server.url(csv_file)])
+            sample_path = src._open_path(paths[0])
+            with self.subTest():
+                self.assertEqual(os.path.basename(sample_path), csv_file)
+            with open(os.path.join(sample_data, csv_file), "rb") as f:
+                content = f.read()
+            with open(sample_path[len("CSV:"):], "rb") as f:
+                sample = f.read()
+            with self.subTest():
+                # Complete lines only
+                self.assertTrue(content.startswith(sample) and sample.endswith(b"\n"))
+                self.assertLessEqual(len(sample), sample_size)
+            with self.subTest():
+                self.assertLessEqual(self.server.bytes_sent(), 2 * sample_size)
+
+    def test_download_access_remote_path_not_readable(self):
+        src = HttpSource(self.server.url(csv_file), {"access_mode": "download", "vsimem_max_size": 0})
+        with src, mock.patch.object(ogr_utils, "is_valid_ogr_path", return_value=False):
+            paths = src.get_source_paths()
+            with self.subTest():
+                # Falls back on the local copy
+                self.assertTrue(src.use_local_file_source())
+            with self.subTest():
+                self.assertEqual(len(paths), 1)
+                self.assertTrue(os.path.isfile(paths[0]))
+
+    def test_head_not_allowed(self):
+        self.server.set_behavior(head_allowed=False)
+        src = HttpSource(self.server.url(csv_file))
+        with self.subTest():
+            self.assertEqual(src.get_file_extension(), ".csv")
+        with self.subTest():
+            self.assertEqual(self.server.request_count("HEAD"), 1)
+        with self.subTest():
+            self.assertEqual(self.server.request_count("GET"), 1)
+
+    def test_download_local_file_source(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            conf = {"filename": os.path.join(tmp_dir, "zipped")}
+            src = HttpSource(self.server.url(zip_file), conf)
+            file_source = src.get_local_file_source()
+            size = os.path.getsize(os.path.join(sample_data, zip_file))
+            with self.subTest():
+                self.assertEqual(os.path.getsize(file_source.file_path), size)
+            with self.subTest():
+                self.assertEqual(self.server.request_count("GET"), 1)
+            with self.subTest():
+                self.assertEqual(self.server.bytes_sent(), size)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_download_to_buffer(self):
+        size = os.path.getsize(os.path.join(sample_data, csv_file))
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            spill_path = os.path.join(tmp_dir, csv_file)
+            for chunked in (False, True):
+                self.server.set_behavior(chunked=chunked)
+                with self.subTest(chunked=chunked, spilled=False):
+                    data, path = io_utils.download_to_buffer(self.server.url(csv_file), size, spill_path)
+                    self.assertEqual((len(data), path), (size, None))
+                with self.subTest(chunked=chunked, spilled=True):
+                    data, path = io_utils.download_to_buffer(self.server.url(csv_file), size // 2, spill_path)
+                    self.assertEqual((data, os.path.getsize(path)), (None, size))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_download_compressed(self):
+        with open(os.path.join(sample_data, csv_file), "rb") as f:
+            content = f.read()
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            for encoding in ("gzip", "deflate", "deflate-raw"):
+                self.server.set_behavior(content_encodings=[encoding])
+                self.server.reset_stats()
+                tracer = tracing.start_tracing()
+                try:
+                    path = io_utils.download_dataset(self.server.url(csv_file), os.path.join(tmp_dir, f"{encoding}.csv"))
+                finally:
+                    tracing.stop_tracing()
+                with self.subTest(encoding=encoding):
+                    with open(path, "rb") as f:
+                        self.assertEqual(f.read(), content)
+                with self.subTest(encoding=encoding):
+                    self.assertIn("gzip", self.server.requests[0].headers["Accept-Encoding"])
+                with self.subTest(encoding=encoding):
+                    # bytes_downloaded counts the transfer, bytes_decompressed the data
+                    self.assertEqual(tracer.counters["bytes_downloaded"], len(_compress(content, encoding)))
+                    self.assertEqual(tracer.counters["bytes_decompressed"], len(content))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_download_to_buffer_compressed(self):
+        self.server.set_behavior(content_encodings=["gzip"])
+        with open(os.path.join(sample_data, csv_file), "rb") as f:
+            content = f.read()
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            spill_path = os.path.join(tmp_dir, csv_file)
+            with self.subTest(spilled=False):
+                data, path = io_utils.download_to_buffer(self.server.url(csv_file), len(content), spill_path)
+                self.assertEqual((bytes(data), path), (content, None))
+            with self.subTest(spilled=True):
+                # max_size applies to the decompressed data
+                data, path = io_utils.download_to_buffer(self.server.url(csv_file), len(content) // 2, spill_path)
+                with open(path, "rb") as f:
+                    self.assertEqual((data, f.read()), (None, content))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_get_data_full_size_compressed(self):
+        # HEAD requests don't negotiate compression: the size is the size of the data
+        self.server.set_behavior(content_encodings=["gzip"])
+        src = HttpSource(self.server.url(csv_file))
+        size = os.path.getsize(os.path.join(sample_data, csv_file))
+        with self.subTest():
+            self.assertEqual(int(src.get_data_full_size()[0]), size)
+        with self.subTest():
+            self.assertEqual(self.server.requests[0].headers.get("Accept-Encoding", "identity"), "identity")
+
+    def test_download_in_memory(self):
+        src = HttpSource(self.server.url(csv_file), {"no_vsicurl": True})
+        with src:
+            file_source = src.get_local_file_source()
+            with self.subTest():
+                self.assertTrue(file_source.file_path.startswith("/vsimem/"))
+            with self.subTest():
+                # The content lives in the /vsimem/ file only
+                self.assertIsNone(file_source.data)
+            with self.subTest():
+                self.assertEqual(src.get_source_paths(), [csv_file])
+            with self.subTest():
+                self.assertEqual(len(src.collect_layers()[0]["layers"]), 1)
+            with self.subTest():
+                self.assertEqual(src.get_local_file_source().get_charset(), "utf_8")
+
+    def test_get_source_paths_vsicurl(self):
+        src = HttpSource(self.server.url(csv_file))
+        self.assertEqual(src.get_source_paths(), ["CSV:/vsicurl/" + self.server.url(csv_file)])
+
+    def test_get_source_paths_archive_vsicurl(self):
+        conf = {"data_formats": ".csv"}
+        src = HttpSource(self.server.url(zip_file), conf)
+        expected = ["/vsizip//vsicurl/" + self.server.url(zip_file) + "/world/locations/locations.csv"]
+        self.assertEqual(src.get_source_paths(), expected)
+
+
+    def test_get_source_paths_archive_many_members(self):
+        # Once a member opens remotely, the others are only checked for existence
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            with zipfile.ZipFile(os.path.join(tmp_dir, "parts.zip"), "w") as z:
+                for i in range(20):
+                    z.writestr(f"parts/part_{i:02d}.csv", f"id,value\n{i},{i * 2}\n")
+            with LocalHttpServer(tmp_dir) as server:
+                src = HttpSource(server.url("parts.zip"), {"probe_workers": 2, "max_probed_members": 4})
+                tracer = tracing.start_tracing()
+                try:
+                    paths = src.get_source_paths()
+                finally:
+                    tracing.stop_tracing()
+            with self.subTest():
+                self.assertEqual(len(paths), 20)
+            with self.subTest():
+                self.assertEqual(paths[0], "/vsizip//vsicurl/" + server.url("parts.zip") + "/parts/part_00.csv")
+            with self.subTest():
+                self.assertLessEqual(tracer.counters["gdal_opens"], 2 * 4)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+if __name__ == '__main__':
+    unittest.main()
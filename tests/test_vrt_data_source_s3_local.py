@@ -0,0 +1,113 @@
+"""
+S3Source tests against a local S3-compatible server (see local_s3_server.py)
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from local_s3_server import LocalS3Server
+from ogr2vrt_simple.utils import transcode
+from ogr2vrt_simple.vrt_data_sources import get_source
+from ogr2vrt_simple.vrt_data_sources.s3_source import S3Source
+
+sample_data = "../sample_data"
+bucket = "open-data"
+objects = {
+    "bdnb/csv/conso-ener.csv": "conso-ener.csv",
+    "bdnb/csv/conso-ener-windows1252.csv": "conso-ener-windows1252.csv",
+    "bdnb/csv/readme.txt": "conso-ener.csv",
+    "bdnb/archives/locations.zip": "locations.zip",
+}
+
+
+class TestS3SourceLocal(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.root_dir = tempfile.mkdtemp()
+        for key, name in objects.items():
+            path = os.path.join(cls.root_dir, bucket, key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            shutil.copy(os.path.join(sample_data, name), path)
+        cls.server = LocalS3Server(cls.root_dir).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        shutil.rmtree(cls.root_dir)
+
+    def setUp(self):
+        self.server.reset_stats()
+        self.config = {"s3_endpoint": self.server.endpoint, "s3_anonymous": True}
+
+    def test_get_source(self):
+        self.assertIsInstance(get_source(f"s3://{bucket}/bdnb/", self.config), S3Source)
+
+    def test_list_objects(self):
+        src = S3Source(f"s3://{bucket}/bdnb/", dict(self.config, s3_max_keys=2))
+        with self.subTest():
+            self.assertEqual(
+                [o.key for o in src.get_objects()],
+                ["bdnb/archives/locations.zip", "bdnb/csv/conso-ener-windows1252.csv", "bdnb/csv/conso-ener.csv"],
+            )
+        with self.subTest():
+            # 4 objects, 2 per page
+            self.assertEqual(len(self.server.list_requests()), 2)
+        with self.subTest():
+            # Everything comes from the listing
+            self.assertEqual(self.server.request_count(), 2)
+
+    def test_get_source_paths(self):
+        src = S3Source(f"s3://{bucket}/bdnb/csv/", self.config)
+        self.assertEqual(
+            src.get_source_paths(),
+            [f"/vsis3/{bucket}/bdnb/csv/conso-ener-windows1252.csv", f"/vsis3/{bucket}/bdnb/csv/conso-ener.csv"],
+        )
+
+    def test_single_object(self):
+        key = "bdnb/csv/conso-ener-windows1252.csv"
+        src = S3Source(f"s3://{bucket}/{key}", self.config)
+        with self.subTest():
+            self.assertEqual(src.get_file_extension(), ".csv")
+        with self.subTest():
+            self.assertEqual(src.get_data_full_size()[0], os.path.getsize(os.path.join(sample_data, objects[key])))
+        with self.subTest():
+            self.assertTrue(transcode.needs_transcoding(src.get_charset()))
+        with self.subTest():
+            # The charset is detected on the first bytes only
+            self.assertEqual([r.headers.get("Range", None) for r in self.server.requests if r not in
+                              self.server.list_requests()], ["bytes=0-65535"])
+
+    def test_get_fingerprint(self):
+        url = f"s3://{bucket}/bdnb/csv/"
+        fingerprint = S3Source(url, self.config).get_fingerprint()
+        with self.subTest(modified=False):
+            self.assertEqual(S3Source(url, self.config).get_fingerprint(), fingerprint)
+        path = os.path.join(self.root_dir, bucket, "bdnb/csv/conso-ener.csv")
+        with open(path, "ab") as f:
+            f.write(b"\n")
+        try:
+            with self.subTest(modified=True):
+                self.assertNotEqual(S3Source(url, self.config).get_fingerprint(), fingerprint)
+        finally:
+            shutil.copy(os.path.join(sample_data, "conso-ener.csv"), path)
+
+    def test_signed_requests(self):
+        env = {"AWS_ACCESS_KEY_ID": "key", "AWS_SECRET_ACCESS_KEY": "secret"}
+        with mock.patch.dict(os.environ, env):
+            for anonymous in (False, True):
+                self.server.reset_stats()
+                with self.subTest(anonymous=anonymous):
+                    S3Source(f"s3://{bucket}/bdnb/", dict(self.config, s3_anonymous=anonymous)).get_objects()
+                    authorization = self.server.requests[0].headers.get("Authorization", "")
+                    self.assertEqual(authorization.startswith("AWS4-HMAC-SHA256 Credential=key/"), not anonymous)
+
+    def test_collect_layers(self):
+        src = S3Source(f"s3://{bucket}/bdnb/", self.config)
+        source_paths = [c["source_path"] for c in src.collect_layers()]
+        self.assertIn(f"/vsizip//vsis3/{bucket}/bdnb/archives/locations.zip/world/locations/locations.csv", source_paths)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from ogr2vrt_simple import watcher
+
+sources = [
+    "../sample_data/conso-ener.csv",
+    "../sample_data/conso-ener-windows1252.csv",
+]
+
+
+class TestWatcherHelpers(unittest.TestCase):
+    def test_is_candidate(self):
+        with self.subTest():
+            self.assertTrue(watcher.is_candidate("/data/export.xlsx"))
+        with self.subTest():
+            self.assertTrue(watcher.is_candidate("/data/export.tar.gz"))
+        with self.subTest():
+            self.assertFalse(watcher.is_candidate("/data/~$export.xlsx"))
+        with self.subTest():
+            self.assertFalse(watcher.is_candidate("/data/export.vrt"))
+        with self.subTest():
+            self.assertFalse(watcher.is_candidate("/data/export.utf8.csv"))
+        with self.subTest():
+            self.assertFalse(watcher.is_candidate("/data/export.utf8.csv.json"))
+        with self.subTest():
+            self.assertFalse(watcher.is_candidate("/data/archive.zip_export.utf8.csv"))
+
+    def test_source_for_path(self):
+        self.assertEqual(watcher.source_for_path("/data/roads.dbf"), "/data/roads.shp")
+
+    def test_vrt_path(self):
+        w = watcher.VrtWatcher(["/data"], out_dir="/vrt")
+        self.assertEqual(w.vrt_path("/data/sub/archive.tar.gz"), "/vrt/archive.vrt")
+
+    def test_diff_snapshots(self):
+        before = {"a.csv": (10, 1), "b.csv": (10, 1), "c.csv": (10, 1)}
+        after = {"a.csv": (10, 1), "b.csv": (12, 2), "d.csv": (10, 1)}
+        self.assertEqual(sorted(watcher.diff_snapshots(before, after)), ["b.csv", "c.csv", "d.csv"])
+
+    def test_scan(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(tmp_dir, "sub"))
+            shutil.copy(sources[0], os.path.join(tmp_dir, "sub", "conso.csv"))
+            open(os.path.join(tmp_dir, "notes.txt"), "w").close()
+            snapshot = watcher.scan([tmp_dir])
+            self.assertEqual(list(snapshot.keys()), [os.path.join(tmp_dir, "sub", "conso.csv")])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_write_atomically(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, "out.vrt")
+            watcher.write_atomically(path, "<OGRVRTDataSource/>")
+            with self.subTest():
+                self.assertEqual(os.listdir(tmp_dir), ["out.vrt"])
+            with open(path) as f:
+                self.assertEqual(f.read(), "<OGRVRTDataSource/>")
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+class TestVrtWatcher(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.tmp_dir, "conso.csv")
+        shutil.copy(sources[0], self.source)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_process_only_when_changed(self):
+        w = watcher.VrtWatcher([self.tmp_dir])
+        with self.subTest():
+            self.assertEqual(w.process(self.source), os.path.join(self.tmp_dir, "conso.vrt"))
+        with self.subTest():
+            self.assertIsNone(w.process(self.source))
+        with open(self.source, "a") as f:
+            f.write("\\n")
+        with self.subTest():
+            self.assertEqual(w.process(self.source), os.path.join(self.tmp_dir, "conso.vrt"))
+
+    def test_transcoded_source(self):
+        source = os.path.join(self.tmp_dir, "conso1252.csv")
+        shutil.copy(sources[1], source)
+        w = watcher.VrtWatcher([self.tmp_dir], config={"transcode_in_place": True})
+        w.initial_run()
+        with self.subTest():
+            # The UTF-8 sidecar was written beside the source...
+            self.assertTrue(os.path.exists(os.path.join(self.tmp_dir, "conso1252.utf8.csv")))
+        with self.subTest():
+            # ...but is not a source of its own
+            self.assertFalse(os.path.exists(os.path.join(self.tmp_dir, "conso1252.utf8.vrt")))
+        with self.subTest():
+            self.assertEqual(sorted(watcher.scan([self.tmp_dir]).keys()), [self.source, source])
+
+
+if __name__ == '__main__':
+    unittest.main()